@@ -0,0 +1 @@
+"""Logistics Analyzer"""
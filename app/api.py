@@ -0,0 +1,134 @@
+"""
+REST API к аналитике по перевозкам
+
+Запуск:
+    LOGISTICS_DATA=data/shipments_extended.csv uvicorn app.api:app --port 8000
+
+Датасет загружается при старте и держится в памяти (QueryService);
+ответы кэшируются до изменения файла данных. /metrics - гистограммы
+задержек по эндпоинтам. POST /quotes - котировки заявок по всем
+перевозчикам (PricingEngine), от данных не зависят.
+"""
+
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+# Корень проекта для импорта общих модулей app/*
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.pricing import COMPONENTS, PricingEngine
+from app.services.query_service import QueryService
+
+DEFAULT_DATA_PATH = Path(__file__).resolve().parent.parent / 'data' / 'shipments_extended.csv'
+
+
+MAX_QUOTES = 100_000
+
+
+class QuoteRequest(BaseModel):
+    """Заявки на котировку: массивы одной длины (по элементу на направление).
+    Вместо distance_km можно передать from_city и to_city."""
+    distance_km: Optional[List[float]] = None
+    from_city: Optional[List[str]] = None
+    to_city: Optional[List[str]] = None
+    weight_kg: List[float]
+    cargo_type: List[str]
+    insurance: Optional[List[bool]] = None
+    carriers: Optional[List[str]] = None        # по умолчанию - все перевозчики
+    breakdown: bool = False                     # все компоненты стоимости, а не только total
+
+
+def create_app(data_path=None, **service_options):
+    """Приложение FastAPI над одним файлом данных"""
+    data_path = data_path or os.environ.get('LOGISTICS_DATA', DEFAULT_DATA_PATH)
+    service = QueryService(data_path, **service_options)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await service.dataset()      # прогрев: загрузка до первого запроса
+        yield
+
+    app = FastAPI(title='Logistics Analyzer API', lifespan=lifespan)
+    app.state.service = service
+
+    @app.middleware('http')
+    async def measure_latency(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        service.record_latency(request.url.path, (time.perf_counter() - started) * 1000)
+        return response
+
+    async def respond(name, **params):
+        try:
+            body = await service.query(name, **params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return Response(body, media_type='application/json')
+
+    @app.get('/health')
+    async def health():
+        dataset = await service.dataset()
+        return {'status': 'ok', 'rows': dataset.partial.count}
+
+    @app.get('/kpis')
+    async def kpis():
+        return await respond('kpis')
+
+    @app.get('/carriers')
+    async def carriers(start: Optional[date] = None, end: Optional[date] = None,
+                       cargo_type: Optional[str] = None, customer_segment: Optional[str] = None,
+                       priority: Optional[str] = None):
+        return await respond('carriers', start=start, end=end, cargo_type=cargo_type,
+                             customer_segment=customer_segment, priority=priority)
+
+    @app.get('/routes')
+    async def routes(n: int = Query(10, ge=1, le=1000), metric: str = 'avg_cost_per_km',
+                     largest: bool = False, carrier: Optional[str] = None,
+                     cargo_type: Optional[str] = None, start: Optional[date] = None,
+                     end: Optional[date] = None):
+        return await respond('routes', n=n, metric=metric, largest=largest, carrier=carrier,
+                             cargo_type=cargo_type, start=start, end=end)
+
+    @app.get('/seasonal')
+    async def seasonal(grain: str = 'month', start: Optional[date] = None,
+                       end: Optional[date] = None, carrier: Optional[str] = None,
+                       cargo_type: Optional[str] = None):
+        return await respond('seasonal', grain=grain, start=start, end=end,
+                             carrier=carrier, cargo_type=cargo_type)
+
+    pricing = PricingEngine()
+
+    @app.post('/quotes')
+    def quotes(request: QuoteRequest):
+        requests = request.model_dump(exclude={'carriers', 'breakdown'}, exclude_none=True)
+        sizes = {len(values) for values in requests.values()}
+        if len(sizes) != 1:
+            raise HTTPException(status_code=400, detail="Массивы заявки разной длины")
+        if sizes.pop() > MAX_QUOTES:
+            raise HTTPException(status_code=400, detail=f"Не более {MAX_QUOTES} заявок за запрос")
+        try:
+            quotes = pricing.quote(requests, request.carriers)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        components = COMPONENTS if request.breakdown else ('total',)
+        body = {'carriers': quotes['carriers']}
+        body.update((name, quotes[name].round(2).tolist()) for name in components)
+        return body
+
+    @app.get('/metrics')
+    async def metrics():
+        return service.metrics()
+
+    return app
+
+
+app = create_app()
@@ -1,6 +1,30 @@
+import sys
+from pathlib import Path
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# Корень проекта для импорта общих модулей app/*
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.dashboard_data import DashboardData
+from app.utils.data_loader import load_shipments, store_upload
+
+PAGE_SIZE = 100
+
+
+@st.cache_resource(max_entries=4, show_spinner="Подготовка данных...")
+def load_dashboard_data(path):
+    """Загрузка и предагрегация файла (путь содержит хэш содержимого)"""
+    return DashboardData(load_shipments(path))
+
+
+def upload_path(uploaded_file):
+    """Путь сохраненной загрузки; хэш содержимого считается один раз на файл"""
+    key = f"upload:{uploaded_file.file_id}"
+    if key not in st.session_state:
+        st.session_state[key] = str(store_upload(uploaded_file.getvalue()))
+    return st.session_state[key]
+
 
 st.title('📊 Logistics Analyzer Dashboard')
 st.write("Анализ логистических данных в реальном времени")
@@ -9,15 +33,37 @@ st.write("Анализ логистических данных в реально
 uploaded_file = st.file_uploader("Загрузите CSV файл", type="csv")
 
 if uploaded_file:
-    df = pd.read_csv(uploaded_file)
-    st.write(f"Загружено {len(df)} записей")
+    data = load_dashboard_data(upload_path(uploaded_file))
+    st.write(f"Загружено {data.total_rows} записей")
+    
+    # Фильтры
+    with st.sidebar:
+        st.header("Фильтры")
+        carriers = st.multiselect("Перевозчики", data.carriers)
+        routes = st.multiselect("Маршруты", data.routes)
+        cargo_types = st.multiselect("Типы груза", data.cargo_types)
+        # Полный диапазон - без фильтра по датам (строки без даты учитываются)
+        period = st.date_input(
+            "Период", value=(data.date_min, data.date_max),
+            min_value=data.date_min, max_value=data.date_max,
+        ) if data.date_min is not None else None
+    start, end = data.period_filter(period)
+    filters = dict(carriers=carriers, routes=routes, cargo_types=cargo_types, start=start, end=end)
+    
+    summary = data.summary(**filters)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Перевозок", f"{summary['count']:,}")
+    col2.metric("Общая стоимость, руб", f"{summary['total_cost']:,.0f}")
+    col3.metric("Стоимость за км, руб", f"{summary['avg_cost_per_km']:.2f}")
     
-    # Показ данных
+    # Показ данных (постранично)
     if st.checkbox("Показать данные"):
-        st.dataframe(df)
+        page = st.number_input("Страница", min_value=1, value=1, step=1)
+        rows, total = data.page(int(page), PAGE_SIZE, **filters)
+        st.caption(f"Строк в срезе: {total:,}, страниц: {max(1, -(-total // PAGE_SIZE)):,}")
+        st.dataframe(rows)
     
     # Графики
     st.subheader("📈 Визуализация")
-    fig, ax = plt.subplots()
-    df.groupby('carrier')['cost_rub'].sum().plot(kind='bar', ax=ax)
-    st.pyplot(fig)
+    st.bar_chart(data.by_carrier(**filters))
+    st.line_chart(data.timeline(**filters))
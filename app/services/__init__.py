@@ -0,0 +1 @@
+"""Бизнес-логика: анализаторы и сервисы"""
@@ -1,21 +1,165 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime
+
+from app.utils.data_loader import derived_path, load_shipments
+from app.utils.profiling import Profiler, profiled
+from app.utils.schema import union_columns
+from app.services.consolidation import TRUCK, Consolidation
+from app.services.cost_forecast import COST_MODEL_FILE, CostForecaster
+from app.services.date_index import DateIndex, load_date_index
+from app.services.distances import DISTANCE_TOLERANCE, default_matrix
+from app.services.route_index import RouteIndex
+from app.services.route_optimizer import RouteGraph
+from app.services.sql_store import ENGINES, ShipmentStore
+
+ROUTE_GRAPH_FILE = 'route_graph.npz'
+ROUTE_INDEX_FILE = 'route_index.npz'
 
 class AdvancedLogisticsAnalyzer:
-    def __init__(self, data_path):
-        self.df = pd.read_csv(data_path)
-        
-    def calculate_kpis(self):
-        """Расчет KPI"""
+    # Колонки KPI и производных структур: из файла читаются только они
+    COLUMNS = union_columns(('from_city', 'to_city', 'cost_rub', 'distance_km'), DateIndex.COLUMNS,
+                            RouteGraph.COLUMNS, RouteIndex.COLUMNS, CostForecaster.COLUMNS,
+                            Consolidation.COLUMNS)
+
+    def __init__(self, data_path, engine='pandas', db_path=None, columns=()):
+        """engine='sql' - KPI считаются запросами к SQLite (db_path или
+        рядом с кэшем файла), данные в память загружаются только для
+        графа и индекса маршрутов. columns - колонки, нужные вызывающему
+        коду сверх COLUMNS. Этапы замеряются в self.profiler."""
+        if engine not in ENGINES:
+            raise ValueError(f"Неизвестный движок {engine}, доступны: {', '.join(ENGINES)}")
+        self.data_path = data_path
+        self.columns = union_columns(self.COLUMNS, columns)
+        self.engine = engine
+        self.profiler = Profiler(type(self).__name__)
+        self.store = None
+        self._df = None
+        with self.profiler.stage('load') as stage:
+            if engine == 'sql':
+                self.store = ShipmentStore.for_files([data_path], db_path)
+                rows = self.store.execute("SELECT COUNT(*) FROM shipments").fetchone()[0]
+            else:
+                self._df = load_shipments(data_path, self.columns, missing='ignore')
+                rows = len(self._df)
+            stage['rows'] = self.profiler.rows = rows
+        self._route_graph = None
+        self._route_index = None
+        self._cost_model = None
+        self._date_index = None
+    
+    @property
+    def df(self):
+        if self._df is None:
+            with self.profiler.stage('load_frame'):
+                self._df = load_shipments(self.data_path, self.columns, missing='ignore')
+        return self._df
+    
+    def date_index(self):
+        """Отсортированный индекс дат (DateIndex, из кэша рядом с файлом)"""
+        if self._date_index is None:
+            with self.profiler.stage('date_index'):
+                self._date_index = load_date_index(self.data_path, self.df)
+        return self._date_index
+    
+    @profiled
+    def calculate_kpis(self, start=None, end=None):
+        """Расчет KPI (start/end - окно дат включительно, выбирается бинарным поиском)"""
+        if self.store is not None:
+            return self._calculate_kpis_sql(start, end)
+        df = self.df
+        if start is not None or end is not None:
+            df = self.date_index().select(df, start, end)
+        if not len(df):
+            return {'total_shipments': 0, 'total_revenue': 0.0, 'avg_cost_per_km': None,
+                    'most_common_route': None}
+        return {
+            'total_shipments': len(df),
+            'total_revenue': df['cost_rub'].sum(),
+            'avg_cost_per_km': (df['cost_rub'] / df['distance_km']).mean(),
+            'most_common_route': df.groupby(['from_city', 'to_city'], observed=True).size().idxmax()
+        }
+    
+    def _calculate_kpis_sql(self, start=None, end=None):
+        where, params = self.store.where_clause(start, end, {})
+        total, revenue, avg_cost_per_km = self.store.execute(
+            f"SELECT COUNT(*), SUM(cost_rub), AVG(cost_rub / distance_km) FROM shipments{where}", params
+        ).fetchone()
+        # При равенстве - первый маршрут по алфавиту, как idxmax по сгруппированным данным
+        route = self.store.execute(
+            f"SELECT from_city, to_city FROM shipments{where} GROUP BY from_city, to_city "
+            "ORDER BY COUNT(*) DESC, from_city, to_city LIMIT 1", params
+        ).fetchone()
         return {
-            'total_shipments': len(self.df),
-            'total_revenue': self.df['cost_rub'].sum(),
-            'avg_cost_per_km': (self.df['cost_rub'] / self.df['distance_km']).mean(),
-            'most_common_route': self.df.groupby(['from_city', 'to_city']).size().idxmax()
+            'total_shipments': total,
+            'total_revenue': revenue if revenue is not None else 0.0,
+            'avg_cost_per_km': avg_cost_per_km,
+            'most_common_route': tuple(route) if route else None,
         }
     
     def optimize_routes(self):
-        """Оптимизация маршрутов"""
-        # TODO: Реализовать алгоритм оптимизации
-        pass
+        """Оптимизация маршрутов
+        
+        Возвращает RouteGraph с предрасчитанными кратчайшими путями между
+        всеми городами (по стоимости, стоимости за кг и срокам, для каждого
+        перевозчика и для любого). Граф сохраняется рядом с колоночным кэшем
+        данных и перестраивается только при изменении исходного файла.
+        """
+        if self._route_graph is None:
+            with self.profiler.stage('optimize_routes'):
+                self._route_graph = self._load_derived(ROUTE_GRAPH_FILE, RouteGraph)
+        return self._route_graph
+    
+    def route_index(self):
+        """Индекс маршрутов по перевозчикам, типам груза и месяцам (RouteIndex)"""
+        if self._route_index is None:
+            with self.profiler.stage('route_index'):
+                self._route_index = self._load_derived(ROUTE_INDEX_FILE, RouteIndex)
+        return self._route_index
+    
+    def top_routes(self, n=5, metric='avg_cost_per_km', largest=False, **filters):
+        """Top-N маршрутов из индекса (см. RouteIndex.top)"""
+        return self.route_index().top(n, metric, largest, **filters)
+    
+    def cost_forecaster(self):
+        """Модели стоимости по маршрутам и перевозчикам (CostForecaster)"""
+        if self._cost_model is None:
+            with self.profiler.stage('cost_forecaster'):
+                self._cost_model = self._load_derived(COST_MODEL_FILE, CostForecaster)
+        return self._cost_model
+    
+    def forecast_costs(self, shipments, by='route'):
+        """Прогноз стоимости для набора (гипотетических) перевозок.
+        
+        shipments - DataFrame или dict массивов с колонками distance_km,
+        weight_kg, cargo_type, carrier, from_city, to_city, date.
+        """
+        forecaster = self.cost_forecaster()
+        with self.profiler.stage('forecast_costs', rows=len(shipments['distance_km'])):
+            return forecaster.predict(shipments, by)
+    
+    def consolidate(self, vehicle=TRUCK, window_days=1, start=None, end=None):
+        """Консолидация перевозок окна дат [start, end] в загрузки машин
+        по направлениям и окнам по window_days дней (Consolidation)"""
+        df = self.df
+        if start is not None or end is not None:
+            df = self.date_index().select(df, start, end)
+        with self.profiler.stage('consolidate', rows=len(df)):
+            return Consolidation.from_frame(df, vehicle, window_days)
+    
+    def check_distances(self, tolerance=DISTANCE_TOLERANCE, distances=None):
+        """Перевозки, у которых distance_km расходится с матрицей расстояний
+        городов больше чем на долю tolerance (см. DistanceMatrix.check)"""
+        distances = distances if distances is not None else default_matrix()
+        df = self.df
+        with self.profiler.stage('check_distances', rows=len(df)):
+            return distances.check(df, tolerance)
+    
+    def _load_derived(self, name, cls):
+        """Производная структура из кэша или построение и сохранение"""
+        path = derived_path(self.data_path, name)
+        if path.exists():
+            try:
+                return cls.load(path)
+            except ValueError:
+                pass  # файл старого формата - строится заново
+        result = cls.from_frame(self.df)
+        result.save(path)
+        return result
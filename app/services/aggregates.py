@@ -0,0 +1,359 @@
+"""
+Частичные агрегаты по перевозкам для распределенного анализа
+
+Каждый файл (день, регион) сворачивается в ShipmentPartial независимо,
+в отдельном процессе. Частичные агрегаты объединяются через merge()
+в один, из которого ExtendedLogisticsAnalyzer печатает тот же отчет,
+что и по одному файлу.
+
+Суммы в разрезе перевозчиков, маршрутов и месяцев берутся из куба
+RollupCube (by_carrier, by_route, by_month - его срезы). Куб по файлу
+сохраняется рядом с колоночным кэшем и повторно не строится.
+Вместо куба можно подставить ShipmentStore (from_store): те же срезы
+и медианы считаются запросами к SQLite, без загрузки данных в память.
+
+В приближенном режиме (approx=True) вместо массивов стоимостей хранятся
+скетчи из app.utils.sketches: память агрегата не зависит от числа строк,
+а медианы и перцентили считаются с заданной относительной ошибкой.
+
+В точном режиме для медиан хранятся различные значения стоимости по
+перевозчикам с числом повторов (отсортированные массивы, объединяются
+слиянием). Стоимости в рублях повторяются, поэтому такой агрегат меньше
+самих строк, но в худшем случае (все стоимости различны) и память
+агрегата, и передача его из процесса - O(строк). Для больших файлов
+нужен approx=True.
+"""
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial as bind, reduce
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.utils.data_loader import derived_path, load_shipments
+from app.utils.sketches import HyperLogLog, QuantileSketch
+from app.services.date_index import MISSING_DAY, day_label
+from app.services.rollup_cube import RollupCube
+
+ROLLUP_CUBE_FILE = 'rollup_cube.npz'
+
+# Метрики, для которых в приближенном режиме хранятся скетчи квантилей
+SKETCH_METRICS = ('cost', 'cost_per_km', 'delivery_days')
+# Уникальные значения, оцениваемые через HyperLogLog
+DISTINCT_KEYS = ('customers', 'cities', 'routes')
+
+
+def load_cube(path, df=None):
+    """Куб по файлу из кэша или построение и сохранение"""
+    cube_path = derived_path(path, ROLLUP_CUBE_FILE)
+    if cube_path.exists():
+        try:
+            return RollupCube.load(cube_path)
+        except ValueError:
+            pass  # куб старого формата - строится заново
+    if df is None:
+        df = load_shipments(path, RollupCube.COLUMNS, missing='ignore')
+    cube = RollupCube.from_frame(df)
+    cube.save(cube_path)
+    return cube
+
+
+def _present(labels, codes):
+    """Значения измерения, встречающиеся в ячейках куба"""
+    codes = np.unique(codes)
+    return {labels[c] for c in codes[codes >= 0]}
+
+
+def _value_counts(values):
+    """Отсортированные различные значения и число повторов каждого"""
+    values, counts = np.unique(values, return_counts=True)
+    return values, counts.astype(np.int64)
+
+
+def _merge_counts(*summaries):
+    """Слияние пар (значения, повторы) в одну такую же пару"""
+    values = np.concatenate([v for v, _ in summaries])
+    counts = np.concatenate([c for _, c in summaries])
+    merged, inverse = np.unique(values, return_inverse=True)
+    return merged, np.bincount(inverse, weights=counts, minlength=len(merged)).astype(np.int64)
+
+
+def _counts_median(values, counts):
+    """Точная медиана по значениям с числом повторов (как np.median по строкам)"""
+    if not len(values):
+        return float('nan')
+    bounds = np.cumsum(counts)
+    total = bounds[-1]
+    lo, hi = np.searchsorted(bounds, [(total - 1) // 2, total // 2], side='right')
+    return float((values[lo] + values[hi]) / 2)
+
+
+def _split_indices(codes, labels):
+    """Номера строк по значениям (одна устойчивая сортировка кодов)"""
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    return {labels[i]: order[bounds[i]:bounds[i + 1]]
+            for i in range(len(labels)) if bounds[i + 1] > bounds[i]}
+
+
+class ShipmentPartial:
+    """Объединяемые агрегаты: счетчики, куб сумм RollupCube и данные для медиан.
+
+    Для медиан хранятся различные значения стоимости по перевозчикам
+    с числом повторов: carrier -> (values float64, counts int64), так как
+    точная медиана не сводится к суммам. Размер - O(различных стоимостей),
+    в худшем случае O(строк). При approx=True вместо
+    них хранятся скетчи квантилей по SKETCH_METRICS с ошибкой
+    quantile_accuracy и HyperLogLog по DISTINCT_KEYS с ошибкой distinct_error.
+    """
+
+    def __init__(self, approx=False, quantile_accuracy=0.01, distinct_error=0.01):
+        self.approx = approx
+        self.quantile_accuracy = quantile_accuracy
+        self.distinct_error = distinct_error
+        self.count = 0
+        self.cost_sum = 0.0
+        self.distance_sum = 0
+        self.weight_sum = 0
+        self.date_min = None
+        self.date_max = None
+        self.from_cities = set()
+        self.carriers = set()
+        self.cube = None             # RollupCube или ShipmentStore
+        self.store = None            # ShipmentStore, если агрегат построен по базе
+        self._views = {}
+        # carrier -> (отсортированные стоимости, число повторов)
+        self.carrier_costs = {}
+        # approx: carrier -> {metric: QuantileSketch}
+        self.sketches = {}
+        # approx: key -> HyperLogLog
+        self.distinct = {}
+
+    @staticmethod
+    def columns(approx=False):
+        """Колонки данных для from_frame (customer_segment, priority и колонки
+        скетчей необязательны: загружать с missing='ignore')"""
+        return RollupCube.COLUMNS + (('delivery_days', 'customer_id') if approx else ())
+
+    def _options(self):
+        return dict(approx=self.approx, quantile_accuracy=self.quantile_accuracy,
+                    distinct_error=self.distinct_error)
+
+    @classmethod
+    def from_frame(cls, df, cube=None, **options):
+        """Агрегаты по одному DataFrame (options - параметры __init__).
+
+        cube - готовый куб по этим же данным (например, из кэша).
+        """
+        partial = cls(**options)
+        partial.count = len(df)
+        if not partial.count:
+            return partial
+        partial.cube = RollupCube.from_frame(df) if cube is None else cube
+
+        # Итоги, период и справочники - по ячейкам куба, а не по строкам
+        cells, labels = partial.cube.days, partial.cube.labels
+        partial.cost_sum = float(cells['cost_sum'].sum())
+        partial.distance_sum = cells['distance_sum'].sum()
+        partial.weight_sum = cells['weight_sum'].sum()
+        # Период - по номерам дней, а не сравнением строк
+        days = cells['day'][cells['day'] != MISSING_DAY]
+        if len(days):
+            partial.date_min = day_label(days.min())
+            partial.date_max = day_label(days.max())
+        partial.from_cities = _present(labels['from_city'], cells['from_city'])
+        partial.carriers = _present(labels['carrier'], cells['carrier'])
+
+        # Второй проход по строкам - значения для медиан (или скетчи)
+        cost = df['cost_rub'].to_numpy(dtype=np.float64)
+        codes, carriers = category_codes(df['carrier'])
+        indices = _split_indices(codes, carriers)
+        if partial.approx:
+            partial._fill_sketches(df, cost, indices)
+        else:
+            partial.carrier_costs = {carrier: _value_counts(cost[idx]) for carrier, idx in indices.items()}
+        return partial
+
+    def _fill_sketches(self, df, cost, indices):
+        metrics = {'cost': cost, 'cost_per_km': cost / df['distance_km'].to_numpy()}
+        if 'delivery_days' in df.columns:
+            metrics['delivery_days'] = df['delivery_days'].to_numpy(dtype=np.float64)
+        for carrier, idx in indices.items():
+            self.sketches[carrier] = {
+                name: QuantileSketch(self.quantile_accuracy).update(values[idx])
+                for name, values in metrics.items()
+            }
+
+        self.distinct = {key: HyperLogLog(self.distinct_error) for key in DISTINCT_KEYS}
+        if 'customer_id' in df.columns:
+            self.distinct['customers'].update(df['customer_id'].to_numpy())
+        from_city = df['from_city'].astype(str).to_numpy()
+        to_city = df['to_city'].astype(str).to_numpy()
+        self.distinct['cities'].update(from_city)
+        self.distinct['cities'].update(to_city)
+        self.distinct['routes'].update(pd.Series(from_city) + ' → ' + pd.Series(to_city))
+
+    @classmethod
+    def from_file(cls, path, **options):
+        df = load_shipments(path, cls.columns(options.get('approx')), missing='ignore')
+        return cls.from_frame(df, cube=load_cube(path, df), **options)
+
+    @classmethod
+    def from_store(cls, store):
+        """Агрегаты по хранилищу SQLite: суммы, срезы и медианы считаются в базе"""
+        partial = cls()
+        totals = store.totals()
+        partial.count = totals['count']
+        if not partial.count:
+            return partial
+        partial.cost_sum = totals['cost_sum']
+        partial.distance_sum = totals['distance_sum']
+        partial.weight_sum = totals['weight_sum']
+        partial.date_min, partial.date_max = store.date_range()
+        partial.from_cities = set(store.distinct('from_city'))
+        partial.carriers = set(store.distinct('carrier'))
+        partial.cube = partial.store = store
+        return partial
+
+    def _view(self, name, columns, **query):
+        """Срез куба (кэшируется: агрегат после построения не меняется)"""
+        if self.cube is None:
+            return None
+        if name not in self._views:
+            self._views[name] = self.cube.query(**query)[list(columns)]
+        return self._views[name]
+
+    @property
+    def by_carrier(self):
+        """index: carrier; count, cost_sum, distance_sum, weight_sum, cost_per_km_sum/_count"""
+        return self._view('carrier', ('count', 'cost_sum', 'distance_sum', 'weight_sum', 'cost_per_km_sum',
+                                      'cost_per_km_count'), by='carrier')
+
+    @property
+    def by_route(self):
+        """index: (from_city, to_city); count, cost_sum, distance_sum, cost_per_km_sum/_count"""
+        return self._view('route', ('count', 'cost_sum', 'distance_sum', 'cost_per_km_sum', 'cost_per_km_count'),
+                          by=('from_city', 'to_city'))
+
+    @property
+    def by_month(self):
+        """index: month ('YYYY-MM'); count, cost_sum, weight_sum"""
+        return self._view('month', ('count', 'cost_sum', 'weight_sum'), grain='month')
+
+    def merge(self, other):
+        """Объединение двух частичных агрегатов (возвращает новый объект)"""
+        if self._options() != other._options():
+            raise ValueError("Нельзя объединить агрегаты с разными параметрами скетчей")
+        if self.store is not None or other.store is not None:
+            raise ValueError("Агрегаты по SQLite не объединяются: загрузите все файлы в одно хранилище")
+        merged = ShipmentPartial(**self._options())
+        merged.count = self.count + other.count
+        merged.cost_sum = self.cost_sum + other.cost_sum
+        merged.distance_sum = self.distance_sum + other.distance_sum
+        merged.weight_sum = self.weight_sum + other.weight_sum
+
+        dates_min = [d for d in (self.date_min, other.date_min) if d is not None]
+        dates_max = [d for d in (self.date_max, other.date_max) if d is not None]
+        merged.date_min = min(dates_min) if dates_min else None
+        merged.date_max = max(dates_max) if dates_max else None
+
+        merged.from_cities = self.from_cities | other.from_cities
+        merged.carriers = self.carriers | other.carriers
+        cubes = [c for c in (self.cube, other.cube) if c is not None]
+        merged.cube = cubes[0].merge(cubes[1]) if len(cubes) == 2 else next(iter(cubes), None)
+
+        merged.carrier_costs = dict(self.carrier_costs)
+        for carrier, costs in other.carrier_costs.items():
+            if carrier in merged.carrier_costs:
+                merged.carrier_costs[carrier] = _merge_counts(merged.carrier_costs[carrier], costs)
+            else:
+                merged.carrier_costs[carrier] = costs
+
+        # Скетчи объединяются на месте, поэтому работаем с копиями
+        merged.sketches = copy.deepcopy(self.sketches)
+        for carrier, sketches in other.sketches.items():
+            if carrier not in merged.sketches:
+                merged.sketches[carrier] = copy.deepcopy(sketches)
+                continue
+            for name, sketch in sketches.items():
+                if name in merged.sketches[carrier]:
+                    merged.sketches[carrier][name].merge(sketch)
+                else:
+                    merged.sketches[carrier][name] = copy.deepcopy(sketch)
+
+        merged.distinct = copy.deepcopy(self.distinct) or copy.deepcopy(other.distinct)
+        if self.distinct:
+            for key, hll in other.distinct.items():
+                merged.distinct[key].merge(hll)
+        return merged
+
+    def carrier_quantiles(self, metric='cost', quantiles=(0.5, 0.95)):
+        """Квантили метрики по перевозчикам (только в приближенном режиме).
+
+        Столбцы - p50, p95 и т.д.; перевозчики без метрики получают NaN.
+        """
+        if not self.approx:
+            raise ValueError("Квантили по скетчам доступны только при approx=True")
+        rows = {}
+        for carrier, sketches in self.sketches.items():
+            sketch = sketches.get(metric)
+            rows[carrier] = [sketch.quantile(q) if sketch else np.nan for q in quantiles]
+        columns = [f"p{round(q * 100):g}" for q in quantiles]
+        table = pd.DataFrame.from_dict(rows, orient='index', columns=columns, dtype=np.float64)
+        return table.rename_axis('carrier')
+
+    def distinct_count(self, key):
+        """Оценка числа уникальных значений (customers, cities, routes)"""
+        if not self.approx:
+            raise ValueError("Оценка уникальных значений доступна только при approx=True")
+        return self.distinct[key].count()
+
+    def carrier_median_cost(self):
+        """Медиана стоимости по перевозчикам"""
+        if self.store is not None:
+            return self.store.carrier_median_cost()
+        if self.approx:
+            return self.carrier_quantiles('cost', (0.5,))['p50']
+        medians = pd.Series(
+            {carrier: _counts_median(*costs) for carrier, costs in self.carrier_costs.items()},
+            dtype=np.float64,
+        )
+        return medians.rename_axis('carrier')
+
+    def median_cost(self):
+        """Медиана стоимости по всем перевозкам"""
+        if self.store is not None:
+            return self.store.median_cost()
+        if self.approx:
+            total = QuantileSketch(self.quantile_accuracy)
+            for sketches in self.sketches.values():
+                total.merge(sketches['cost'])
+            return total.median()
+        if not self.carrier_costs:
+            return float('nan')
+        return _counts_median(*_merge_counts(*self.carrier_costs.values()))
+
+
+def aggregate_files(paths, workers=None, **options):
+    """Агрегаты по нескольким файлам, по файлу на процесс.
+
+    workers=None - по числу ядер. Результаты объединяются в порядке файлов.
+    options передаются в ShipmentPartial (approx, quantile_accuracy, ...).
+    """
+    paths = [Path(p) for p in paths]
+    if not paths:
+        raise FileNotFoundError("Не найдено ни одного входного файла")
+
+    load = bind(ShipmentPartial.from_file, **options)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers == 1:
+        partials = map(load, paths)
+        return reduce(ShipmentPartial.merge, partials)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = pool.map(load, paths)
+        return reduce(ShipmentPartial.merge, partials)
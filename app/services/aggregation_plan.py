@@ -0,0 +1,468 @@
+"""
+Декларативные агрегации и планировщик проходов по данным
+
+Агрегация (Aggregation) описывает, что посчитать: метрики, ключи
+разбивки, гранулярность времени, фильтры и окно дат. AggregationPlan
+сводит набор агрегаций к минимуму проходов по строкам:
+
+1. Один проход на все свертываемые метрики (count, sum, mean, min, max):
+   строки сворачиваются в ячейки по объединению ключей всех агрегаций,
+   измерений их фильтров и дня (если нужны время или окно дат). Каждая
+   агрегация затем считается по ячейкам - их на порядки меньше строк.
+2. Медианы сворачиваться не умеют: по проходу на группу агрегаций с
+   одинаковыми ключами, фильтрами и окном (все колонки медиан - разом).
+
+Коды ключей и производные колонки (cost_per_km, route и т.п.) считаются
+один раз за выполнение плана; исходный DataFrame не изменяется.
+
+Метрики: 'count' и '<колонка>_<функция>', колонки - COLUMNS и DERIVED,
+функции - AGGREGATES (например, 'cost_sum', 'cost_per_km_mean',
+'delivery_days_median'). Ключи - строковые колонки данных и производный
+'route' ("Откуда → Куда").
+
+Планы, в которых есть только count/sum/mean по измерениям куба,
+выполняются и по RollupCube или ShipmentStore (execute_cube).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.utils.dates import as_day
+from app.services.date_index import MISSING_DAY, day_numbers
+from app.services.rollup_cube import DIMENSIONS, GRAINS, RollupCube
+
+# Колонки метрик -> колонки данных
+COLUMNS = {'cost': 'cost_rub', 'distance': 'distance_km', 'weight': 'weight_kg',
+           'delivery_days': 'delivery_days'}
+# Производные колонки: числитель / знаменатель
+DERIVED = {'cost_per_km': ('cost', 'distance'), 'cost_per_kg': ('cost', 'weight')}
+
+# median считается отдельным проходом, остальные - по ячейкам
+AGGREGATES = ('sum', 'mean', 'min', 'max', 'median')
+
+ROUTE = 'route'
+
+# Метрики, доступные по кубу: метрика -> мера куба (mean = мера / count)
+CUBE_MEASURES = {'cost': 'cost_sum', 'distance': 'distance_sum', 'weight': 'weight_sum',
+                 'cost_per_km': 'cost_per_km_sum'}
+# Число строк, по которым посчитана мера (по умолчанию - count)
+CUBE_COUNTS = {'cost_per_km': 'cost_per_km_count'}
+
+# Порог размера составного ключа, после которого он перенумеровывается
+_MAX_KEY_SPACE = 1 << 62
+
+
+def parse_metric(metric):
+    """'cost_per_km_mean' -> ('cost_per_km', 'mean'); 'count' -> (None, 'count')"""
+    if metric == 'count':
+        return None, 'count'
+    column, _, func = metric.rpartition('_')
+    if func not in AGGREGATES or (column not in COLUMNS and column not in DERIVED):
+        raise ValueError(f"Неизвестная метрика {metric}: ожидается count или "
+                         f"<{'|'.join([*COLUMNS, *DERIVED])}>_<{'|'.join(AGGREGATES)}>")
+    return column, func
+
+
+@dataclass(frozen=True)
+class Aggregation:
+    """Одна агрегация.
+
+    metrics - метрики (см. parse_metric), keys - ключи разбивки, grain -
+    гранулярность времени (из GRAINS), filters - измерение -> значение или
+    список значений, start/end - окно дат включительно.
+    """
+    name: str
+    metrics: tuple
+    keys: tuple = ()
+    grain: str = None
+    filters: tuple = ()
+    start: str = None
+    end: str = None
+
+    def __post_init__(self):
+        metrics = (self.metrics,) if isinstance(self.metrics, str) else tuple(self.metrics)
+        keys = (self.keys,) if isinstance(self.keys, str) else tuple(self.keys)
+        filters = dict(self.filters)
+        filters = tuple(sorted(
+            (dim, (value,) if isinstance(value, str) else tuple(value))
+            for dim, value in filters.items() if value is not None
+        ))
+        for metric in metrics:
+            parse_metric(metric)
+        if self.grain is not None and self.grain not in GRAINS:
+            raise ValueError(f"Неизвестная гранулярность {self.grain}, доступны: {', '.join(GRAINS)}")
+        object.__setattr__(self, 'metrics', metrics)
+        object.__setattr__(self, 'keys', keys)
+        object.__setattr__(self, 'filters', filters)
+        for name in ('start', 'end'):
+            value = getattr(self, name)
+            object.__setattr__(self, name, None if value is None else str(value)[:10])
+
+    @property
+    def dimensions(self):
+        """Ключи и измерения фильтров"""
+        return (*self.keys, *(dim for dim, _ in self.filters))
+
+    @property
+    def needs_day(self):
+        return self.grain is not None or self.start is not None or self.end is not None
+
+    def _signature(self):
+        """Агрегации с одной сигнатурой считают медианы за один проход"""
+        return self.keys, self.grain, self.filters, self.start, self.end
+
+
+class _Columns:
+    """Коды ключей и значения колонок по строкам (каждая считается один раз)"""
+
+    def __init__(self, df):
+        self.df = df
+        self._codes = {}
+        self._values = {}
+
+    def codes(self, key):
+        """(коды int64, подписи) ключа; подписи упорядочены по возрастанию"""
+        if key not in self._codes:
+            if key == 'day':
+                days = day_numbers(self.df['date'])
+                known = days != MISSING_DAY
+                # Пропущенная дата - код -1: не попадает ни в периоды, ни в окна
+                codes = np.full(len(days), -1, dtype=np.int64)
+                codes[known], labels = pd.factorize(days[known], sort=True)
+            elif key == ROUTE:
+                from_codes, from_labels = self.codes('from_city')
+                to_codes, to_labels = self.codes('to_city')
+                cities = sorted(set(from_labels) | set(to_labels))
+                index = {c: i for i, c in enumerate(cities)}
+                # Перекодирование в общий словарь городов; пропуск (-1) остается -1
+                from_codes = np.array([index[c] for c in from_labels] + [-1], dtype=np.int64)[from_codes]
+                to_codes = np.array([index[c] for c in to_labels] + [-1], dtype=np.int64)[to_codes]
+                valid = (from_codes >= 0) & (to_codes >= 0)
+                pairs = from_codes * len(cities) + to_codes
+                uniques = np.unique(pairs[valid])
+                codes = np.where(valid, np.searchsorted(uniques, pairs), -1)
+                labels = [f"{cities[p // len(cities)]} → {cities[p % len(cities)]}" for p in uniques]
+            else:
+                if key not in self.df.columns:
+                    raise ValueError(f"Нет колонки {key} для ключа агрегации")
+                codes, labels = category_codes(self.df[key])
+                if labels != sorted(labels):
+                    # Категории колонки могут быть не по порядку
+                    order = np.argsort(labels)
+                    rank = np.empty_like(order)
+                    rank[order] = np.arange(len(order))
+                    codes = np.where(codes < 0, -1, rank[codes])
+                    labels = [labels[i] for i in order]
+            self._codes[key] = (np.asarray(codes, dtype=np.int64), np.asarray(labels))
+        return self._codes[key]
+
+    def values(self, column):
+        """Значения колонки метрики (float64, пропуск - NaN)"""
+        if column not in self._values:
+            if column in DERIVED:
+                numerator, denominator = DERIVED[column]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    values = self.values(numerator) / self.values(denominator)
+                values[~np.isfinite(values)] = np.nan
+            else:
+                values = self.df[COLUMNS[column]].to_numpy(dtype=np.float64)
+            self._values[column] = values
+        return self._values[column]
+
+
+def _group_ids(codes, sizes, n):
+    """Номера групп n строк по кодам ключей и номер первой строки каждой группы.
+
+    Коды - от -1 (пропуск) до size - 2: пропуск - отдельное значение.
+    """
+    if not codes:
+        return np.zeros(n, dtype=np.int64), 1, np.zeros(1, dtype=np.int64)
+    flat, space = codes[0] + 1, sizes[0]
+    for c, size in zip(codes[1:], sizes[1:]):
+        if space * size >= _MAX_KEY_SPACE:
+            flat, uniques = pd.factorize(flat)
+            space = len(uniques)
+        flat = flat * size + (c + 1)
+        space *= size
+    inverse, uniques = pd.factorize(flat)
+    first = np.empty(len(uniques), dtype=np.int64)
+    first[inverse[::-1]] = np.arange(n - 1, -1, -1)
+    return inverse.astype(np.int64), len(uniques), first
+
+
+def _fold(inverse, n_groups, counts, folded):
+    """Свертка ячеек (или строк) по номерам групп.
+
+    counts - число строк ячейки; folded - колонка -> {'n', 'sum', 'min', 'max'}.
+    """
+    result = {'count': np.bincount(inverse, weights=counts, minlength=n_groups).astype(np.int64)}
+    for column, parts in folded.items():
+        out = {}
+        for part, values in parts.items():
+            if part in ('n', 'sum'):
+                out[part] = np.bincount(inverse, weights=values, minlength=n_groups)
+            else:
+                ufunc = np.fmin if part == 'min' else np.fmax
+                acc = np.full(n_groups, np.nan)
+                ufunc.at(acc, inverse, values)
+                out[part] = acc
+        result[column] = out
+    return result
+
+
+def _period_values(days, grain):
+    """Номера периодов по номерам дней и функция подписи периода"""
+    return RollupCube._periods(lambda name: days, 'day', grain)
+
+
+class AggregationPlan:
+    """План выполнения набора агрегаций за минимум проходов по строкам"""
+
+    def __init__(self, aggregations):
+        self.aggregations = tuple(aggregations)
+        names = [a.name for a in self.aggregations]
+        if len(set(names)) != len(names):
+            raise ValueError("Имена агрегаций должны быть уникальны")
+
+        # Проход 1: ячейки по объединению измерений (и дня) со свертываемыми колонками
+        self.cell_keys = []
+        self.cell_columns = {}          # колонка -> набор частей: n, sum, min, max
+        for a in self.aggregations:
+            for key in a.dimensions:
+                if key not in self.cell_keys:
+                    self.cell_keys.append(key)
+            for metric in a.metrics:
+                column, func = parse_metric(metric)
+                if func in ('sum', 'mean'):
+                    self.cell_columns.setdefault(column, set()).update(('n', 'sum'))
+                elif func in ('min', 'max'):
+                    self.cell_columns.setdefault(column, set()).add(func)
+        if any(a.needs_day for a in self.aggregations):
+            self.cell_keys.append('day')
+
+        # Проходы для медиан: сигнатура -> колонки
+        self.median_passes = {}
+        for a in self.aggregations:
+            columns = [parse_metric(m)[0] for m in a.metrics if parse_metric(m)[1] == 'median']
+            if columns:
+                pass_columns = self.median_passes.setdefault(a._signature(), [])
+                pass_columns.extend(c for c in columns if c not in pass_columns)
+
+    @property
+    def columns(self):
+        """Колонки данных, которые читает execute"""
+        names = []
+        for a in self.aggregations:
+            for key in a.dimensions:
+                names.extend(('from_city', 'to_city') if key == ROUTE else (key,))
+            if a.needs_day:
+                names.append('date')
+            for metric in a.metrics:
+                column = parse_metric(metric)[0]
+                parts = DERIVED.get(column, (column,)) if column is not None else ()
+                names.extend(COLUMNS[part] for part in parts)
+        return tuple(dict.fromkeys(names))
+
+    @property
+    def passes(self):
+        """Число проходов по строкам"""
+        return int(bool(self.aggregations)) + len(self.median_passes)
+
+    def explain(self):
+        """Описание проходов плана (строки)"""
+        lines = [f"1. Ячейки по ({', '.join(self.cell_keys) or '—'}): count"
+                 + ''.join(f", {c}[{'/'.join(sorted(parts))}]" for c, parts in self.cell_columns.items())
+                 + f" → {', '.join(a.name for a in self.aggregations)}"]
+        for i, ((keys, grain, filters, start, end), columns) in enumerate(self.median_passes.items(), 2):
+            scope = ', '.join([*keys, *([grain] if grain else [])]) or '—'
+            lines.append(f"{i}. Медианы по ({scope}): {', '.join(columns)}")
+        return lines
+
+    # --- выполнение по строкам ---
+
+    def execute(self, df):
+        """Все агрегации по DataFrame: имя -> DataFrame (индекс - grain и keys)"""
+        if not self.aggregations:
+            return {}
+        columns = _Columns(df)
+        codes = [columns.codes(key) for key in self.cell_keys]
+        inverse, n_cells, first = _group_ids([c for c, _ in codes],
+                                             [len(labels) + 1 for _, labels in codes], len(df))
+        # Пропуск (-1) - отдельное значение ключа, отфильтровывается при подписи
+        cell_codes = {key: c[first] for key, (c, _) in zip(self.cell_keys, codes)}
+        labels = {key: l for key, (_, l) in zip(self.cell_keys, codes)}
+
+        folded = {}
+        for column, parts in self.cell_columns.items():
+            values = columns.values(column)
+            valid = ~np.isnan(values)
+            folded[column] = {}
+            for part in parts:
+                folded[column][part] = valid.astype(np.float64) if part == 'n' else \
+                    np.where(valid, values, 0.0) if part == 'sum' else values
+        cells = _fold(inverse, n_cells, np.ones(len(df)), folded)
+
+        results = {}
+        for a in self.aggregations:
+            mask = self._mask(a, cell_codes, labels, n_cells)
+            results[a.name] = self._finish(a, {k: v[mask] for k, v in cell_codes.items()}, labels,
+                                           cells['count'][mask],
+                                           {c: {p: v[mask] for p, v in parts.items()}
+                                            for c, parts in cells.items() if c != 'count'})
+
+        for signature, median_columns in self.median_passes.items():
+            self._medians(signature, median_columns, columns, results)
+        return results
+
+    @staticmethod
+    def _mask(a, cell_codes, labels, n):
+        """Маска n ячеек (или строк) по фильтрам и окну дат агрегации"""
+        mask = np.ones(n, dtype=bool)
+        for dim, values in a.filters:
+            wanted = np.flatnonzero(np.isin(labels[dim], values))
+            mask &= np.isin(cell_codes[dim], wanted)
+        if a.start is not None or a.end is not None:
+            mask &= cell_codes['day'] >= 0
+            days = np.append(labels['day'], 0)[cell_codes['day']]
+            if a.start is not None:
+                mask &= days >= as_day(a.start)
+            if a.end is not None:
+                mask &= days <= as_day(a.end)
+        return mask
+
+    @staticmethod
+    def _groups(a, codes, labels, n):
+        """Номера групп агрегации по n ячейкам (строкам), их число и индекс результата"""
+        names, key_codes, key_labels = [], [], []
+        if a.grain is not None:
+            days = np.append(labels['day'], 0)[codes['day']].astype(np.int64)
+            periods, label = _period_values(days, a.grain)
+            period_codes, period_values = pd.factorize(periods, sort=True)
+            names.append(a.grain)
+            # Строки без даты не входят ни в один период
+            key_codes.append(np.where(codes['day'] >= 0, period_codes, -1).astype(np.int64))
+            key_labels.append(np.array([label(p) for p in period_values], dtype=object))
+        for key in a.keys:
+            names.append(key)
+            key_codes.append(codes[key])
+            key_labels.append(np.asarray(labels[key], dtype=object))
+
+        if not names:
+            return np.zeros(n, dtype=np.int64), 1, None
+        present = np.ones(n, dtype=bool)
+        for c in key_codes:
+            present &= c >= 0
+        sizes = [len(l) for l in key_labels]
+        flat = np.ravel_multi_index([c[present] for c in key_codes], sizes) if present.any() \
+            else np.zeros(0, dtype=np.int64)
+        groups, inverse = np.unique(flat, return_inverse=True)
+        index = [l[c] for l, c in zip(key_labels, np.unravel_index(groups, sizes))]
+        index = pd.MultiIndex.from_arrays(index, names=names) if len(names) > 1 \
+            else pd.Index(index[0], name=names[0])
+        ids = np.full(len(present), -1, dtype=np.int64)
+        ids[present] = inverse
+        return ids, len(groups), index
+
+    def _finish(self, a, codes, labels, counts, folded):
+        """Результат агрегации по отобранным ячейкам"""
+        ids, n_groups, index = self._groups(a, codes, labels, len(counts))
+        keep = ids >= 0
+        totals = _fold(ids[keep], n_groups, counts[keep],
+                       {c: {p: v[keep] for p, v in parts.items()} for c, parts in folded.items()})
+        frame = {}
+        for metric in a.metrics:
+            column, func = parse_metric(metric)
+            if func == 'count':
+                frame[metric] = totals['count']
+            elif func == 'sum':
+                frame[metric] = totals[column]['sum']
+            elif func == 'mean':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    frame[metric] = totals[column]['sum'] / totals[column]['n']
+            elif func in ('min', 'max'):
+                frame[metric] = totals[column][func]
+            else:
+                frame[metric] = np.full(n_groups, np.nan)       # медианы - отдельным проходом
+        result = pd.DataFrame(frame, index=index, columns=list(a.metrics))
+        # Группы без строк (все строки отфильтрованы) не выводятся
+        return result[totals['count'] > 0] if index is not None else result
+
+    def _medians(self, signature, median_columns, columns, results):
+        """Проход по строкам: медианы всех агрегаций с данной сигнатурой"""
+        members = [a for a in self.aggregations if a._signature() == signature]
+        a = members[0]
+        keys = [*a.dimensions, *(['day'] if a.needs_day else [])]
+        codes = {key: columns.codes(key)[0] for key in keys}
+        labels = {key: columns.codes(key)[1] for key in keys}
+        rows = self._mask(a, codes, labels, len(columns.df))
+        ids, n_groups, index = self._groups(a, {k: v[rows] for k, v in codes.items()}, labels,
+                                            int(rows.sum()))
+        keep = ids >= 0
+        values = pd.DataFrame({c: columns.values(c)[rows][keep] for c in median_columns})
+        medians = values.groupby(ids[keep]).median().reindex(range(n_groups))
+        for member in members:
+            result = results[member.name]
+            for metric in member.metrics:
+                column, func = parse_metric(metric)
+                if func == 'median':
+                    found = medians[column].to_numpy()
+                    if index is None:
+                        result[metric] = found[:1]
+                    else:
+                        result[metric] = pd.Series(found, index=index).reindex(result.index).to_numpy()
+
+    # --- выполнение по кубу ---
+
+    def execute_cube(self, cube):
+        """Агрегации по RollupCube или ShipmentStore (только count/sum/mean мер куба)"""
+        results = {}
+        for a in self.aggregations:
+            by = []
+            for key in a.keys:
+                by.extend(('from_city', 'to_city') if key == ROUTE else (key,))
+            for key in a.dimensions:
+                if key != ROUTE and key not in DIMENSIONS:
+                    raise ValueError(f"Измерения {key} нет в кубе, доступны: {', '.join(DIMENSIONS)}")
+            for metric in a.metrics:
+                column, func = parse_metric(metric)
+                if func not in ('count', 'sum', 'mean') or (column and column not in CUBE_MEASURES):
+                    raise ValueError(f"Метрика {metric} не считается по кубу")
+            if ROUTE in dict(a.filters):
+                raise ValueError("Фильтр по route не поддерживается кубом: используйте from_city/to_city")
+
+            filters = {dim: list(values) for dim, values in a.filters}
+            if by or a.grain:
+                sums = cube.query(by=by, grain=a.grain, start=a.start, end=a.end, **filters)
+            else:
+                sums = pd.DataFrame([cube.totals(a.start, a.end, **filters)])
+            if ROUTE in a.keys:
+                sums = _route_index(sums, a)
+
+            frame = {}
+            for metric in a.metrics:
+                column, func = parse_metric(metric)
+                if func == 'count':
+                    frame[metric] = sums['count']
+                elif func == 'sum':
+                    frame[metric] = sums[CUBE_MEASURES[column]]
+                else:
+                    frame[metric] = sums[CUBE_MEASURES[column]] / sums[CUBE_COUNTS.get(column, 'count')]
+            result = pd.DataFrame(frame, columns=list(a.metrics))
+            results[a.name] = result if by or a.grain else result.reset_index(drop=True)
+        return results
+
+
+def _route_index(sums, a):
+    """Индекс (from_city, to_city) -> route 'Откуда → Куда' на месте пары уровней"""
+    frame = sums.reset_index()
+    frame[ROUTE] = frame['from_city'].astype(str) + ' → ' + frame['to_city'].astype(str)
+    names = [*([a.grain] if a.grain else []), *a.keys]
+    return frame.set_index(names if len(names) > 1 else names[0]).sort_index()
+
+
+def aggregate(df, *aggregations):
+    """Выполнить агрегации по DataFrame одним планом"""
+    return AggregationPlan(aggregations).execute(df)
@@ -0,0 +1,188 @@
+"""
+Консолидация перевозок в загрузки машин
+
+Перевозки группируются по направлению (откуда, куда) и окну дат
+(window_days дней, от 1970-01-01) и раскладываются по машинам с
+ограничениями по весу и объему (Vehicle). Загрузка консолидируется, если
+рейс машины дешевле суммы cost_rub ее перевозок; иначе перевозки едут
+отдельно, как в данных. Экономия считается против исходных cost_rub.
+
+Укладка - next-fit decreasing: перевозки группы сортируются по убыванию
+веса, машина заполняется подряд идущими перевозками, пока проходят вес и
+объем. Границу загрузки дают два бинарных поиска по накопленным суммам
+веса и объема, поэтому шаг цикла - одна машина сразу во всех группах
+(направления обрабатываются параллельно операциями NumPy), а число шагов
+равно числу машин в самой большой группе, а не числу перевозок. При
+убывающем порядке недогруз машины меньше веса следующей перевозки, а
+перевозки намного меньше вместимости машины - укладка близка к
+first-fit decreasing при линейной сложности.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.services.date_index import MISSING_DAY, day_label, day_numbers
+
+# Запас на погрешность накопленных сумм float64
+_EPS = 1e-6
+
+
+@dataclass(frozen=True)
+class Vehicle:
+    """Машина: вместимость и стоимость рейса (руб/км по расстоянию направления)"""
+    name: str = 'Фура 20 т'
+    max_weight_kg: float = 20000.0
+    max_volume_m3: float = 82.0
+    cost_per_km: float = 90.0
+
+
+TRUCK = Vehicle()
+
+
+def pack_groups(groups, weight, volume, max_weight, max_volume):
+    """Next-fit decreasing по группам.
+
+    groups - номера групп по неубыванию, внутри группы перевозки уже
+    упорядочены (по убыванию веса). Возвращает индексы начала загрузок
+    (возрастающие; загрузка i - строки starts[i]..starts[i+1]).
+    Перевозка тяжелее или объемнее машины занимает загрузку одна.
+    """
+    n = len(groups)
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    cum_weight = np.concatenate([[0.0], np.cumsum(weight, dtype=np.float64)])
+    cum_volume = np.concatenate([[0.0], np.cumsum(volume, dtype=np.float64)])
+    bounds = np.flatnonzero(np.diff(groups)) + 1
+    pointer = np.concatenate([[0], bounds]).astype(np.int64)
+    ends = np.concatenate([bounds, [n]]).astype(np.int64)
+
+    starts = []
+    active = np.arange(len(pointer))
+    while len(active):
+        start, end = pointer[active], ends[active]
+        starts.append(start)
+        by_weight = np.searchsorted(cum_weight, cum_weight[start] + max_weight + _EPS, 'right') - 1
+        by_volume = np.searchsorted(cum_volume, cum_volume[start] + max_volume + _EPS, 'right') - 1
+        stop = np.maximum(np.minimum(np.minimum(by_weight, by_volume), end), start + 1)
+        pointer[active] = stop
+        active = active[stop < end]
+    return np.sort(np.concatenate(starts))
+
+
+class Consolidation:
+    """Загрузки машин по перевозкам.
+
+    loads - DataFrame по машинам (from_city, to_city, window_start,
+    shipments, weight_kg, volume_m3, утилизация, distance_km, original_cost,
+    truck_cost, consolidated); load_ids - номер загрузки для каждой строки
+    исходных данных (-1 - перевозка не рассматривалась: нет даты, веса и т.п.).
+    """
+
+    COLUMNS = ('from_city', 'to_city', 'date', 'weight_kg', 'volume_m3', 'distance_km', 'cost_rub')
+
+    def __init__(self, loads, load_ids, vehicle=TRUCK, window_days=1):
+        self.loads = loads
+        self.load_ids = load_ids
+        self.vehicle = vehicle
+        self.window_days = window_days
+
+    @classmethod
+    def from_frame(cls, df, vehicle=TRUCK, window_days=1):
+        """Консолидация перевозок DataFrame (колонки COLUMNS)"""
+        if window_days < 1:
+            raise ValueError("window_days должно быть не меньше 1")
+        from_codes, from_labels = category_codes(df['from_city'])
+        to_codes, to_labels = category_codes(df['to_city'])
+        days = day_numbers(df['date']).astype(np.int64)
+        weight = df['weight_kg'].to_numpy(dtype=np.float64)
+        volume = df['volume_m3'].to_numpy(dtype=np.float64)
+        distance = df['distance_km'].to_numpy(dtype=np.float64)
+        cost = df['cost_rub'].to_numpy(dtype=np.float64)
+
+        valid = (from_codes >= 0) & (to_codes >= 0) & (days != MISSING_DAY) \
+            & np.isfinite(weight) & np.isfinite(volume) & np.isfinite(distance) & np.isfinite(cost)
+        rows = np.flatnonzero(valid)
+        windows = days[rows] // window_days
+        first_window = windows.min() if len(rows) else 0
+        windows -= first_window
+        n_windows = int(windows.max()) + 1 if len(rows) else 1
+        keys = (from_codes[rows].astype(np.int64) * len(to_labels) + to_codes[rows]) * n_windows + windows
+        groups, keys = pd.factorize(keys, sort=True)
+
+        # По группам, внутри группы - по убыванию веса. Устойчивая сортировка
+        # 16-битных номеров групп в NumPy - поразрядная, быстрее lexsort
+        order = np.argsort(-weight[rows])
+        narrow = np.uint16 if len(keys) <= np.iinfo(np.uint16).max else np.int64
+        order = order[np.argsort(groups[order].astype(narrow), kind='stable')]
+        rows, groups = rows[order], groups[order]
+        starts = pack_groups(groups, weight[rows], volume[rows],
+                             vehicle.max_weight_kg, vehicle.max_volume_m3)
+
+        load_ids = np.full(len(df), -1, dtype=np.int64)
+        sizes = np.diff(np.append(starts, len(rows)))
+        load_ids[rows] = np.repeat(np.arange(len(starts)), sizes)
+
+        def per_load(values):
+            return np.add.reduceat(values[rows], starts) if len(starts) else np.zeros(0)
+
+        load_weight, load_volume, original = per_load(weight), per_load(volume), per_load(cost)
+        # Рейс машины - по самому длинному расстоянию среди ее перевозок
+        load_distance = np.maximum.reduceat(distance[rows], starts) if len(starts) else np.zeros(0)
+        truck_cost = load_distance * vehicle.cost_per_km
+        oversize = (load_weight > vehicle.max_weight_kg + _EPS) | (load_volume > vehicle.max_volume_m3 + _EPS)
+        consolidated = (sizes > 1) & (truck_cost < original) & ~oversize
+
+        key = np.asarray(keys)[groups[starts]]
+        lane, window = key // n_windows, key % n_windows
+        window_labels = [day_label((w + first_window) * window_days) for w in range(n_windows)]
+        loads = pd.DataFrame({
+            'from_city': np.asarray(from_labels, dtype=object)[lane // len(to_labels)],
+            'to_city': np.asarray(to_labels, dtype=object)[lane % len(to_labels)],
+            'window_start': np.asarray(window_labels, dtype=object)[window],
+            'shipments': sizes,
+            'weight_kg': load_weight,
+            # volume_m3 в схеме - float32: сумма округляется до точности данных
+            'volume_m3': load_volume.round(3),
+            'weight_util': load_weight / vehicle.max_weight_kg,
+            'volume_util': load_volume / vehicle.max_volume_m3,
+            'distance_km': load_distance,
+            'original_cost': original,
+            'truck_cost': truck_cost,
+            'consolidated': consolidated,
+        })
+        return cls(loads, load_ids, vehicle, window_days)
+
+    @property
+    def cost(self):
+        """Стоимость загрузок после консолидации"""
+        return np.where(self.loads['consolidated'], self.loads['truck_cost'], self.loads['original_cost'])
+
+    def summary(self):
+        """Итоги: перевозки, машины, стоимость до и после, экономия"""
+        loads = self.loads
+        original = float(loads['original_cost'].sum())
+        cost = float(self.cost.sum())
+        trucks = loads[loads['consolidated']]
+        return {
+            'shipments': int(loads['shipments'].sum()),
+            'consolidated_shipments': int(trucks['shipments'].sum()),
+            'trucks': len(trucks),
+            'avg_weight_util': float(trucks['weight_util'].mean()) if len(trucks) else None,
+            'original_cost': original,
+            'consolidated_cost': cost,
+            'saved': original - cost,
+            'saved_pct': (original - cost) / original if original else 0.0,
+        }
+
+    def by_lane(self):
+        """Экономия по направлениям (по убыванию)"""
+        loads = self.loads.assign(cost=self.cost,
+                                  trucks=self.loads['consolidated'].astype(np.int64))
+        lanes = loads.groupby(['from_city', 'to_city']).agg(
+            shipments=('shipments', 'sum'), trucks=('trucks', 'sum'),
+            original_cost=('original_cost', 'sum'), consolidated_cost=('cost', 'sum'))
+        lanes['saved'] = lanes['original_cost'] - lanes['consolidated_cost']
+        return lanes.sort_values('saved', ascending=False, kind='stable')
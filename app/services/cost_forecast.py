@@ -0,0 +1,313 @@
+"""
+Прогноз стоимости перевозки: линейные модели по маршрутам и перевозчикам
+
+Стоимость моделируется методом наименьших квадратов:
+
+    cost = a + b·d + c·w + e·d·w + d·(тип груза + перевозчик + сезон)
+
+d - расстояние (тыс. км), w - вес (т); надбавки типа груза, перевозчика
+и сезона - к ставке за км (one-hot, умноженный на расстояние). Отдельные
+коэффициенты подбираются для каждого маршрута и каждого перевозчика, плюс
+общая модель по всем данным.
+
+Обучение - один векторный проход: нормальные уравнения XᵀX и Xᵀy всех
+групп сразу считаются через np.bincount по составным ключам (матрица
+признаков целиком не строится), затем все системы решаются одним
+пакетным np.linalg.solve. Коэффициенты группы стягиваются к общей модели
+с весом prior_rows "псевдострок": маршрут с малым числом перевозок
+прогнозируется почти общей моделью, с большим - по своим данным.
+
+Прогноз - тоже без цикла по строкам: коэффициенты выбираются по коду
+группы и складываются с признаками, миллионы строк в секунду. Неизвестный
+маршрут или перевозчик прогнозируется общей моделью, неизвестный тип
+груза (или отсутствие даты) - средней надбавкой по известным значениям.
+
+Коэффициенты по файлу сохраняются рядом с колоночным кэшем (load_forecaster).
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.utils.data_loader import derived_path, load_shipments
+from app.services.date_index import DAY_DTYPE, MISSING_DAY, MONTH_DTYPE, day_numbers
+
+COST_MODEL_FILE = 'cost_model.npz'
+
+FAMILIES = ('route', 'carrier')
+
+# Числовые признаки и их масштаб (расстояние - в тыс. км, вес - в тоннах)
+NUMERIC = ('intercept', 'distance', 'weight', 'distance_weight')
+DISTANCE_SCALE = 1000.0
+WEIGHT_SCALE = 1000.0
+
+# Признаки-надбавки к ставке за км
+CATEGORICAL = ('cargo_type', 'carrier', 'season')
+SEASONS = ('Зима', 'Весна', 'Лето', 'Осень')
+# Месяц (0 - январь) -> номер сезона
+SEASON_OF_MONTH = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int64)
+
+# Вес общей модели для групп (в строках данных) и регуляризация общей модели
+PRIOR_ROWS = 25.0
+RIDGE = 1e-3
+
+
+
+def _seasons(frame):
+    """Номер сезона по колонке date (или month 1-12); -1 - дата неизвестна"""
+    if 'date' in frame:
+        days = day_numbers(pd.Series(frame['date']))
+        months = days.astype(DAY_DTYPE).astype(MONTH_DTYPE).astype(np.int64) % 12
+        return np.where(days == MISSING_DAY, -1, SEASON_OF_MONTH[months])
+    if 'month' in frame:
+        return SEASON_OF_MONTH[np.asarray(frame['month'], dtype=np.int64) - 1]
+    return np.full(len(frame['distance_km']), -1, dtype=np.int64)
+
+
+def _numeric(frame):
+    distance = np.asarray(frame['distance_km'], dtype=np.float64) / DISTANCE_SCALE
+    weight = np.asarray(frame['weight_kg'], dtype=np.float64) / WEIGHT_SCALE
+    return distance, weight
+
+
+class CostForecaster:
+    """Коэффициенты моделей стоимости: общей и по группам FAMILIES.
+
+    labels - словари значений (from_city/to_city - города, cargo_type,
+    carrier); coefficients[family] - массив (групп + 1, признаков), последняя
+    строка - общая модель; groups[family] - ключи групп, counts[family] -
+    число строк обучения по группам.
+    """
+
+    COLUMNS = ('from_city', 'to_city', 'cargo_type', 'carrier', 'date', 'distance_km', 'weight_kg',
+               'cost_rub')
+
+    def __init__(self, labels, coefficients, groups, counts, prior_rows=PRIOR_ROWS):
+        self.labels = {name: list(values) for name, values in labels.items()}
+        self.coefficients = coefficients
+        self.groups = groups
+        self.counts = counts
+        self.prior_rows = prior_rows
+        # Смещения блоков признаков: числовые, затем надбавки CATEGORICAL
+        self.levels = {'cargo_type': len(self.labels['cargo_type']),
+                       'carrier': len(self.labels['carrier']), 'season': len(SEASONS)}
+        self.offsets, offset = {}, len(NUMERIC)
+        for name in CATEGORICAL:
+            self.offsets[name] = offset
+            offset += self.levels[name]
+        self.n_features = offset
+        n_cities = len(self.labels['city'])
+        # Маршрут (from_code * n_cities + to_code) -> номер группы
+        self._route_lookup = np.full(n_cities * n_cities + 1, -1, dtype=np.int64)
+        routes = self.groups['route']
+        self._route_lookup[routes[:, 0] * n_cities + routes[:, 1]] = np.arange(len(routes))
+
+    @property
+    def feature_names(self):
+        names = list(NUMERIC)
+        for name in CATEGORICAL:
+            values = SEASONS if name == 'season' else self.labels[name]
+            names.extend(f"{name}={value}" for value in values)
+        return names
+
+    # --- обучение ---
+
+    @classmethod
+    def from_frame(cls, df, prior_rows=PRIOR_ROWS, ridge=RIDGE):
+        """Обучение моделей по перевозкам (DataFrame) за один проход"""
+        from_codes, from_labels = category_codes(df['from_city'], used_only=True)
+        to_codes, to_labels = category_codes(df['to_city'], used_only=True)
+        cities = sorted(set(from_labels) | set(to_labels))
+        city_index = {c: i for i, c in enumerate(cities)}
+        # Перекодирование в общий словарь городов; пропуск (-1) остается -1
+        from_codes = np.array([city_index[c] for c in from_labels] + [-1], dtype=np.int64)[from_codes]
+        to_codes = np.array([city_index[c] for c in to_labels] + [-1], dtype=np.int64)[to_codes]
+        cargo_codes, cargo_labels = category_codes(df['cargo_type'], used_only=True)
+        carrier_codes, carrier_labels = category_codes(df['carrier'], used_only=True)
+        cargo_codes, carrier_codes = cargo_codes.astype(np.int64), carrier_codes.astype(np.int64)
+        seasons = _seasons(df)
+        distance, weight = _numeric(df)
+        cost = df['cost_rub'].to_numpy(dtype=np.float64)
+
+        valid = np.isfinite(cost) & np.isfinite(distance) & np.isfinite(weight) & (seasons >= 0) \
+            & (cargo_codes >= 0) & (carrier_codes >= 0) & (from_codes >= 0) & (to_codes >= 0)
+        if not valid.all():
+            from_codes, to_codes, cargo_codes, carrier_codes, seasons, distance, weight, cost = (
+                values[valid] for values in (from_codes, to_codes, cargo_codes, carrier_codes,
+                                             seasons, distance, weight, cost))
+
+        numeric = np.column_stack([np.ones_like(distance), distance, weight, distance * weight])
+        blocks = [(cargo_codes, len(cargo_labels)), (carrier_codes, len(carrier_labels)),
+                  (seasons, len(SEASONS))]
+
+        pair = from_codes * len(cities) + to_codes
+        route_ids, route_pairs = pd.factorize(pair, sort=True)
+        family_groups = {
+            'route': (route_ids.astype(np.int64),
+                      np.column_stack([route_pairs // len(cities), route_pairs % len(cities)])),
+            'carrier': (carrier_codes, np.arange(len(carrier_labels))),
+        }
+
+        # Общая модель - одна группа из всех строк
+        zeros = np.zeros(len(cost), dtype=np.int64)
+        xtx, xty = _normal_equations(zeros, 1, numeric, blocks, distance, cost)
+        p = xtx.shape[-1]
+        global_coef = np.linalg.solve(xtx[0] + ridge * np.eye(p), xty[0])
+
+        coefficients, groups, counts = {}, {}, {}
+        for family, (group_ids, keys) in family_groups.items():
+            n_groups = len(keys)
+            xtx, xty = _normal_equations(group_ids, n_groups, numeric, blocks, distance, cost)
+            # Стягивание к общей модели: (XᵀX + λI)β = Xᵀy + λβ₀
+            system = xtx + prior_rows * np.eye(p)
+            rhs = xty + prior_rows * global_coef
+            coef = np.linalg.solve(system, rhs[..., None])[..., 0]
+            coefficients[family] = np.vstack([coef, global_coef])
+            groups[family] = keys
+            counts[family] = np.bincount(group_ids, minlength=n_groups)
+
+        labels = {'city': cities, 'cargo_type': cargo_labels, 'carrier': carrier_labels}
+        return cls(labels, coefficients, groups, counts, prior_rows)
+
+    # --- прогноз ---
+
+    def _group_ids(self, frame, family):
+        """Номер группы по строкам; неизвестные группы - общая модель (последняя строка)"""
+        n_groups = len(self.groups[family])
+        if family == 'carrier':
+            ids = category_codes(pd.Series(frame['carrier']), self.labels['carrier'])
+        else:
+            n_cities = len(self.labels['city'])
+            from_codes = category_codes(pd.Series(frame['from_city']), self.labels['city'])
+            to_codes = category_codes(pd.Series(frame['to_city']), self.labels['city'])
+            key = np.where((from_codes < 0) | (to_codes < 0), n_cities * n_cities,
+                           from_codes * n_cities + to_codes)
+            ids = self._route_lookup[key]
+        return np.where(ids < 0, n_groups, ids)
+
+    def predict(self, frame, by='route'):
+        """Прогноз стоимости (руб) для набора перевозок.
+
+        frame - DataFrame или dict массивов: distance_km, weight_kg,
+        cargo_type, carrier, from_city/to_city (для by='route'), date
+        (или month 1-12). by - 'route', 'carrier' или 'global'.
+        """
+        if by not in (*FAMILIES, 'global'):
+            raise ValueError(f"Неизвестная модель {by}, доступны: {', '.join(FAMILIES)}, global")
+        family = 'carrier' if by == 'global' else by
+        coef = self.coefficients[family]
+        if by == 'global':
+            group = np.full(len(frame['distance_km']), len(coef) - 1, dtype=np.int64)
+        else:
+            group = self._group_ids(frame, by)
+
+        distance, weight = _numeric(frame)
+        prediction = coef[group, 0] + coef[group, 1] * distance + coef[group, 2] * weight \
+            + coef[group, 3] * distance * weight
+        per_km = np.zeros(len(distance))
+        for name in CATEGORICAL:
+            if name == 'season':
+                codes = _seasons(frame)
+            else:
+                codes = category_codes(pd.Series(frame[name]), self.labels[name])
+            offset, levels = self.offsets[name], self.levels[name]
+            effects = coef[:, offset:offset + levels]
+            # Неизвестное значение - средняя надбавка группы по известным значениям
+            effects = np.hstack([effects, effects.mean(axis=1, keepdims=True)])
+            per_km += effects[group, np.where(codes < 0, levels, codes)]
+        return prediction + per_km * distance
+
+    def evaluate(self, df, by='route'):
+        """Ошибки прогноза на данных df: MAE (руб) и MAPE"""
+        actual = df['cost_rub'].to_numpy(dtype=np.float64)
+        error = np.abs(self.predict(df, by) - actual)
+        return {'mae': float(np.nanmean(error)), 'mape': float(np.nanmean(error / np.abs(actual)))}
+
+    def coefficients_frame(self, by='carrier'):
+        """Коэффициенты моделей группы в виде таблицы (последняя строка - общая модель)"""
+        if by == 'carrier':
+            index = [*self.labels['carrier'], '*']
+        else:
+            cities = self.labels['city']
+            index = [f"{cities[a]} → {cities[b]}" for a, b in self.groups['route']] + ['*']
+        return pd.DataFrame(self.coefficients[by], index=index, columns=self.feature_names)
+
+    # --- хранение ---
+
+    def save(self, path):
+        arrays = {f'labels_{name}': np.array(values, dtype=str) for name, values in self.labels.items()}
+        for family in FAMILIES:
+            arrays[f'coef_{family}'] = self.coefficients[family]
+            arrays[f'groups_{family}'] = self.groups[family]
+            arrays[f'counts_{family}'] = self.counts[family]
+        with open(path, 'wb') as f:
+            np.savez(f, prior_rows=self.prior_rows, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            labels = {key[len('labels_'):]: data[key].tolist() for key in data.files
+                      if key.startswith('labels_')}
+            return cls(labels,
+                       {family: data[f'coef_{family}'] for family in FAMILIES},
+                       {family: data[f'groups_{family}'] for family in FAMILIES},
+                       {family: data[f'counts_{family}'] for family in FAMILIES},
+                       float(data['prior_rows']))
+
+
+def _normal_equations(group, n_groups, numeric, blocks, distance, y):
+    """XᵀX (групп, p, p) и Xᵀy (групп, p) для всех групп сразу.
+
+    Признаки: колонки numeric и one-hot блоки (коды, число значений),
+    умноженные на distance. Каждая клетка XᵀX - np.bincount по ключу
+    (группа, значение) с весами-произведениями признаков.
+    """
+    k = numeric.shape[1]
+    widths = [levels for _, levels in blocks]
+    offsets = np.cumsum([k] + widths)[:-1]
+    p = k + sum(widths)
+    xtx = np.zeros((n_groups, p, p))
+    xty = np.zeros((n_groups, p))
+
+    def count(key, size, weights):
+        return np.bincount(key, weights=weights, minlength=size)
+
+    for i in range(k):
+        xty[:, i] = count(group, n_groups, numeric[:, i] * y)
+        for j in range(i, k):
+            xtx[:, i, j] = count(group, n_groups, numeric[:, i] * numeric[:, j])
+
+    for (codes, levels), offset in zip(blocks, offsets):
+        key = group * levels + codes
+        cells = slice(offset, offset + levels)
+        xty[:, cells] = count(key, n_groups * levels, distance * y).reshape(n_groups, levels)
+        for i in range(k):
+            xtx[:, i, cells] = count(key, n_groups * levels, numeric[:, i] * distance).reshape(n_groups, levels)
+        diagonal = count(key, n_groups * levels, distance * distance).reshape(n_groups, levels)
+        xtx[:, cells, cells] = diagonal[:, :, None] * np.eye(levels)
+
+    for a in range(len(blocks)):
+        (codes_a, levels_a), offset_a = blocks[a], offsets[a]
+        for b in range(a + 1, len(blocks)):
+            (codes_b, levels_b), offset_b = blocks[b], offsets[b]
+            key = (group * levels_a + codes_a) * levels_b + codes_b
+            size = n_groups * levels_a * levels_b
+            xtx[:, offset_a:offset_a + levels_a, offset_b:offset_b + levels_b] = \
+                count(key, size, distance * distance).reshape(n_groups, levels_a, levels_b)
+
+    # Заполнена верхняя половина: отражение в нижнюю
+    upper = np.triu(np.ones((p, p), dtype=bool), 1)
+    xtx[:, upper.T] = xtx.transpose(0, 2, 1)[:, upper.T]
+    return xtx, xty
+
+
+def load_forecaster(path, df=None):
+    """Модели стоимости по файлу из кэша или обучение и сохранение"""
+    model_path = derived_path(path, COST_MODEL_FILE)
+    if model_path.exists():
+        return CostForecaster.load(model_path)
+    if df is None:
+        df = load_shipments(path, CostForecaster.COLUMNS)
+    forecaster = CostForecaster.from_frame(df)
+    forecaster.save(model_path)
+    return forecaster
@@ -0,0 +1,166 @@
+"""
+Данные для дашборда: предагрегаты и быстрые срезы
+
+Перевозки один раз сворачиваются в ячейки (день, перевозчик, маршрут,
+тип груза) с количеством и суммами; ячейки отсортированы по дню.
+Фильтры дашборда (перевозчики, маршруты, типы груза, диапазон дат)
+применяются к ячейкам, а не к исходным строкам, поэтому перерисовка
+не зависит от размера файла. Строки для таблицы отдаются постранично,
+данные для графиков прореживаются до max_points точек.
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.utils.dates import as_day, day_date
+from app.services.date_index import MISSING_DAY, day_numbers
+
+
+class DashboardData:
+    """Предагрегированные данные загруженного файла"""
+
+    def __init__(self, df):
+        self.df = df
+
+        carrier, self.carriers = category_codes(df['carrier'])
+        cargo, self.cargo_types = category_codes(df['cargo_type']) if 'cargo_type' in df.columns \
+            else (np.zeros(len(df), dtype=np.int64), [''])
+        from_codes, from_cities = category_codes(df['from_city'])
+        to_codes, to_cities = category_codes(df['to_city'])
+        # Перевозка без города - без маршрута (код -1)
+        known = (from_codes >= 0) & (to_codes >= 0)
+        pair_codes = np.full(len(df), -1, dtype=np.int64)
+        pair_codes[known], pairs = pd.factorize(
+            from_codes[known].astype(np.int64) * len(to_cities) + to_codes[known], sort=True
+        )
+        self.routes = [f"{from_cities[p // len(to_cities)]} → {to_cities[p % len(to_cities)]}"
+                       for p in pairs]
+        # Пропущенная дата - MISSING_DAY: в итогах учитывается, в окна дат не попадает
+        day = day_numbers(df['date'])
+
+        # Коды по строкам - для постраничного вывода с фильтрами
+        self._rows = {'day': day, 'carrier': carrier, 'route': pair_codes, 'cargo': cargo}
+
+        cells = pd.DataFrame({
+            'day': day, 'carrier': carrier, 'route': pair_codes, 'cargo': cargo,
+            'cost': df['cost_rub'].to_numpy(dtype=np.float64),
+            'distance': df['distance_km'].to_numpy(dtype=np.float64),
+            'weight': df['weight_kg'].to_numpy(dtype=np.float64),
+        }).groupby(['day', 'carrier', 'route', 'cargo'], sort=True).agg(
+            count=('cost', 'size'),
+            cost_sum=('cost', 'sum'),
+            distance_sum=('distance', 'sum'),
+            weight_sum=('weight', 'sum'),
+        ).reset_index()
+        self._cells = {name: cells[name].to_numpy() for name in cells.columns}
+
+        self.total_rows = len(df)
+        self._last_selection = (None, None)
+        dated = day[day != MISSING_DAY]
+        self.date_min = day_date(dated.min()) if len(dated) else None
+        self.date_max = day_date(dated.max()) if len(dated) else None
+
+    def period_filter(self, period):
+        """(start, end) для фильтров по значению виджета периода.
+
+        Границы, совпадающие с диапазоном дат данных, - без фильтра (None):
+        пока период не сужен, перевозки без даты остаются в срезе.
+        """
+        if not isinstance(period, (tuple, list)) or len(period) != 2:
+            return None, None
+        start, end = period
+        return (None if start == self.date_min else start,
+                None if end == self.date_max else end)
+
+    def _mask(self, columns, day_slice, carriers, routes, cargo_types):
+        """Маска по кодам для среза day_slice (фильтры - списки названий)"""
+        size = day_slice.stop - day_slice.start
+        mask = np.ones(size, dtype=bool)
+        for name, selected, names in (('carrier', carriers, self.carriers),
+                                      ('route', routes, self.routes),
+                                      ('cargo', cargo_types, self.cargo_types)):
+            if selected:
+                wanted = [i for i, value in enumerate(names) if value in set(selected)]
+                mask &= np.isin(columns[name][day_slice], wanted)
+        return mask
+
+    @staticmethod
+    def _day_slice(days, start, end):
+        """Срез отсортированных дней по окну (строки без даты - только без окна)"""
+        if start is not None:
+            lo = np.searchsorted(days, as_day(start), 'left')
+        else:
+            lo = 0 if end is None else np.searchsorted(days, MISSING_DAY, 'right')
+        hi = len(days) if end is None else np.searchsorted(days, as_day(end), 'right')
+        return slice(lo, hi)
+
+    def cells(self, carriers=None, routes=None, cargo_types=None, start=None, end=None):
+        """Ячейки агрегатов, попадающие в фильтры"""
+        window = self._day_slice(self._cells['day'], start, end)
+        mask = self._mask(self._cells, window, carriers, routes, cargo_types)
+        return {name: values[window][mask] for name, values in self._cells.items()}
+
+    def summary(self, **filters):
+        """Итоги по срезу"""
+        cells = self.cells(**filters)
+        count = int(cells['count'].sum())
+        cost = float(cells['cost_sum'].sum())
+        distance = float(cells['distance_sum'].sum())
+        return {
+            'count': count,
+            'total_cost': cost,
+            'avg_cost': cost / count if count else 0.0,
+            'avg_cost_per_km': cost / distance if distance else 0.0,
+        }
+
+    def by_carrier(self, **filters):
+        """Сумма стоимости по перевозчикам"""
+        cells = self.cells(**filters)
+        known = cells['carrier'] >= 0
+        totals = np.bincount(cells['carrier'][known], weights=cells['cost_sum'][known],
+                             minlength=len(self.carriers))
+        return pd.Series(totals, index=pd.Index(self.carriers, name='carrier'), name='cost_rub')
+
+    def timeline(self, max_points=200, **filters):
+        """Количество и стоимость по дням, прореженные до max_points точек"""
+        cells = self.cells(**filters)
+        dated = cells['day'] != MISSING_DAY
+        cells = {name: values[dated] for name, values in cells.items()}
+        if not len(cells['day']):
+            return pd.DataFrame(columns=['Перевозок', 'Стоимость'])
+        first = int(cells['day'].min())
+        span = int(cells['day'].max()) - first + 1
+        bucket = -(-span // max_points)  # дней в одной точке
+        slot = (cells['day'] - first) // bucket
+        n = int(slot.max()) + 1
+        index = pd.Index([day_date(first + i * bucket) for i in range(n)], name='date')
+        return pd.DataFrame({
+            'Перевозок': np.bincount(slot, weights=cells['count'], minlength=n),
+            'Стоимость': np.bincount(slot, weights=cells['cost_sum'], minlength=n),
+        }, index=index)
+
+    def page(self, page=1, page_size=100, carriers=None, routes=None, cargo_types=None,
+             start=None, end=None):
+        """Страница исходных строк, попавших в фильтры, и общее число таких строк"""
+        if not any((carriers, routes, cargo_types, start, end)):
+            total = self.total_rows
+            lo = (page - 1) * page_size
+            return self.df.iloc[lo:lo + page_size], total
+
+        # Листание страниц не меняет фильтры - выборку строк переиспользуем
+        key = (tuple(carriers or ()), tuple(routes or ()), tuple(cargo_types or ()), start, end)
+        cached_key, selected = self._last_selection
+        if cached_key != key:
+            rows = self._rows
+            mask = self._mask(rows, slice(0, self.total_rows), carriers, routes, cargo_types)
+            if start is not None or end is not None:
+                mask &= rows['day'] != MISSING_DAY
+            if start is not None:
+                mask &= rows['day'] >= as_day(start)
+            if end is not None:
+                mask &= rows['day'] <= as_day(end)
+            selected = np.flatnonzero(mask)
+            self._last_selection = (key, selected)
+        lo = (page - 1) * page_size
+        return self.df.iloc[selected[lo:lo + page_size]], len(selected)
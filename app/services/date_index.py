@@ -0,0 +1,151 @@
+"""
+Отсортированный индекс дат для выборок по окну start/end
+
+Колонка date переводится в номера дней (int32, от 1970-01-01) разбором
+только уникальных значений: у словарной колонки - ее категорий, поэтому
+миллионы строк не разбираются построчно. Индекс хранит номера дней в
+отсортированном порядке и перестановку строк (устойчивая сортировка);
+строки окна дат находятся двумя бинарными поисками, и вопрос "за
+последние 30 дней" стоит пропорционально числу строк в окне, а не всей
+истории. Если данные уже отсортированы по дате, перестановка не хранится
+и окно - просто срез.
+
+Индекс по файлу сохраняется рядом с колоночным кэшем (load_date_index).
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.utils.data_loader import derived_path, load_shipments
+from app.utils.dates import as_day
+
+DATE_INDEX_FILE = 'date_index.npz'
+
+# Номер дня для пропущенной даты: меньше любой реальной, в окна с началом не попадает
+MISSING_DAY = np.iinfo(np.int32).min
+
+# Номера дней и месяцев - datetime64[D] / datetime64[M] в виде целых
+DAY_DTYPE = 'datetime64[D]'
+MONTH_DTYPE = 'datetime64[M]'
+
+
+def day_numbers(series):
+    """Колонка дат (строки ISO, категории или datetime64) -> номера дней int32"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy().astype(DAY_DTYPE)
+        days = values.astype(np.int64)
+        days[np.isnat(values)] = MISSING_DAY
+        return days.astype(np.int32)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, uniques = series.cat.codes.to_numpy(), [str(c)[:10] for c in series.cat.categories]
+    else:
+        codes, uniques = pd.factorize(series, sort=False)
+        uniques = [str(c)[:10] for c in uniques]
+    lookup = np.append(np.array(uniques, dtype=DAY_DTYPE).astype(np.int32), np.int32(MISSING_DAY))
+    # Код -1 (пропуск) указывает на последний элемент lookup
+    return lookup[codes]
+
+
+def day_label(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+class DateIndex:
+    """Номера дней строк в порядке возрастания и перестановка строк.
+
+    order[i] - номер строки с i-й по возрастанию датой (None, если строки
+    уже отсортированы по дате).
+    """
+
+    COLUMNS = ('date',)
+
+    def __init__(self, days, order=None):
+        self.days = days
+        self.order = order
+
+    @classmethod
+    def from_frame(cls, df):
+        days = day_numbers(df['date'])
+        if len(days) < 2 or bool(np.all(days[1:] >= days[:-1])):
+            return cls(days)
+        order = np.argsort(days, kind='stable').astype(np.int64)
+        return cls(days[order], order)
+
+    def save(self, path):
+        arrays = {'days': self.days}
+        if self.order is not None:
+            arrays['order'] = self.order
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['days'], data['order'] if 'order' in data.files else None)
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def is_sorted(self):
+        return self.order is None
+
+    def _present(self):
+        """Начало дней без пропусков (пропуски отсортированы в начало)"""
+        return int(np.searchsorted(self.days, MISSING_DAY, 'right'))
+
+    @property
+    def min(self):
+        first = self._present()
+        return day_label(self.days[first]) if first < len(self.days) else None
+
+    @property
+    def max(self):
+        return day_label(self.days[-1]) if self._present() < len(self.days) else None
+
+    def bounds(self, start=None, end=None):
+        """Позиции окна [start, end] (включительно) в отсортированных днях"""
+        first = 0 if start is None else int(np.searchsorted(self.days, as_day(start), 'left'))
+        last = len(self.days) if end is None else int(np.searchsorted(self.days, as_day(end), 'right'))
+        return first, max(first, last)
+
+    def rows(self, start=None, end=None):
+        """Номера строк в окне дат: срез для отсортированных данных,
+        иначе массив номеров по возрастанию (исходный порядок строк)"""
+        first, last = self.bounds(start, end)
+        if self.order is None:
+            return slice(first, last)
+        return np.sort(self.order[first:last])
+
+    def count(self, start=None, end=None):
+        first, last = self.bounds(start, end)
+        return last - first
+
+    def last_days(self, n, until=None):
+        """Окно n последних дней: (start, end) строками 'YYYY-MM-DD'.
+
+        until - последний день окна, по умолчанию - последняя дата в данных.
+        """
+        if n < 1:
+            raise ValueError("Число дней должно быть положительным")
+        end = as_day(until) if until is not None else int(self.days[-1])
+        return day_label(end - n + 1), day_label(end)
+
+    def select(self, df, start=None, end=None):
+        """Строки DataFrame в окне дат (df - те же данные, по которым построен индекс)"""
+        if len(df) != len(self.days):
+            raise ValueError("Индекс дат построен по другим данным")
+        rows = self.rows(start, end)
+        if isinstance(rows, slice) and rows == slice(0, len(df)):
+            return df
+        return df.iloc[rows]
+
+
+def load_date_index(path, df=None):
+    """Индекс дат по файлу из кэша или построение и сохранение"""
+    index_path = derived_path(path, DATE_INDEX_FILE)
+    if index_path.exists():
+        return DateIndex.load(index_path)
+    index = DateIndex.from_frame(load_shipments(path, DateIndex.COLUMNS) if df is None else df)
+    index.save(index_path)
+    return index
@@ -0,0 +1,168 @@
+"""
+Матрица расстояний между городами
+
+DistanceMatrix хранит плотную матрицу (n, n) расстояний в км (int32)
+по целочисленным кодам городов. Матрица строится по координатам городов:
+расстояния по большому кругу (формула гаверсинуса, одна операция NumPy
+над всеми парами) умножаются на коэффициент извилистости дорог ROAD_FACTOR,
+а известные дорожные расстояния KNOWN_DISTANCES записываются поверх.
+Матрица симметрична, на диагонали нули.
+
+Пары городов переводятся в коды одним поиском на уникальное значение
+(у pd.Categorical - по категориям), после чего расстояния миллионов пар
+выбираются одной индексацией km[from_ids, to_ids]. Этим пользуются
+генератор данных, тарифный расчет (заявки без distance_km) и проверка
+расстояний во входных данных (check).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Координаты городов (широта, долгота в градусах)
+CITY_COORDINATES = {
+    'Москва': (55.7558, 37.6173),
+    'Санкт-Петербург': (59.9343, 30.3351),
+    'Екатеринбург': (56.8389, 60.6057),
+    'Новосибирск': (55.0084, 82.9357),
+    'Казань': (55.7963, 49.1088),
+    'Красноярск': (56.0153, 92.8932),
+    'Нижний Новгород': (56.2965, 43.9361),
+    'Челябинск': (55.1644, 61.4368),
+    'Омск': (54.9885, 73.3242),
+    'Самара': (53.1959, 50.1002),
+    'Ростов-на-Дону': (47.2357, 39.7015),
+    'Уфа': (54.7388, 55.9721),
+}
+
+# Известные расстояния по дорогам (км), действуют в обе стороны
+KNOWN_DISTANCES = {
+    ('Москва', 'Санкт-Петербург'): 710,
+    ('Москва', 'Екатеринбург'): 1800,
+    ('Москва', 'Новосибирск'): 2800,
+    ('Москва', 'Казань'): 800,
+    ('Москва', 'Нижний Новгород'): 400,
+    ('Санкт-Петербург', 'Екатеринбург'): 2200,
+    ('Екатеринбург', 'Новосибирск'): 1500,
+    ('Новосибирск', 'Красноярск'): 800,
+    ('Казань', 'Санкт-Петербург'): 1500,
+}
+
+EARTH_RADIUS_KM = 6371.0
+# Дорога длиннее расстояния по большому кругу в среднем на четверть
+ROAD_FACTOR = 1.25
+# Допустимое относительное отклонение distance_km от матрицы в check()
+DISTANCE_TOLERANCE = 0.05
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Расстояние по большому кругу в км (аргументы - массивы градусов)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class DistanceMatrix:
+    """Расстояния между городами: km[i, j] - км от cities[i] до cities[j]"""
+
+    def __init__(self, cities, km):
+        self.cities = pd.Index(cities)
+        self.km = np.asarray(km, dtype=np.int32)
+        if self.km.shape != (len(self.cities), len(self.cities)):
+            raise ValueError(f"Матрица {self.km.shape} не соответствует {len(self.cities)} городам")
+
+    @classmethod
+    def from_coordinates(cls, coordinates=CITY_COORDINATES, known=KNOWN_DISTANCES,
+                         road_factor=ROAD_FACTOR):
+        """Матрица по координатам городов с известными расстояниями поверх"""
+        cities = list(coordinates)
+        lat, lon = np.array([coordinates[c] for c in cities], dtype=np.float64).T
+        km = np.rint(haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) * road_factor)
+        matrix = cls(cities, km)
+        if known:
+            pairs = np.array(list(known))
+            from_ids, to_ids = matrix.city_ids(pairs[:, 0]), matrix.city_ids(pairs[:, 1])
+            distance = np.fromiter(known.values(), dtype=np.int32, count=len(known))
+            matrix.km[from_ids, to_ids] = distance
+            matrix.km[to_ids, from_ids] = distance
+        return matrix
+
+    def __len__(self):
+        return len(self.cities)
+
+    def codes(self, names):
+        """Коды городов (-1 - неизвестный город или пропуск).
+
+        Каждое уникальное значение ищется один раз: у pd.Categorical -
+        категории, у остальных массивов - значения после pd.factorize.
+        """
+        if isinstance(names, pd.Series):
+            names = names.array
+        if isinstance(names, pd.Categorical):
+            codes, uniques = names.codes, names.categories
+        else:
+            codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        mapping = np.append(self.cities.get_indexer(uniques), -1).astype(np.int64)
+        return mapping[codes]
+
+    def city_ids(self, names):
+        """Коды городов; ValueError, если какой-то город неизвестен"""
+        ids = self.codes(names)
+        if (ids < 0).any():
+            unknown = sorted({str(v) for v in np.asarray(names, dtype=object)[ids < 0]})
+            raise ValueError(f"Неизвестные города: {', '.join(unknown[:5])}")
+        return ids
+
+    def lookup(self, from_ids, to_ids):
+        """Расстояния по кодам городов (массивы одной формы)"""
+        return self.km[from_ids, to_ids]
+
+    def distance(self, from_cities, to_cities):
+        """Расстояния для пар городов (массивы названий или pd.Categorical)"""
+        return self.lookup(self.city_ids(from_cities), self.city_ids(to_cities))
+
+    def check(self, df, tolerance=DISTANCE_TOLERANCE):
+        """Строки, где distance_km отличается от матрицы больше чем на
+        tolerance (доля), или город неизвестен (expected_km - NaN).
+
+        Возвращает DataFrame с индексом df: from_city, to_city, distance_km,
+        expected_km, deviation (относительное отклонение).
+        """
+        from_ids, to_ids = self.codes(df['from_city']), self.codes(df['to_city'])
+        known = (from_ids >= 0) & (to_ids >= 0)
+        expected = np.where(known, self.km[from_ids, to_ids], 0).astype(np.float64)
+        expected[~known] = np.nan
+        actual = df['distance_km'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = (actual - expected) / expected
+        flagged = ~known | (np.abs(actual - expected) > tolerance * expected)
+        return pd.DataFrame({
+            'from_city': np.asarray(df['from_city'], dtype=object)[flagged],
+            'to_city': np.asarray(df['to_city'], dtype=object)[flagged],
+            'distance_km': actual[flagged],
+            'expected_km': expected[flagged],
+            'deviation': deviation[flagged],
+        }, index=df.index[flagged])
+
+    def to_frame(self):
+        """Матрица таблицей: индекс - откуда, колонки - куда"""
+        return pd.DataFrame(self.km, index=self.cities, columns=self.cities)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, cities=np.array(list(self.cities)), km=self.km)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['cities'].tolist(), data['km'])
+
+
+_DEFAULT = None
+
+
+def default_matrix():
+    """Матрица по CITY_COORDINATES и KNOWN_DISTANCES (строится один раз)"""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = DistanceMatrix.from_coordinates()
+    return _DEFAULT
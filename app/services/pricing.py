@@ -0,0 +1,177 @@
+"""
+Тарифный расчет стоимости перевозок
+
+Формула та же, что у генератора данных (data/generate_realistic_data.py):
+
+    фрахт = ставка руб/км × расстояние × коэф. перевозчика × коэф. груза
+            × коэф. расстояния × (1 + вес / 10000)
+    топливная надбавка = фрахт × FUEL_RATE
+    страховка = фрахт × INSURANCE_RATE (если груз страхуется)
+
+Справочники перевозчиков и типов груза хранятся массивами коэффициентов,
+а коды значений находятся одним поиском по словарю (pd.Index.get_indexer).
+Поэтому PricingEngine.quote() считает сразу N заявок × M перевозчиков
+операциями NumPy над массивами (N, M), без цикла по заявкам: десятки
+тысяч направлений по всем восьми перевозчикам - один вызов. Заявки без
+distance_km получают расстояние по матрице городов (DistanceMatrix).
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.services.distances import default_matrix
+
+CARRIERS = [
+    {'name': 'Деловые Линии', 'price_factor': 1.0, 'reliability': 0.95},
+    {'name': 'ПЭК', 'price_factor': 0.9, 'reliability': 0.92},
+    {'name': 'ЖДД', 'price_factor': 0.8, 'reliability': 0.98},
+    {'name': 'Грузовоз', 'price_factor': 0.85, 'reliability': 0.90},
+    {'name': 'Энергия', 'price_factor': 1.1, 'reliability': 0.96},
+    {'name': 'Мэйджор', 'price_factor': 1.2, 'reliability': 0.99},
+    {'name': 'Байкал Сервис', 'price_factor': 0.95, 'reliability': 0.93},
+    {'name': 'Ратэк', 'price_factor': 0.88, 'reliability': 0.91}
+]
+
+CARGO_TYPES = [
+    {'type': 'Электроника', 'fragility': 0.8, 'density': 0.3, 'price_factor': 1.5},
+    {'type': 'Одежда', 'fragility': 0.2, 'density': 0.4, 'price_factor': 1.0},
+    {'type': 'Продукты', 'fragility': 0.6, 'density': 0.7, 'price_factor': 1.2},
+    {'type': 'Стройматериалы', 'fragility': 0.1, 'density': 2.5, 'price_factor': 0.8},
+    {'type': 'Автозапчасти', 'fragility': 0.4, 'density': 1.2, 'price_factor': 1.1},
+    {'type': 'Мебель', 'fragility': 0.5, 'density': 0.9, 'price_factor': 1.3},
+    {'type': 'Химия', 'fragility': 0.7, 'density': 1.1, 'price_factor': 1.4},
+    {'type': 'Медицина', 'fragility': 0.9, 'density': 0.5, 'price_factor': 1.6},
+    {'type': 'Канцелярия', 'fragility': 0.3, 'density': 0.6, 'price_factor': 1.0},
+    {'type': 'Игрушки', 'fragility': 0.4, 'density': 0.4, 'price_factor': 1.1}
+]
+
+# Базовая ставка руб/км: в данных она случайна в диапазоне 15-50, для котировки - середина
+BASE_RATE = 32.5
+
+# Коэффициенты расстояния: надбавка на короткие плечи, скидка на длинные
+SHORT_HAUL_KM = 500
+SHORT_HAUL_FACTOR = 1.2
+LONG_HAUL_KM = 2000
+LONG_HAUL_FACTOR = 0.9
+
+WEIGHT_STEP_KG = 10000      # +100% к стоимости на каждые 10 т
+FUEL_RATE = 0.10            # в данных - от 5% до 15% фрахта
+INSURANCE_RATE = 0.02
+
+COMPONENTS = ('base', 'carrier_factor', 'cargo_factor', 'distance_factor', 'weight_factor',
+              'freight', 'fuel_surcharge', 'insurance_cost', 'total')
+
+
+def distance_factor(distance):
+    """Коэффициент расстояния (массив)"""
+    return np.where(distance > LONG_HAUL_KM, LONG_HAUL_FACTOR,
+                    np.where(distance < SHORT_HAUL_KM, SHORT_HAUL_FACTOR, 1.0))
+
+
+def weight_factor(weight):
+    return 1 + weight / WEIGHT_STEP_KG
+
+
+class PricingEngine:
+    """Расчет стоимости по справочникам перевозчиков и типов груза"""
+
+    def __init__(self, carriers=CARRIERS, cargo_types=CARGO_TYPES, base_rate=BASE_RATE,
+                 fuel_rate=FUEL_RATE, insurance_rate=INSURANCE_RATE, distances=None):
+        self.carriers = pd.Index([c['name'] for c in carriers])
+        self.carrier_factor = np.array([c['price_factor'] for c in carriers], dtype=np.float64)
+        self.cargo_types = pd.Index([c['type'] for c in cargo_types])
+        self.cargo_factor = np.array([c['price_factor'] for c in cargo_types], dtype=np.float64)
+        self.base_rate = base_rate
+        self.fuel_rate = fuel_rate
+        self.insurance_rate = insurance_rate
+        self.distances = distances if distances is not None else default_matrix()
+
+    @staticmethod
+    def _lookup(index, values, what):
+        codes = index.get_indexer(np.asarray(values))
+        if (codes < 0).any():
+            unknown = sorted({str(v) for v in np.asarray(values)[codes < 0]})
+            raise ValueError(f"Неизвестные {what}: {', '.join(unknown[:5])}")
+        return codes
+
+    def carrier_codes(self, names):
+        return self._lookup(self.carriers, names, 'перевозчики')
+
+    def cargo_codes(self, names):
+        return self._lookup(self.cargo_types, names, 'типы груза')
+
+    def freight(self, base_rate, distance, carrier, cargo, weight):
+        """Фрахт по кодам перевозчика и груза.
+
+        Аргументы - массивы одной формы или согласованные для broadcasting:
+        заявки формы (N, 1) и перевозчики формы (M,) дают матрицу (N, M).
+        """
+        return (
+            base_rate
+            * distance
+            * self.carrier_factor[carrier]
+            * self.cargo_factor[cargo]
+            * distance_factor(distance)
+            * weight_factor(weight)
+        )
+
+    def quote(self, requests, carriers=None):
+        """Котировки заявок по всем (или выбранным) перевозчикам.
+
+        requests - DataFrame или dict массивов: distance_km (или from_city
+        и to_city - тогда расстояние берется из матрицы городов), weight_kg,
+        cargo_type; необязательно insurance (bool) и base_cost_per_km
+        (ставка заявки вместо base_rate). Возвращает dict: 'carriers' -
+        список перевозчиков (колонки), остальные ключи COMPONENTS - массивы
+        (N, M) в рублях или коэффициентах.
+        """
+        names = self.carriers if carriers is None else pd.Index(carriers)
+        carrier = self.carrier_codes(names)
+        if 'distance_km' in requests:
+            distance = np.asarray(requests['distance_km'], dtype=np.float64)[:, None]
+        elif 'from_city' in requests and 'to_city' in requests:
+            distance = self.distances.distance(requests['from_city'], requests['to_city'])
+            distance = distance.astype(np.float64)[:, None]
+        else:
+            raise ValueError("В заявках нужны distance_km или from_city и to_city")
+        weight = np.asarray(requests['weight_kg'], dtype=np.float64)[:, None]
+        cargo = self.cargo_codes(requests['cargo_type'])[:, None]
+        if 'base_cost_per_km' in requests:
+            base_rate = np.asarray(requests['base_cost_per_km'], dtype=np.float64)[:, None]
+        else:
+            base_rate = np.full_like(distance, self.base_rate)
+        if 'insurance' in requests:
+            insured = np.asarray(requests['insurance'], dtype=bool)[:, None]
+        else:
+            insured = np.zeros(distance.shape, dtype=bool)
+
+        shape = (len(distance), len(carrier))
+        freight = self.freight(base_rate, distance, carrier, cargo, weight)
+        fuel = freight * self.fuel_rate
+        insurance = np.where(insured, freight * self.insurance_rate, 0.0)
+        return {
+            'carriers': list(names),
+            'base': np.broadcast_to(base_rate * distance, shape),
+            'carrier_factor': np.broadcast_to(self.carrier_factor[carrier], shape),
+            'cargo_factor': np.broadcast_to(self.cargo_factor[cargo], shape),
+            'distance_factor': np.broadcast_to(distance_factor(distance), shape),
+            'weight_factor': np.broadcast_to(weight_factor(weight), shape),
+            'freight': freight,
+            'fuel_surcharge': fuel,
+            'insurance_cost': insurance,
+            'total': freight + fuel + insurance,
+        }
+
+    def quote_frame(self, requests, carriers=None, components=COMPONENTS):
+        """Котировки таблицей: колонки (перевозчик, компонента) - перевозчики рядом"""
+        quotes = self.quote(requests, carriers)
+        names = quotes['carriers']
+        blocks = np.stack([quotes[c] for c in components], axis=2).reshape(len(quotes['total']), -1)
+        columns = pd.MultiIndex.from_product([names, list(components)], names=['carrier', 'component'])
+        return pd.DataFrame(blocks, columns=columns).round(2)
+
+    def cheapest(self, quotes):
+        """Самый дешевый перевозчик по каждой заявке: (имена, стоимость)"""
+        best = np.argmin(quotes['total'], axis=1)
+        total = quotes['total'][np.arange(len(best)), best]
+        return np.asarray(quotes['carriers'], dtype=object)[best], total
@@ -0,0 +1,225 @@
+"""
+Сервис запросов к "теплому" датасету
+
+Датасет загружается один раз: AdvancedLogisticsAnalyzer (KPI, индекс
+маршрутов) и ShipmentPartial с кубом агрегатов (разделы отчета
+ExtendedLogisticsAnalyzer). Версия данных - размер и время изменения
+файла; при ее смене датасет перезагружается, а кэш ответов сбрасывается.
+
+Ответы кэшируются готовым JSON (байты) по ключу (версия, запрос,
+параметры). Одновременные одинаковые запросы объединяются: вычисление
+выполняется один раз в пуле потоков, остальные ждут тот же результат.
+Время ответа по каждому запросу копится в гистограммах LatencyHistogram.
+
+Сервис не зависит от веб-фреймворка; HTTP-обвязка - app/api.py.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import time
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+from app.services.aggregates import ShipmentPartial, load_cube
+
+# Границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)   # последняя - больше всех границ
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            cumulative[str(bound)] = seen
+        cumulative['+Inf'] = self.count
+        return {
+            'count': self.count,
+            'sum_ms': round(self.sum_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': cumulative,
+        }
+
+
+def data_version(path):
+    """Версия данных: (размер, время изменения в нс)"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Dataset:
+    """Загруженные данные и построенные по ним структуры"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.version = data_version(self.path)
+        self.advanced = AdvancedLogisticsAnalyzer(self.path, columns=ShipmentPartial.columns())
+        df = self.advanced.df
+        self.partial = ShipmentPartial.from_frame(df, cube=load_cube(self.path, df))
+        # Индекс маршрутов строится (или читается из кэша) сразу, а не на первом запросе
+        self.advanced.route_index()
+
+
+def _records(frame):
+    return frame.reset_index().to_dict(orient='records')
+
+
+def query_kpis(dataset):
+    """Ключевые показатели"""
+    kpis = dataset.advanced.calculate_kpis()
+    p = dataset.partial
+    return {
+        'total_shipments': int(kpis['total_shipments']),
+        'total_revenue': float(kpis['total_revenue']),
+        'avg_cost_per_km': float(kpis['avg_cost_per_km']),
+        'most_common_route': [str(city) for city in kpis['most_common_route']],
+        'median_cost': p.median_cost(),
+        'total_weight': float(p.weight_sum),
+        'total_distance': float(p.distance_sum),
+        'date_min': p.date_min,
+        'date_max': p.date_max,
+    }
+
+
+def query_carriers(dataset, start=None, end=None, **filters):
+    """Статистика по перевозчикам; медиана - только без фильтров"""
+    c = dataset.partial.cube.query(by='carrier', start=start, end=end, **filters)
+    stats = c[['count', 'cost_sum']].assign(
+        avg_cost=c['cost_sum'] / c['count'],
+        avg_distance_km=c['distance_sum'] / c['count'],
+        avg_weight_kg=c['weight_sum'] / c['count'],
+        avg_cost_per_km=c['cost_per_km_sum'] / c['cost_per_km_count'],
+    )
+    if start is None and end is None and not any(v is not None for v in filters.values()):
+        stats['median_cost'] = dataset.partial.carrier_median_cost()
+    return _records(stats.sort_values('count', ascending=False, kind='stable').round(2))
+
+
+def query_routes(dataset, n=10, metric='avg_cost_per_km', largest=False, **filters):
+    """Top-N маршрутов из индекса (см. RouteIndex.top)"""
+    return dataset.advanced.top_routes(n, metric, largest, **filters)
+
+
+def query_seasonal(dataset, grain='month', start=None, end=None, **filters):
+    """Перевозки и стоимость по периодам из куба"""
+    periods = dataset.partial.cube.query(grain=grain, start=start, end=end, **filters)
+    return _records(periods[['count', 'cost_sum', 'weight_sum']].round(2))
+
+
+QUERIES = {
+    'kpis': query_kpis,
+    'carriers': query_carriers,
+    'routes': query_routes,
+    'seasonal': query_seasonal,
+}
+
+
+class QueryService:
+    """Запросы к датасету с кэшем ответов и объединением одинаковых запросов.
+
+    check_interval - как часто (с) проверять версию файла данных,
+    cache_size - число ответов в LRU-кэше.
+    """
+
+    def __init__(self, data_path, check_interval=1.0, cache_size=1024):
+        self.data_path = Path(data_path)
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self.histograms = defaultdict(LatencyHistogram)
+        self.computed = 0                 # число фактических вычислений (не из кэша)
+        self._dataset = None
+        self._checked_at = 0.0
+        self._reload_lock = asyncio.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+    async def dataset(self):
+        """Актуальный датасет (перезагружается при смене версии файла)"""
+        now = time.monotonic()
+        if self._dataset is not None and now - self._checked_at < self.check_interval:
+            return self._dataset
+        async with self._reload_lock:
+            current = self._dataset
+            if current is None or data_version(self.data_path) != current.version:
+                self._dataset = await asyncio.to_thread(Dataset, self.data_path)
+                self._cache.clear()
+            self._checked_at = time.monotonic()
+        return self._dataset
+
+    async def query(self, name, **params):
+        """JSON-ответ (bytes) на запрос name с параметрами params.
+
+        Неизвестный запрос или недопустимые параметры - ValueError.
+        """
+        if name not in QUERIES:
+            raise ValueError(f"Неизвестный запрос {name}, доступны: {', '.join(QUERIES)}")
+        dataset = await self.dataset()
+        key = (dataset.version, name, tuple(sorted(params.items())))
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._compute, dataset, name, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        body = await asyncio.shield(task)
+
+        self._cache[key] = body
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return body
+
+    def _compute(self, dataset, name, params):
+        self.computed += 1
+        result = QUERIES[name](dataset, **params)
+        return json.dumps(result, ensure_ascii=False, default=float).encode('utf-8')
+
+    def record_latency(self, endpoint, ms):
+        self.histograms[endpoint].record(ms)
+
+    def metrics(self):
+        """Гистограммы задержек и состояние кэша"""
+        dataset = self._dataset
+        return {
+            'data_version': list(dataset.version) if dataset else None,
+            'cached_responses': len(self._cache),
+            'computed': self.computed,
+            'latency': {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+        }
@@ -0,0 +1,274 @@
+"""
+Генерация отчетов: одна модель результатов - много форматов
+
+build_report() один раз собирает из ShipmentPartial неизменяемую модель
+ReportModel: сводные показатели и таблицы (перевозчики, маршруты, месяцы,
+кварталы). Рендеры только форматируют модель и ничего не пересчитывают,
+поэтому пять форматов стоят примерно одного прохода анализа.
+
+render_reports() запускает рендеры параллельно в пуле потоков. Строки
+таблиц пишутся в файл по одной (openpyxl - в режиме write_only, PDF -
+постранично), без сборки всего документа в памяти.
+
+Форматы: txt, html, csv, xlsx (нужен openpyxl), pdf (нужен matplotlib).
+"""
+
+import csv
+import html
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+FORMATS = ('txt', 'html', 'csv', 'xlsx', 'pdf')
+
+# Строк текста на страницу PDF
+PDF_LINES_PER_PAGE = 60
+
+
+@dataclass(frozen=True)
+class ReportTable:
+    """Таблица отчета; frame не изменяется после построения"""
+    name: str
+    title: str
+    frame: pd.DataFrame
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    def rows(self):
+        """Строки по одной (кортежи значений)"""
+        return self.frame.itertuples(index=False, name=None)
+
+
+@dataclass(frozen=True)
+class ReportModel:
+    """Результаты анализа для всех форматов отчета"""
+    title: str
+    source: str
+    generated_at: str
+    summary: tuple       # ((название, значение), ...)
+    tables: tuple        # (ReportTable, ...)
+
+
+def _ratio(a, b):
+    return float(a / b) if b else float('nan')
+
+
+def build_report(partial, source=''):
+    """Модель отчета по агрегатам ShipmentPartial (все вычисления - здесь)"""
+    p = partial
+    summary = (
+        ('Всего перевозок', int(p.count)),
+        ('Период данных', f"{p.date_min} - {p.date_max}"),
+        ('Перевозчиков', len(p.carriers)),
+        ('Городов отправления', len(p.from_cities)),
+        ('Общая стоимость, руб', float(p.cost_sum)),
+        ('Средняя стоимость, руб', _ratio(p.cost_sum, p.count)),
+        ('Медианная стоимость, руб', float(p.median_cost())),
+        ('Общий вес, кг', float(p.weight_sum)),
+        ('Общее расстояние, км', float(p.distance_sum)),
+        ('Средняя стоимость за км, руб', _ratio(p.cost_sum, p.distance_sum)),
+        ('Средняя стоимость за кг, руб', _ratio(p.cost_sum, p.weight_sum)),
+    )
+
+    tables = []
+    c = p.by_carrier
+    if c is not None:
+        carriers = pd.DataFrame({
+            'Перевозчик': c.index,
+            'Перевозок': c['count'].to_numpy(),
+            'Сумма, руб': c['cost_sum'].to_numpy(),
+            'Средняя, руб': (c['cost_sum'] / c['count']).to_numpy(),
+            'Медиана, руб': p.carrier_median_cost().reindex(c.index).to_numpy(),
+            'Ср. расстояние, км': (c['distance_sum'] / c['count']).to_numpy(),
+            'Ср. вес, кг': (c['weight_sum'] / c['count']).to_numpy(),
+            'Руб/км': (c['cost_per_km_sum'] / c['cost_per_km_count']).to_numpy(),
+        }).sort_values('Перевозок', ascending=False, kind='stable')
+        tables.append(ReportTable('carriers', 'Перевозчики', carriers.round(2).reset_index(drop=True)))
+
+        r = p.by_route
+        from_city, to_city = (r.index.get_level_values(i) for i in range(2))
+        routes = pd.DataFrame({
+            'Откуда': from_city,
+            'Куда': to_city,
+            'Перевозок': r['count'].to_numpy(),
+            'Ср. стоимость, руб': (r['cost_sum'] / r['count']).to_numpy(),
+            'Ср. расстояние, км': (r['distance_sum'] / r['count']).to_numpy(),
+            'Руб/км': (r['cost_per_km_sum'] / r['cost_per_km_count']).to_numpy(),
+        }).sort_values('Перевозок', ascending=False, kind='stable')
+        tables.append(ReportTable('routes', 'Маршруты', routes.round(2).reset_index(drop=True)))
+
+        for grain, name, title, label in (('month', 'months', 'По месяцам', 'Месяц'),
+                                          ('quarter', 'quarters', 'По кварталам', 'Квартал')):
+            periods = p.cube.query(grain=grain)
+            frame = pd.DataFrame({
+                label: periods.index,
+                'Перевозок': periods['count'].to_numpy(),
+                'Стоимость, руб': periods['cost_sum'].to_numpy(),
+                'Вес, кг': periods['weight_sum'].to_numpy(),
+            })
+            tables.append(ReportTable(name, title, frame.round(2)))
+
+    return ReportModel(
+        title='Отчет по анализу логистических данных',
+        source=str(source),
+        generated_at=datetime.now().strftime('%Y-%m-%d %H:%M'),
+        summary=summary,
+        tables=tuple(tables),
+    )
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def text_lines(model):
+    """Строки текстового отчета (используются в txt и pdf)"""
+    yield model.title.upper()
+    yield f"Источник: {model.source}"
+    yield f"Сформирован: {model.generated_at}"
+    yield "=" * 60
+    yield ""
+    yield "Сводные показатели:"
+    for label, value in model.summary:
+        yield f"  {label}: {_format(value)}"
+
+    for table in model.tables:
+        yield ""
+        yield f"{table.title}:"
+        # Ширина колонок - по заголовку и первым строкам: таблица не читается целиком
+        head = [[_format(v) for v in row] for row in islice(table.rows(), 200)]
+        widths = [max([len(name)] + [len(row[i]) for row in head])
+                  for i, name in enumerate(table.columns)]
+        yield "  " + "  ".join(name.ljust(w) for name, w in zip(table.columns, widths))
+        yield "  " + "  ".join("-" * w for w in widths)
+        for row in table.rows():
+            cells = [_format(v) for v in row]
+            yield "  " + "  ".join(
+                cell.ljust(w) if isinstance(value, str) else cell.rjust(w)
+                for cell, value, w in zip(cells, row, widths)
+            )
+
+
+def render_txt(model, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in text_lines(model):
+            f.write(line + "\n")
+
+
+def render_html(model, path):
+    e = html.escape
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html lang="ru">\n<head><meta charset="utf-8">'
+                f'<title>{e(model.title)}</title>\n<style>'
+                'body{font-family:sans-serif;margin:2em}'
+                'table{border-collapse:collapse;margin-bottom:2em}'
+                'th,td{border:1px solid #ccc;padding:4px 8px}td.n{text-align:right}'
+                '</style></head>\n<body>\n')
+        f.write(f'<h1>{e(model.title)}</h1>\n<p>Источник: {e(model.source)}<br>'
+                f'Сформирован: {e(model.generated_at)}</p>\n')
+        f.write('<h2>Сводные показатели</h2>\n<table>\n')
+        for label, value in model.summary:
+            f.write(f'<tr><th>{e(label)}</th><td class="n">{e(_format(value))}</td></tr>\n')
+        f.write('</table>\n')
+        for table in model.tables:
+            f.write(f'<h2>{e(table.title)}</h2>\n<table>\n<tr>')
+            f.write(''.join(f'<th>{e(name)}</th>' for name in table.columns))
+            f.write('</tr>\n')
+            for row in table.rows():
+                f.write('<tr>' + ''.join(
+                    f'<td>{e(v)}</td>' if isinstance(v, str) else f'<td class="n">{e(_format(v))}</td>'
+                    for v in row
+                ) + '</tr>\n')
+            f.write('</table>\n')
+        f.write('</body>\n</html>\n')
+
+
+def render_csv(model, path):
+    """Блоки: название раздела, заголовок, строки; между блоками - пустая строка"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([model.title])
+        writer.writerows(model.summary)
+        for table in model.tables:
+            writer.writerow([])
+            writer.writerow([table.title])
+            writer.writerow(table.columns)
+            writer.writerows(table.rows())
+
+
+def render_xlsx(model, path):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Для отчета в Excel установите openpyxl")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Сводка')
+    sheet.append([model.title])
+    sheet.append(['Источник', model.source])
+    sheet.append(['Сформирован', model.generated_at])
+    for label, value in model.summary:
+        sheet.append([label, value])
+    for table in model.tables:
+        sheet = workbook.create_sheet(table.title[:31])
+        sheet.append(table.columns)
+        for row in table.rows():
+            sheet.append(list(row))
+    workbook.save(path)
+
+
+def render_pdf(model, path):
+    """Текстовый отчет постранично, моноширинным шрифтом (matplotlib)"""
+    try:
+        from matplotlib.backends.backend_pdf import PdfPages
+        from matplotlib.figure import Figure
+    except ImportError:
+        raise RuntimeError("Для отчета в PDF установите matplotlib")
+    lines = text_lines(model)
+    with PdfPages(path) as pdf:
+        while True:
+            page = list(islice(lines, PDF_LINES_PER_PAGE))
+            if not page:
+                break
+            # Figure без pyplot: страницы можно рисовать из разных потоков
+            figure = Figure(figsize=(11.69, 8.27))      # A4, альбомная
+            figure.text(0.03, 0.97, "\n".join(page), family='monospace', fontsize=7, va='top')
+            pdf.savefig(figure)
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'html': render_html,
+    'csv': render_csv,
+    'xlsx': render_xlsx,
+    'pdf': render_pdf,
+}
+
+
+def render_reports(model, outputs, workers=None):
+    """Рендер модели в несколько файлов параллельно.
+
+    outputs: формат -> путь. Возвращает формат -> путь; ошибка любого
+    рендера пробрасывается после завершения остальных.
+    """
+    unknown = set(outputs) - set(RENDERERS)
+    if unknown:
+        raise ValueError(f"Неизвестные форматы: {', '.join(sorted(unknown))}; доступны: {', '.join(FORMATS)}")
+    outputs = {fmt: Path(path) for fmt, path in outputs.items()}
+    for path in outputs.values():
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers or len(outputs) or 1) as pool:
+        futures = {fmt: pool.submit(RENDERERS[fmt], model, path) for fmt, path in outputs.items()}
+    for future in futures.values():
+        future.result()
+    return outputs
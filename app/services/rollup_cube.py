@@ -0,0 +1,255 @@
+"""
+Куб предагрегатов: время × перевозчик × маршрут × груз × сегмент × приоритет
+
+Перевозки сворачиваются в ячейки с дневной гранулярностью по измерениям
+DIMENSIONS с суммами MEASURES. Рядом материализуется тот же куб по месяцам:
+запросы с разбивкой по месяцам, кварталам и годам читают его, по дням и
+неделям - дневной. Ячейки отсортированы по времени, окно дат выбирается
+бинарным поиском, фильтры по измерениям - маской по ячейкам, поэтому срез
+не зависит от числа исходных перевозок.
+
+Перевозки без даты лежат в ячейках с днем (и месяцем) MISSING_DAY - в
+начале таблиц. В разбивку по периодам и в окна дат они не попадают, в
+итоги без окна - попадают. Стоимость за км считается только по строкам,
+где она определена (distance_km > 0): cost_per_km_count - число таких
+строк, среднее - cost_per_km_sum / cost_per_km_count.
+
+Кубы объединяются через merge(): куб можно строить по частям (по файлам
+или по мере поступления данных через update()).
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.utils.dates import as_day
+from app.services.date_index import DAY_DTYPE, MISSING_DAY, MONTH_DTYPE, day_numbers
+
+DIMENSIONS = ('carrier', 'from_city', 'to_city', 'cargo_type', 'customer_segment', 'priority')
+MEASURES = ('count', 'cost_sum', 'distance_sum', 'weight_sum', 'cost_per_km_sum', 'cost_per_km_count')
+GRAINS = ('day', 'week', 'month', 'quarter', 'year')
+
+
+def _group(columns, keys):
+    """Свертка ячеек по ключам с суммированием мер (ключи по возрастанию)"""
+    frame = pd.DataFrame({name: columns[name] for name in (*keys, *MEASURES)})
+    grouped = frame.groupby(list(keys), sort=True)[list(MEASURES)].sum().reset_index()
+    return {name: grouped[name].to_numpy() for name in grouped.columns}
+
+
+class RollupCube:
+    """Объединяемый куб агрегатов по перевозкам"""
+
+    # Колонки данных, нужные для построения (from_frame)
+    COLUMNS = (*DIMENSIONS, 'date', 'cost_rub', 'distance_km', 'weight_kg')
+
+    def __init__(self, labels, days, months):
+        self.labels = {dim: list(labels[dim]) for dim in DIMENSIONS}
+        self.days = days          # dict колонок: day, DIMENSIONS, MEASURES; по day
+        self.months = months      # то же по month
+        self._label_codes = {dim: {v: i for i, v in enumerate(values)}
+                             for dim, values in self.labels.items()}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Построение куба по перевозкам (отсутствующие измерения - одно значение '')"""
+        columns, labels = {}, {}
+        for dim in DIMENSIONS:
+            if dim in df.columns:
+                columns[dim], labels[dim] = category_codes(df[dim])
+            else:
+                columns[dim], labels[dim] = np.zeros(len(df), dtype=np.int64), ['']
+
+        columns['day'] = day_numbers(df['date'])
+
+        cost = df['cost_rub'].to_numpy(dtype=np.float64)
+        distance = df['distance_km'].to_numpy(dtype=np.float64)
+        columns['count'] = np.ones(len(df), dtype=np.int64)
+        columns['cost_sum'] = cost
+        columns['distance_sum'] = distance
+        columns['weight_sum'] = df['weight_kg'].to_numpy(dtype=np.float64)
+        # Как в построчном расчете: строки без стоимости за км (нулевое
+        # расстояние, пропуски) в сумму и число для среднего не входят
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_per_km = cost / distance
+        known = np.isfinite(cost_per_km)
+        columns['cost_per_km_sum'] = np.where(known, cost_per_km, 0.0)
+        columns['cost_per_km_count'] = known.astype(np.int64)
+        return cls._from_day_cells(labels, _group(columns, ('day', *DIMENSIONS)))
+
+    @classmethod
+    def _from_day_cells(cls, labels, days):
+        months = dict(days)
+        month = days['day'].astype(DAY_DTYPE).astype(MONTH_DTYPE).astype(np.int32)
+        # Месяц ячеек без даты - тоже MISSING_DAY (первым в таблице)
+        months['month'] = np.where(days['day'] == MISSING_DAY, np.int32(MISSING_DAY), month)
+        return cls(labels, days, _group(months, ('month', *DIMENSIONS)))
+
+    def merge(self, other):
+        """Объединение двух кубов (возвращает новый куб)"""
+        labels, parts = {}, {}
+        for dim in DIMENSIONS:
+            labels[dim] = sorted(set(self.labels[dim]) | set(other.labels[dim]))
+        index = {dim: {v: i for i, v in enumerate(values)} for dim, values in labels.items()}
+
+        for cube in (self, other):
+            # Перекодирование измерений в общий словарь
+            for dim in DIMENSIONS:
+                remap = np.array([index[dim][v] for v in cube.labels[dim]], dtype=np.int64)
+                parts.setdefault(dim, []).append(remap[cube.days[dim]])
+            for name in ('day', *MEASURES):
+                parts.setdefault(name, []).append(cube.days[name])
+
+        columns = {name: np.concatenate(values) for name, values in parts.items()}
+        return self._from_day_cells(labels, _group(columns, ('day', *DIMENSIONS)))
+
+    def update(self, df):
+        """Куб с добавленными перевозками (инкрементальное обновление)"""
+        return self.merge(RollupCube.from_frame(df))
+
+    def save(self, path):
+        arrays = {f'labels_{dim}': np.array(values, dtype=str) for dim, values in self.labels.items()}
+        arrays.update({f'day_{name}': values for name, values in self.days.items()})
+        arrays.update({f'month_{name}': values for name, values in self.months.items()})
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Куб из файла; ValueError - файл старого формата (без части MEASURES)"""
+        with np.load(path) as data:
+            labels = {dim: data[f'labels_{dim}'].tolist() for dim in DIMENSIONS}
+            days = {key[len('day_'):]: data[key] for key in data.files if key.startswith('day_')}
+            months = {key[len('month_'):]: data[key] for key in data.files if key.startswith('month_')}
+        missing = [name for name in MEASURES if name not in days]
+        if missing:
+            raise ValueError(f"Куб {path} старого формата: нет мер {', '.join(missing)}")
+        return cls(labels, days, months)
+
+    @property
+    def n_cells(self):
+        return len(self.days['day'])
+
+    def _select(self, grain, start, end, filters):
+        """Срез ячеек: таблица по гранулярности, окно дат, маска фильтров.
+
+        Возвращает функцию колонка -> значения среза (колонки выбираются
+        по требованию) и имя временного ключа ('day' или 'month').
+        """
+        lo = None if start is None else as_day(start)
+        hi = None if end is None else as_day(end)
+        # Месячный куб годится, если окно дат совпадает с границами месяцев
+        aligned = all(
+            d is None or (np.datetime64(d + shift, 'D').astype(MONTH_DTYPE) !=
+                          np.datetime64(d + shift - 1, 'D').astype(MONTH_DTYPE))
+            for d, shift in ((lo, 0), (hi, 1))
+        )
+        if grain in ('month', 'quarter', 'year') and aligned:
+            table, key = self.months, 'month'
+            to_key = lambda d: int(np.datetime64(d, 'D').astype(MONTH_DTYPE).astype(np.int64))
+        else:
+            table, key = self.days, 'day'
+            to_key = int
+
+        values = table[key]
+        # Ячейки без даты (MISSING_DAY, в начале) - только в срезах без времени
+        dated = 0 if grain is None and lo is None and hi is None else \
+            np.searchsorted(values, MISSING_DAY, 'right')
+        first = dated if lo is None else max(dated, np.searchsorted(values, to_key(lo), 'left'))
+        last = len(values) if hi is None else np.searchsorted(values, to_key(hi), 'right')
+        window = slice(first, max(first, last))
+
+        mask = None
+        for dim, value in filters.items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Неизвестное измерение {dim}, доступны: {', '.join(DIMENSIONS)}")
+            if value is None:
+                continue
+            wanted = [value] if isinstance(value, str) else list(value)
+            codes = [self._label_codes[dim][v] for v in wanted if v in self._label_codes[dim]]
+            selected = np.isin(table[dim][window], codes)
+            mask = selected if mask is None else mask & selected
+
+        def column(name):
+            values = table[name][window]
+            return values if mask is None else values[mask]
+        return column, key
+
+    @staticmethod
+    def _periods(cells, key, grain):
+        """Код периода по ячейкам и функция подписи периода"""
+        if key == 'month':
+            months = cells('month').astype(np.int64)
+            if grain == 'month':
+                return months, lambda m: str(np.datetime64(int(m), 'M'))
+            if grain == 'quarter':
+                return months // 3, lambda q: f"{1970 + q // 4}-Q{q % 4 + 1}"
+            return months // 12, lambda y: str(1970 + y)
+
+        days = cells('day').astype(np.int64)
+        if grain == 'day':
+            return days, lambda d: str(np.datetime64(int(d), 'D'))
+        if grain == 'week':
+            # Неделя - с понедельника; 1970-01-01 - четверг
+            return days - (days + 3) % 7, lambda d: str(np.datetime64(int(d), 'D'))
+        months = days.astype(DAY_DTYPE).astype(MONTH_DTYPE).astype(np.int64)
+        return RollupCube._periods(lambda name: months, 'month', grain)
+
+    def query(self, by=(), grain=None, start=None, end=None, **filters):
+        """Срез куба.
+
+        by - измерения разбивки (из DIMENSIONS), grain - гранулярность времени
+        (из GRAINS) или None, start/end - окно дат включительно (дата или
+        'YYYY-MM-DD'), filters - значение или список значений измерения.
+        Возвращает DataFrame с колонками MEASURES, индекс - (grain, *by).
+        """
+        by = (by,) if isinstance(by, str) else tuple(by)
+        if not by and grain is None:
+            raise ValueError("Укажите измерения by и/или гранулярность grain")
+        if grain is not None and grain not in GRAINS:
+            raise ValueError(f"Неизвестная гранулярность {grain}, доступны: {', '.join(GRAINS)}")
+
+        cells, key = self._select(grain, start, end, filters)
+        # Коды ключей разбивки: период (плотная нумерация) и коды измерений
+        keys, codes, names = [], [], []
+        if grain is not None:
+            period, label = self._periods(cells, key, grain)
+            # Ячейки отсортированы по времени: номера периодов - по смене значения
+            change = np.empty(len(period), dtype=bool)
+            change[:1] = True
+            np.not_equal(period[1:], period[:-1], out=change[1:])
+            periods, period_codes = period[change], np.cumsum(change) - 1
+            keys.append(grain)
+            codes.append(period_codes)
+            names.append(np.array([label(p) for p in periods], dtype=object))
+        for dim in by:
+            keys.append(dim)
+            codes.append(cells(dim).astype(np.int64))
+            names.append(np.array(self.labels[dim], dtype=object))
+
+        # Свертка через bincount по составному ключу, без groupby.
+        # Небольшое пространство ключей - плотно, иначе через np.unique
+        shape = tuple(len(n) for n in names)
+        flat = np.ravel_multi_index(codes, shape)
+        size = int(np.prod(shape))
+        if size <= max(len(flat), 1 << 16):
+            sums = {name: np.bincount(flat, weights=cells(name), minlength=size) for name in MEASURES}
+            groups = np.flatnonzero(sums['count'])
+            sums = {name: values[groups] for name, values in sums.items()}
+        else:
+            groups, inverse = np.unique(flat, return_inverse=True)
+            sums = {name: np.bincount(inverse, weights=cells(name), minlength=len(groups))
+                    for name in MEASURES}
+        for name in ('count', 'cost_per_km_count'):
+            sums[name] = sums[name].astype(np.int64)
+
+        index = [n[c] for n, c in zip(names, np.unravel_index(groups, shape))]
+        result = pd.DataFrame(sums)
+        result.index = pd.MultiIndex.from_arrays(index, names=keys) if len(keys) > 1 \
+            else pd.Index(index[0], name=keys[0])
+        return result
+
+    def totals(self, start=None, end=None, **filters):
+        """Суммы MEASURES по срезу"""
+        cells, _ = self._select(None, start, end, filters)
+        return {name: cells(name).sum() for name in MEASURES}
@@ -0,0 +1,195 @@
+"""
+Индекс маршрутов для top-N запросов
+
+Перевозки один раз сворачиваются в ячейки (месяц, маршрут, перевозчик,
+тип груза) с количеством и суммами. Маршруты, города, перевозчики и типы
+грузов хранятся целочисленными кодами. Ячейки отсортированы по месяцу,
+поэтому окно дат выбирается бинарным поиском; остальные фильтры - маской
+по ячейкам. Top-N выбирается ограниченной кучей (heapq) по маршрутам,
+без повторного прохода по перевозкам.
+
+Месяцы - целые datetime64[M] (как в кубе предагрегатов и плане
+агрегаций). Окно дат округляется до целых месяцев.
+"""
+
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from app.utils.codes import category_codes
+from app.utils.dates import as_day
+from app.services.date_index import DAY_DTYPE, MISSING_DAY, MONTH_DTYPE, day_numbers
+
+METRICS = ('count', 'avg_cost', 'avg_cost_per_km', 'min_cost_per_km')
+
+
+def month_id(value):
+    """Номер месяца (datetime64[M]) по дате или строке YYYY-MM-DD"""
+    return int(np.datetime64(as_day(value), 'D').astype(MONTH_DTYPE).astype(np.int64))
+
+
+class RouteIndex:
+    """Статистика маршрутов в разрезе перевозчиков, типов груза и месяцев"""
+
+    COLUMNS = ('from_city', 'to_city', 'carrier', 'cargo_type', 'date', 'cost_rub', 'distance_km')
+
+    def __init__(self, cities, carriers, cargo_types, route_from, route_to, cells):
+        self.cities = list(cities)
+        self.carriers = list(carriers)
+        self.cargo_types = list(cargo_types)
+        self.route_from = route_from      # код маршрута -> код города отправления
+        self.route_to = route_to          # код маршрута -> код города назначения
+        self.cells = cells                # dict колонок, отсортированных по month
+        self._carrier_codes = {c: i for i, c in enumerate(self.carriers)}
+        self._cargo_codes = {c: i for i, c in enumerate(self.cargo_types)}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Построение индекса по перевозкам"""
+        from_codes, from_cities = category_codes(df['from_city'])
+        to_codes, to_cities = category_codes(df['to_city'])
+        cities = sorted(set(from_cities) | set(to_cities))
+        city_index = {c: i for i, c in enumerate(cities)}
+        # Код -1 (пропуск) указывает на последний элемент: -1 и в результате
+        from_ids = np.array([city_index[c] for c in from_cities] + [-1], dtype=np.int64)[from_codes]
+        to_ids = np.array([city_index[c] for c in to_cities] + [-1], dtype=np.int64)[to_codes]
+
+        carrier_codes, carriers = category_codes(df['carrier'])
+        if 'cargo_type' in df.columns:
+            cargo_codes, cargo_types = category_codes(df['cargo_type'])
+        else:
+            cargo_codes, cargo_types = np.zeros(len(df), dtype=np.int64), ['']
+        days = day_numbers(df['date'])
+        months = days.astype(DAY_DTYPE).astype(MONTH_DTYPE).astype(np.int64)
+
+        # Перевозки без даты или города не попадают ни в один маршрут
+        valid = (from_ids >= 0) & (to_ids >= 0) & (days != MISSING_DAY)
+        cost = df['cost_rub'].to_numpy(dtype=np.float64)
+        distance = df['distance_km'].to_numpy(dtype=np.float64)
+        if not valid.all():
+            from_ids, to_ids, months, carrier_codes, cargo_codes, cost, distance = (
+                values[valid] for values in (from_ids, to_ids, months, carrier_codes, cargo_codes,
+                                             cost, distance))
+
+        # Интернирование маршрутов: пара кодов городов -> код маршрута
+        pair = from_ids * len(cities) + to_ids
+        route_codes, route_pairs = pd.factorize(pair, sort=True)
+
+        frame = pd.DataFrame({
+            'month': months,
+            'route': route_codes,
+            'carrier': carrier_codes,
+            'cargo': cargo_codes,
+            'cost': cost,
+            'distance': distance,
+            'cost_per_km': cost / distance,
+        })
+        grouped = frame.groupby(['month', 'route', 'carrier', 'cargo'], sort=True).agg(
+            count=('cost', 'size'),
+            cost_sum=('cost', 'sum'),
+            distance_sum=('distance', 'sum'),
+            cost_per_km_sum=('cost_per_km', 'sum'),
+            min_cost_per_km=('cost_per_km', 'min'),
+        ).reset_index()
+
+        cells = {name: grouped[name].to_numpy() for name in grouped.columns}
+        return cls(cities, carriers, cargo_types,
+                   route_pairs // len(cities), route_pairs % len(cities), cells)
+
+    def save(self, path):
+        arrays = {f'cell_{name}': values for name, values in self.cells.items()}
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                cities=np.array(self.cities), carriers=np.array(self.carriers),
+                cargo_types=np.array(self.cargo_types),
+                route_from=self.route_from, route_to=self.route_to,
+                month_unit=np.array(MONTH_DTYPE), **arrays
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Индекс из файла; ValueError - файл со старой нумерацией месяцев"""
+        with np.load(path) as data:
+            if 'month_unit' not in data.files:
+                raise ValueError(f"Индекс маршрутов {path} старого формата")
+            cells = {key[len('cell_'):]: data[key] for key in data.files if key.startswith('cell_')}
+            return cls(data['cities'].tolist(), data['carriers'].tolist(),
+                       data['cargo_types'].tolist(), data['route_from'], data['route_to'], cells)
+
+    @property
+    def n_routes(self):
+        return len(self.route_from)
+
+    def _select(self, carrier=None, cargo_type=None, start=None, end=None):
+        """Срез ячеек: окно месяцев бинарным поиском, остальное - маской"""
+        month = self.cells['month']
+        lo = 0 if start is None else np.searchsorted(month, month_id(start), 'left')
+        hi = len(month) if end is None else np.searchsorted(month, month_id(end), 'right')
+        window = slice(lo, hi)
+        mask = np.ones(hi - lo, dtype=bool)
+
+        for column, value, codes in (('carrier', carrier, self._carrier_codes),
+                                     ('cargo', cargo_type, self._cargo_codes)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            wanted = [codes[v] for v in values if v in codes]
+            mask &= np.isin(self.cells[column][window], wanted)
+
+        return {name: values[window][mask] for name, values in self.cells.items()}
+
+    def route_stats(self, **filters):
+        """Статистика по всем маршрутам с учетом фильтров (массивы по коду маршрута)"""
+        cells = self._select(**filters)
+        n = self.n_routes
+        route = cells['route']
+        count = np.bincount(route, weights=cells['count'], minlength=n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats = {
+                'count': count,
+                'avg_cost': np.bincount(route, weights=cells['cost_sum'], minlength=n) / count,
+                'avg_cost_per_km': np.bincount(route, weights=cells['cost_per_km_sum'], minlength=n) / count,
+            }
+        min_cost_per_km = np.full(n, np.inf)
+        np.minimum.at(min_cost_per_km, route, cells['min_cost_per_km'])
+        stats['min_cost_per_km'] = min_cost_per_km
+        return stats
+
+    def top(self, n=5, metric='avg_cost_per_km', largest=False, **filters):
+        """Top-N маршрутов по метрике.
+
+        filters: carrier, cargo_type (значение или список), start, end
+        (дата или 'YYYY-MM-DD'). Окно дат расширяется до целых месяцев:
+        start='2023-06-15' учитывает весь июнь. Маршруты без перевозок в
+        срезе не учитываются.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестная метрика {metric}, доступны: {', '.join(METRICS)}")
+        stats = self.route_stats(**filters)
+        values = stats[metric]
+        candidates = np.flatnonzero(stats['count'] > 0).tolist()
+        pick = heapq.nlargest if largest else heapq.nsmallest
+        top = pick(n, candidates, key=values.__getitem__)
+        return [
+            {
+                'from_city': self.cities[self.route_from[r]],
+                'to_city': self.cities[self.route_to[r]],
+                'value': float(values[r]),
+                'count': int(stats['count'][r]),
+            }
+            for r in top
+        ]
+
+    def cheapest(self, n=5, **filters):
+        """Самые дешевые маршруты (средняя стоимость за км)"""
+        return self.top(n, 'avg_cost_per_km', largest=False, **filters)
+
+    def most_expensive(self, n=5, **filters):
+        """Самые дорогие маршруты (средняя стоимость за км)"""
+        return self.top(n, 'avg_cost_per_km', largest=True, **filters)
+
+    def most_popular(self, n=5, **filters):
+        """Самые популярные маршруты (число перевозок)"""
+        return self.top(n, 'count', largest=True, **filters)
@@ -0,0 +1,194 @@
+"""
+Оптимизация маршрутов: граф стоимости между городами
+
+По наблюдаемым перевозкам строится взвешенный граф городов с отдельным
+слоем на каждого перевозчика и общим слоем "любой перевозчик" (на каждом
+ребре - лучший из перевозчиков). Веса ребер:
+
+    cost          - средняя стоимость за км × среднее расстояние плеча, руб
+    cost_per_kg   - средняя стоимость за кг, руб/кг
+    delivery_days - среднее время доставки, дни
+
+Кратчайшие пути между всеми парами (в том числе через хабы) считаются
+векторным алгоритмом Флойда-Уоршелла сразу для всех слоев и метрик,
+после чего запрос "как дешевле всего из X в Y перевозчиком Z" - это
+чтение из матрицы и восстановление пути по матрице следующих вершин.
+"""
+
+import numpy as np
+import pandas as pd
+
+METRICS = ('cost', 'cost_per_kg', 'delivery_days')
+ANY_CARRIER = None
+
+
+def _floyd_warshall(dist):
+    """Кратчайшие пути для пачки графов dist[..., n, n] (np.inf - нет ребра).
+
+    Возвращает (dist, next_hop): next_hop[..., i, j] - следующий город
+    на кратчайшем пути из i в j (-1, если пути нет).
+    """
+    dist = dist.copy()
+    n = dist.shape[-1]
+    next_hop = np.where(np.isfinite(dist), np.arange(n), -1)
+    idx = np.arange(n)
+    dist[..., idx, idx] = 0
+    next_hop[..., idx, idx] = idx
+
+    for k in range(n):
+        via = dist[..., :, k, None] + dist[..., None, k, :]
+        better = via < dist
+        dist = np.where(better, via, dist)
+        next_hop = np.where(better, next_hop[..., :, k, None], next_hop)
+    return dist, next_hop
+
+
+class RouteGraph:
+    """Граф стоимости между городами с предрасчитанными кратчайшими путями"""
+
+    COLUMNS = ('from_city', 'to_city', 'carrier', 'distance_km', 'cost_rub', 'weight_kg', 'delivery_days')
+
+    def __init__(self, cities, carriers, edges, dist, next_hop):
+        self.cities = list(cities)
+        self.carriers = list(carriers)
+        self.edges = edges          # metric -> (layers, n, n) веса прямых ребер
+        self.dist = dist            # metric -> (layers, n, n) кратчайшие пути
+        self.next_hop = next_hop    # metric -> (layers, n, n)
+        self._city_index = {city: i for i, city in enumerate(self.cities)}
+        self._layer_index = {carrier: i for i, carrier in enumerate(self.carriers)}
+        self._layer_index[ANY_CARRIER] = len(self.carriers)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Построение графа по перевозкам"""
+        cost = df['cost_rub'].to_numpy(dtype=np.float64)
+        distance = df['distance_km'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cost_per_km = cost / distance
+            cost_per_kg = cost / df['weight_kg'].to_numpy(dtype=np.float64)
+        frame = pd.DataFrame({
+            'from_city': df['from_city'].astype(str).to_numpy(),
+            'to_city': df['to_city'].astype(str).to_numpy(),
+            'carrier': df['carrier'].astype(str).to_numpy(),
+            'distance': distance,
+            'cost_per_km': cost_per_km,
+            'cost_per_kg': cost_per_kg,
+            'delivery_days': (
+                df['delivery_days'].to_numpy(dtype=np.float64)
+                if 'delivery_days' in df.columns else np.nan
+            ),
+        })
+        frame = frame[np.isfinite(frame['cost_per_km']) & np.isfinite(frame['cost_per_kg'])]
+
+        cities = sorted(set(frame['from_city']) | set(frame['to_city']))
+        carriers = sorted(set(frame['carrier']))
+        n, layers = len(cities), len(carriers) + 1
+
+        lanes = frame.groupby(['carrier', 'from_city', 'to_city']).agg(
+            distance=('distance', 'mean'),
+            cost_per_km=('cost_per_km', 'mean'),
+            cost_per_kg=('cost_per_kg', 'mean'),
+            delivery_days=('delivery_days', 'mean'),
+        ).reset_index()
+        lanes['cost'] = lanes['cost_per_km'] * lanes['distance']
+
+        # Целые коды и для пустого среза (после map пустая колонка - float)
+        layer = lanes['carrier'].map({c: i for i, c in enumerate(carriers)}).to_numpy(dtype=np.int64)
+        src = lanes['from_city'].map({c: i for i, c in enumerate(cities)}).to_numpy(dtype=np.int64)
+        dst = lanes['to_city'].map({c: i for i, c in enumerate(cities)}).to_numpy(dtype=np.int64)
+
+        edges, dist, next_hop = {}, {}, {}
+        for metric in METRICS:
+            weights = np.full((layers, n, n), np.inf)
+            values = lanes[metric].to_numpy()
+            known = np.isfinite(values)
+            weights[layer[known], src[known], dst[known]] = values[known]
+            # Слой "любой перевозчик": лучшее ребро среди всех перевозчиков
+            weights[-1] = weights[:-1].min(axis=0, initial=np.inf)
+            edges[metric] = weights
+            dist[metric], next_hop[metric] = _floyd_warshall(weights)
+        return cls(cities, carriers, edges, dist, next_hop)
+
+    def save(self, path):
+        arrays = {'cities': np.array(self.cities), 'carriers': np.array(self.carriers)}
+        for metric in METRICS:
+            arrays[f'edges_{metric}'] = self.edges[metric]
+            arrays[f'dist_{metric}'] = self.dist[metric]
+            arrays[f'next_{metric}'] = self.next_hop[metric]
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['cities'].tolist(),
+                data['carriers'].tolist(),
+                {m: data[f'edges_{m}'] for m in METRICS},
+                {m: data[f'dist_{m}'] for m in METRICS},
+                {m: data[f'next_{m}'] for m in METRICS},
+            )
+
+    def _ids(self, from_city, to_city, carrier):
+        try:
+            return (self._layer_index[carrier],
+                    self._city_index[from_city],
+                    self._city_index[to_city])
+        except KeyError as e:
+            raise KeyError(f"Неизвестный город или перевозчик: {e.args[0]}") from None
+
+    def cost(self, from_city, to_city, carrier=ANY_CARRIER, metric='cost'):
+        """Значение метрики на лучшем пути (inf - пути нет)"""
+        layer, i, j = self._ids(from_city, to_city, carrier)
+        return float(self.dist[metric][layer, i, j])
+
+    def path(self, from_city, to_city, carrier=ANY_CARRIER, metric='cost'):
+        """Города лучшего пути, включая начало и конец ([] - пути нет)"""
+        layer, i, j = self._ids(from_city, to_city, carrier)
+        next_hop = self.next_hop[metric][layer]
+        if next_hop[i, j] < 0:
+            return []
+        path = [i]
+        while i != j:
+            i = next_hop[i, j]
+            path.append(i)
+        return [self.cities[k] for k in path]
+
+    def cheapest(self, from_city, to_city, carrier=ANY_CARRIER, metric='cost'):
+        """Лучший путь с поплечной детализацией"""
+        path = self.path(from_city, to_city, carrier, metric)
+        layer = self._layer_index[carrier]
+        legs = []
+        for a, b in zip(path, path[1:]):
+            i, j = self._city_index[a], self._city_index[b]
+            leg = {'from_city': a, 'to_city': b, metric: float(self.edges[metric][layer, i, j])}
+            if carrier is ANY_CARRIER:
+                per_carrier = self.edges[metric][:-1, i, j]
+                leg['carrier'] = self.carriers[int(np.argmin(per_carrier))]
+            legs.append(leg)
+        return {
+            'from_city': from_city,
+            'to_city': to_city,
+            'carrier': carrier,
+            'metric': metric,
+            'value': self.cost(from_city, to_city, carrier, metric),
+            'path': path,
+            'legs': legs,
+        }
+
+    def savings(self, carrier=ANY_CARRIER, metric='cost'):
+        """Пары городов, где путь через хабы выгоднее прямого плеча"""
+        layer = self._layer_index[carrier]
+        direct = self.edges[metric][layer]
+        best = self.dist[metric][layer]
+        i, j = np.nonzero(np.isfinite(direct) & (best < direct - 1e-9))
+        result = pd.DataFrame({
+            'from_city': [self.cities[k] for k in i],
+            'to_city': [self.cities[k] for k in j],
+            'direct': direct[i, j],
+            'best': best[i, j],
+        })
+        result['saving'] = result['direct'] - result['best']
+        result['path'] = [' → '.join(self.path(a, b, carrier, metric))
+                          for a, b in zip(result['from_city'], result['to_city'])]
+        return result.sort_values('saving', ascending=False, ignore_index=True)
@@ -0,0 +1,272 @@
+"""
+Хранилище перевозок во встроенной SQLite с агрегацией на стороне базы
+
+Файлы перевозок загружаются в одну таблицу shipments порциями (весь файл
+в память не читается), с индексами по дате, перевозчику и маршруту.
+Каждый файл учитывается в таблице sources по размеру и mtime: при
+повторном открытии перезагружаются только изменившиеся файлы.
+
+ShipmentStore.query() и totals() повторяют интерфейс RollupCube: срезы
+считаются GROUP BY в базе, в Python попадают только строки результата.
+Поэтому хранилище можно подставить в ShipmentPartial вместо куба и
+анализировать данные, не помещающиеся в память.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.utils.data_loader import CACHE_DIR_NAME
+from app.services.rollup_cube import DIMENSIONS, GRAINS, MEASURES
+
+# Движки анализа: pandas (колоночный кэш в памяти) или sql (агрегация в SQLite)
+ENGINES = ('pandas', 'sql')
+
+# Колонки таблицы shipments; отсутствующие в файле колонки - NULL
+SCHEMA = {
+    'shipment_id': 'INTEGER',
+    'from_city': 'TEXT',
+    'to_city': 'TEXT',
+    'distance_km': 'REAL',
+    'weight_kg': 'REAL',
+    'volume_m3': 'REAL',
+    'cargo_type': 'TEXT',
+    'carrier': 'TEXT',
+    'cost_rub': 'REAL',
+    'date': 'TEXT',
+    'status': 'TEXT',
+    'delivery_days': 'REAL',
+    'customer_id': 'INTEGER',
+    'customer_segment': 'TEXT',
+    'priority': 'TEXT',
+}
+
+# Индексы запросов: на время массовой загрузки удаляются и строятся заново.
+# Индекс по source_id постоянный - по нему удаляются строки замененных файлов
+SOURCE_INDEX = 'idx_shipments_source'
+INDEXES = {
+    'idx_shipments_date': '(date)',
+    'idx_shipments_carrier': '(carrier, cost_rub)',
+    'idx_shipments_route': '(from_city, to_city)',
+    'idx_shipments_cost': '(cost_rub)',
+}
+
+# Выражения периода по колонке date ('YYYY-MM-DD')
+GRAIN_SQL = {
+    'day': "date",
+    'week': "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "substr(date, 1, 7)",
+    'quarter': "substr(date, 1, 4) || '-Q' || ((CAST(substr(date, 6, 2) AS INTEGER) + 2) / 3)",
+    'year': "substr(date, 1, 4)",
+}
+
+MEASURES_SQL = (
+    "COUNT(*) AS count, "
+    "COALESCE(SUM(cost_rub), 0.0) AS cost_sum, "
+    "COALESCE(SUM(distance_km), 0.0) AS distance_sum, "
+    "COALESCE(SUM(weight_kg), 0.0) AS weight_sum, "
+    "COALESCE(SUM(cost_rub / distance_km), 0.0) AS cost_per_km_sum, "
+    # Деление на ноль в SQLite дает NULL: такие строки не считаются, как в кубе
+    "COUNT(cost_rub / distance_km) AS cost_per_km_count"
+)
+
+
+def _as_date(value):
+    """Дата, datetime или строка -> 'YYYY-MM-DD'"""
+    return str(np.datetime64(str(value)[:10], 'D'))
+
+
+def store_path_for(source):
+    """Путь базы по умолчанию: рядом с колоночным кэшем файла"""
+    source = Path(source)
+    return source.parent / CACHE_DIR_NAME / f'{source.name}.sqlite'
+
+
+class ShipmentStore:
+    """Перевозки из набора файлов в одной базе SQLite"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        columns = ', '.join(f'{name} {sql_type}' for name, sql_type in SCHEMA.items())
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS sources (
+                id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime_ns INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS shipments (source_id INTEGER, {columns});
+            CREATE INDEX IF NOT EXISTS {SOURCE_INDEX} ON shipments (source_id);
+        """)
+
+    @classmethod
+    def for_files(cls, paths, db_path=None, chunk_size=100_000):
+        """Хранилище с актуальными данными ровно этих файлов"""
+        paths = [Path(p).resolve() for p in paths]
+        if not paths:
+            raise FileNotFoundError("Не найдено ни одного входного файла")
+        store = cls(db_path or store_path_for(paths[0]))
+        store.sync(paths, chunk_size)
+        return store
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sync(self, paths, chunk_size=100_000):
+        """Загрузка новых и изменившихся файлов, удаление лишних.
+
+        Возвращает список перезагруженных файлов.
+        """
+        wanted = {str(Path(p).resolve()) for p in paths}
+        known = {path: (source_id, size, mtime_ns) for source_id, path, size, mtime_ns
+                 in self.conn.execute("SELECT id, path, size, mtime_ns FROM sources")}
+
+        stale = [path for path in known if path not in wanted]
+        changed = []
+        for path in sorted(wanted):
+            stat = os.stat(path)
+            if path not in known or known[path][1:] != (stat.st_size, stat.st_mtime_ns):
+                changed.append(path)
+        if not stale and not changed:
+            return []
+
+        # Массовая загрузка: без журнала на диске и без индексов запросов.
+        # Режимы журнала возвращаются сразу после загрузки, чтобы сбой при
+        # последующих записях не повредил базу
+        journal_mode = self.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        synchronous = self.conn.execute("PRAGMA synchronous").fetchone()[0]
+        self.conn.execute("PRAGMA journal_mode = MEMORY")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        try:
+            with self.conn:
+                # Удаление индексов - в той же транзакции, что и загрузка
+                self.conn.execute("BEGIN")
+                for name in INDEXES:
+                    self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+                for path in stale + [p for p in changed if p in known]:
+                    self.conn.execute("DELETE FROM shipments WHERE source_id = ?", (known[path][0],))
+                    self.conn.execute("DELETE FROM sources WHERE id = ?", (known[path][0],))
+                for path in changed:
+                    self._load_file(path, chunk_size)
+                for name, columns in INDEXES.items():
+                    self.conn.execute(f"CREATE INDEX {name} ON shipments {columns}")
+        finally:
+            self.conn.execute(f"PRAGMA synchronous = {int(synchronous)}")
+            self.conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self.conn.execute("ANALYZE")
+        return changed
+
+    def _load_file(self, path, chunk_size):
+        stat = os.stat(path)
+        cursor = self.conn.execute(
+            "INSERT INTO sources (path, size, mtime_ns) VALUES (?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime_ns),
+        )
+        source_id = cursor.lastrowid
+
+        header = pd.read_csv(path, nrows=0).columns
+        present = [name for name in SCHEMA if name in header]
+        text = {name: str for name in present if SCHEMA[name] == 'TEXT'}
+        insert = (f"INSERT INTO shipments (source_id, {', '.join(present)}) "
+                  f"VALUES ({', '.join('?' * (len(present) + 1))})")
+        for chunk in pd.read_csv(path, usecols=present, dtype=text, chunksize=chunk_size):
+            # NaN SQLite сохраняет как NULL, отдельная замена пропусков не нужна
+            columns = [[source_id] * len(chunk)] + [chunk[name].tolist() for name in present]
+            self.conn.executemany(insert, zip(*columns))
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def frame(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    @staticmethod
+    def where_clause(start, end, filters):
+        """Условие WHERE (с ведущим ' WHERE' или пустое) и его параметры"""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(_as_date(start))
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(_as_date(end))
+        for dim, value in filters.items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Неизвестное измерение {dim}, доступны: {', '.join(DIMENSIONS)}")
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            # '' - отсутствующее значение (как в кубе); иначе сравнение по индексу
+            column = f"COALESCE({dim}, '')" if '' in values else dim
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, by=(), grain=None, start=None, end=None, **filters):
+        """Срез с агрегацией в базе (интерфейс и результат - как RollupCube.query)"""
+        by = (by,) if isinstance(by, str) else tuple(by)
+        if not by and grain is None:
+            raise ValueError("Укажите измерения by и/или гранулярность grain")
+        if grain is not None and grain not in GRAINS:
+            raise ValueError(f"Неизвестная гранулярность {grain}, доступны: {', '.join(GRAINS)}")
+        for dim in by:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Неизвестное измерение {dim}, доступны: {', '.join(DIMENSIONS)}")
+
+        keys = ([f"{GRAIN_SQL[grain]} AS {grain}"] if grain else []) + \
+               [f"COALESCE({dim}, '') AS {dim}" for dim in by]
+        names = ([grain] if grain else []) + list(by)
+        where, params = self.where_clause(start, end, filters)
+        if grain:
+            # Как в кубе: перевозки без даты не попадают в периоды
+            where += (" AND " if where else " WHERE ") + "date IS NOT NULL"
+        order = ', '.join(str(i + 1) for i in range(len(names)))
+        result = self.frame(
+            f"SELECT {', '.join(keys)}, {MEASURES_SQL} FROM shipments{where} "
+            f"GROUP BY {order} ORDER BY {order}",
+            params,
+        )
+        return result.set_index(names if len(names) > 1 else names[0])[list(MEASURES)]
+
+    def totals(self, start=None, end=None, **filters):
+        """Суммы MEASURES по срезу"""
+        where, params = self.where_clause(start, end, filters)
+        row = self.execute(f"SELECT {MEASURES_SQL} FROM shipments{where}", params).fetchone()
+        return dict(zip(MEASURES, row))
+
+    def date_range(self):
+        return tuple(self.execute("SELECT MIN(date), MAX(date) FROM shipments").fetchone())
+
+    def distinct(self, column):
+        if column not in SCHEMA:
+            raise ValueError(f"Неизвестная колонка {column}")
+        return [value for value, in self.execute(
+            f"SELECT DISTINCT {column} FROM shipments WHERE {column} IS NOT NULL ORDER BY 1")]
+
+    def median_cost(self, carrier=None):
+        """Медиана стоимости (по индексу: два значения из середины упорядоченного столбца)"""
+        where, params = ("WHERE carrier = ? AND cost_rub IS NOT NULL", (carrier,)) if carrier is not None \
+            else ("WHERE cost_rub IS NOT NULL", ())
+        n = self.execute(f"SELECT COUNT(*) FROM shipments {where}", params).fetchone()[0]
+        if not n:
+            return float('nan')
+        middle = self.execute(
+            f"SELECT AVG(cost_rub) FROM (SELECT cost_rub FROM shipments {where} "
+            f"ORDER BY cost_rub LIMIT ? OFFSET ?)",
+            (*params, 2 - n % 2, (n - 1) // 2),
+        ).fetchone()[0]
+        return float(middle)
+
+    def carrier_median_cost(self):
+        medians = pd.Series({carrier: self.median_cost(carrier) for carrier in self.distinct('carrier')},
+                            dtype='float64')
+        return medians.rename_axis('carrier')
+
@@ -0,0 +1 @@
+"""Вспомогательные модули Logistics Analyzer"""
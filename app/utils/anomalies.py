@@ -0,0 +1,183 @@
+"""
+Потоковый поиск аномальных цен перевозок
+
+CostAnomalyDetector ведет для каждого ключа (маршрут, перевозчик, тип
+груза) онлайн-среднее и дисперсию (алгоритм Уэлфорда) логарифмов
+стоимости за км и за кг. Перевозка проверяется по накопленной статистике
+своего ключа до учета: если отклонение любой из метрик больше threshold
+стандартных отклонений, она помечается аномальной. Проверка и обновление -
+O(1) на перевозку, поэтому детектор работает прямо при загрузке данных.
+
+Статистика хранится компактно: словарь ключ -> номер слота и массивы
+array('q'/'d') по слотам. Состояние сохраняется в JSON (to_dict/save) и
+восстанавливается (from_dict/load), так что дочитывание файла после
+контрольной точки дает тот же результат, что и полный проход.
+
+Модуль использует только стандартную библиотеку (нужен LogisticsAnalyzer).
+"""
+
+import json
+import math
+import os
+from array import array
+from collections import deque
+from pathlib import Path
+
+METRICS = ('cost_per_km', 'cost_per_kg')
+
+# Порог отклонения (в стандартных отклонениях логарифма цены)
+Z_THRESHOLD = 4.0
+# Ключ проверяется, когда по нему накоплено столько перевозок
+MIN_COUNT = 20
+# Нижняя граница стандартного отклонения логарифма (~1% цены): иначе при
+# одинаковых ценах любое отличие дает бесконечное отклонение
+MIN_STD = 0.01
+# Сколько последних аномалий хранить для отчета
+MAX_RECENT = 1000
+
+STATE_VERSION = 1
+
+
+class CostAnomalyDetector:
+    """Онлайн-статистика цен по ключам и пометка выбросов.
+
+    Аномальные перевозки в статистику не добавляются, чтобы завышенные
+    счета не расширяли допустимый разброс своего ключа.
+    """
+
+    def __init__(self, threshold=Z_THRESHOLD, min_count=MIN_COUNT, max_recent=MAX_RECENT):
+        self.threshold = threshold
+        self.min_count = min_count
+        self.slots = {}                 # (from_city, to_city, carrier, cargo_type) -> слот
+        self.counts = array('q')
+        # По две ячейки на слот: cost_per_km, cost_per_kg
+        self.means = array('d')
+        self.m2 = array('d')
+        self.checked = 0
+        self.flagged = 0
+        self.recent = deque(maxlen=max_recent)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.counts)
+            self.counts.append(0)
+            self.means.extend((0.0, 0.0))
+            self.m2.extend((0.0, 0.0))
+        return slot
+
+    def _std(self, i, n):
+        return max(math.sqrt(self.m2[i] / (n - 1)), MIN_STD)
+
+    def update(self, from_city, to_city, carrier, cargo_type, distance, weight, cost,
+               shipment_id=None):
+        """Проверка и учет одной перевозки: словарь аномалии или None"""
+        if distance <= 0 or weight <= 0 or cost <= 0:
+            return None
+        key = (from_city, to_city, carrier, cargo_type)
+        slot = self._slot(key)
+        values = (math.log(cost / distance), math.log(cost / weight))
+        n = self.counts[slot]
+        i = 2 * slot
+        means, m2 = self.means, self.m2
+
+        if n >= self.min_count:
+            self.checked += 1
+            z_km = (values[0] - means[i]) / self._std(i, n)
+            z_kg = (values[1] - means[i + 1]) / self._std(i + 1, n)
+            if abs(z_km) > self.threshold or abs(z_kg) > self.threshold:
+                self.flagged += 1
+                anomaly = {
+                    'shipment_id': shipment_id,
+                    'route': f"{from_city} → {to_city}",
+                    'carrier': carrier,
+                    'cargo_type': cargo_type,
+                    'cost': cost,
+                    'cost_per_km': cost / distance,
+                    'expected_cost_per_km': math.exp(means[i]),
+                    'cost_per_kg': cost / weight,
+                    'expected_cost_per_kg': math.exp(means[i + 1]),
+                    'z_cost_per_km': z_km,
+                    'z_cost_per_kg': z_kg,
+                }
+                self.recent.append(anomaly)
+                return anomaly
+
+        # Шаг Уэлфорда для обеих метрик
+        n += 1
+        self.counts[slot] = n
+        for j, x in enumerate(values, i):
+            delta = x - means[j]
+            means[j] += delta / n
+            m2[j] += delta * (x - means[j])
+        return None
+
+    def stats(self, from_city, to_city, carrier, cargo_type):
+        """Накопленная статистика ключа (типичная цена - среднее геометрическое)"""
+        slot = self.slots.get((from_city, to_city, carrier, cargo_type))
+        if slot is None:
+            return None
+        n, i = self.counts[slot], 2 * slot
+        result = {'count': n}
+        for j, metric in enumerate(METRICS, i):
+            result[metric] = math.exp(self.means[j]) if n else None
+            result[f'{metric}_log_std'] = math.sqrt(self.m2[j] / (n - 1)) if n > 1 else None
+        return result
+
+    def top(self, n=10):
+        """Сильнейшие из последних аномалий (по модулю отклонения)"""
+        return sorted(self.recent, reverse=True,
+                      key=lambda a: max(abs(a['z_cost_per_km']), abs(a['z_cost_per_kg'])))[:n]
+
+    # --- контрольные точки ---
+
+    def to_dict(self):
+        """Состояние детектора в виде, пригодном для JSON"""
+        keys = [None] * len(self.slots)
+        for key, slot in self.slots.items():
+            keys[slot] = list(key)
+        return {
+            'version': STATE_VERSION,
+            'threshold': self.threshold,
+            'min_count': self.min_count,
+            'max_recent': self.recent.maxlen,
+            'keys': keys,
+            'counts': self.counts.tolist(),
+            'means': self.means.tolist(),
+            'm2': self.m2.tolist(),
+            'checked': self.checked,
+            'flagged': self.flagged,
+            'recent': list(self.recent),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Восстановление детектора из to_dict()"""
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"Неподдерживаемая версия состояния детектора: {state.get('version')}")
+        detector = cls(state['threshold'], state['min_count'], state['max_recent'])
+        detector.slots = {tuple(key): slot for slot, key in enumerate(state['keys'])}
+        detector.counts = array('q', state['counts'])
+        detector.means = array('d', state['means'])
+        detector.m2 = array('d', state['m2'])
+        detector.checked = state['checked']
+        detector.flagged = state['flagged']
+        detector.recent.extend(state['recent'])
+        return detector
+
+    def save(self, path):
+        """Атомарная запись контрольной точки"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
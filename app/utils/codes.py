@@ -0,0 +1,34 @@
+"""
+Целочисленные коды значений колонок
+
+Категориальные колонки (словарь + коды) кодируются без разбора строк:
+коды берутся из колонки, словарь - ее категории. Строковые колонки
+кодируются через pd.factorize по отсортированным значениям. Пропуск
+(NaN) - код -1.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def category_codes(series, labels=None, used_only=False):
+    """Коды значений колонки (категориальной или строковой).
+
+    Без labels возвращает (codes, labels): словарь - категории колонки
+    (used_only - только встречающиеся) или ее отсортированные значения.
+    С labels возвращает коды по заданному словарю (int64, -1 - значения
+    нет в словаре).
+    """
+    categorical = isinstance(series.dtype, pd.CategoricalDtype)
+    if labels is None:
+        if categorical:
+            if used_only:
+                series = series.cat.remove_unused_categories()
+            return series.cat.codes.to_numpy(), [str(c) for c in series.cat.categories]
+        codes, uniques = pd.factorize(series.astype(str).where(series.notna()), sort=True)
+        return codes, list(uniques)
+    if categorical:
+        index = {label: i for i, label in enumerate(labels)}
+        lookup = np.array([index.get(str(c), -1) for c in series.cat.categories] + [-1], dtype=np.int64)
+        return lookup[series.cat.codes.to_numpy()]
+    return pd.Index(labels).get_indexer(series.astype(str)).astype(np.int64)
@@ -0,0 +1,368 @@
+"""
+Загрузка данных о перевозках через колоночный кэш
+
+CSV разбирается один раз и сохраняется рядом с исходным файлом
+в каталоге .cache/<имя файла>/: по одному .npy на колонку и meta.json.
+Строковые колонки (перевозчик, города, тип груза, статус, приоритет и т.д.)
+хранятся словарем: коды int8/int16/int32 + список значений в meta.json.
+Повторные загрузки отображают .npy в память (mmap) без разбора CSV.
+Кэш пересобирается автоматически, если изменились размер или mtime исходника.
+
+Разбираются только запрошенные колонки (columns) с типами из схемы
+(app.utils.schema): остальные pd.read_csv пропускает, не разбирая. Когда
+позже запрашивается колонка, которой в кэше еще нет, она дочитывается из
+CSV и добавляется к кэшу - уже записанные колонки и производные данные
+остаются на месте.
+
+Каталог в том же формате можно записать напрямую (ColumnarWriter) -
+например, генератором тестовых данных - и передавать его вместо CSV.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.utils.profiling import stage
+from app.utils.schema import apply_schema, read_dtypes
+
+CACHE_VERSION = 2
+CACHE_DIR_NAME = '.cache'
+
+# Загруженные через веб-интерфейс файлы сохраняются сюда по хэшу содержимого
+UPLOADS_DIR = Path(__file__).resolve().parents[2] / 'data' / CACHE_DIR_NAME / 'uploads'
+
+
+def cache_dir_for(source):
+    """Каталог кэша для CSV файла"""
+    source = Path(source)
+    return source.parent / CACHE_DIR_NAME / source.name
+
+
+def _source_signature(source):
+    stat = os.stat(source)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _codes_dtype(n_categories):
+    """Наименьший знаковый тип для кодов словаря (-1 означает пропуск)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(cache_dir / 'meta.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_cache_valid(source, cache_dir=None):
+    """Проверка, что кэш существует и собран из текущей версии файла"""
+    cache_dir = Path(cache_dir) if cache_dir else cache_dir_for(source)
+    meta = _read_meta(cache_dir)
+    return (
+        meta is not None
+        and meta.get('version') == CACHE_VERSION
+        and meta.get('source') == _source_signature(source)
+    )
+
+
+def _read_header(source):
+    return list(pd.read_csv(source, nrows=0).columns)
+
+
+def _read_columns(source, header, columns):
+    """Разбор колонок CSV (в порядке файла) с типами из схемы"""
+    names = [name for name in header if name in set(columns)]
+    with stage('read_csv') as record:
+        df = pd.read_csv(source, usecols=names, dtype=read_dtypes(names))
+        record['rows'] = len(df)
+        record['columns'] = len(names)
+    return apply_schema(df)
+
+
+def build_cache(source, cache_dir=None, columns=None):
+    """Разбор CSV и запись колоночного кэша. Возвращает meta.
+
+    columns - какие колонки разобрать (None - все); остальные
+    дочитываются при первом запросе (см. load_columns).
+    """
+    source = Path(source)
+    cache_dir = Path(cache_dir) if cache_dir else cache_dir_for(source)
+    signature = _source_signature(source)
+    header = _read_header(source)
+    columns = header if columns is None else [name for name in header if name in set(columns)]
+
+    # Без колонок нечего разбирать: кэш-каталог только для производных данных
+    df = _read_columns(source, header, columns) if columns else pd.DataFrame()
+    with stage('write_cache', rows=len(df)):
+        return _write_cache(df, signature, cache_dir, header, len(df) if columns else None)
+
+
+def _save_column(directory, filename, name, series):
+    """Запись одной колонки в .npy; возвращает ее описание для meta.json"""
+    if isinstance(series.dtype, pd.CategoricalDtype) or _is_text(series):
+        if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.is_monotonic_increasing:
+            codes, categories = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, categories = pd.factorize(series, sort=True)
+        codes = codes.astype(_codes_dtype(len(categories)))
+        np.save(directory / filename, codes)
+        return {'name': name, 'file': filename, 'kind': 'category',
+                'categories': [str(c) for c in categories]}
+    values = series.to_numpy()
+    np.save(directory / filename, values)
+    return {'name': name, 'file': filename, 'kind': 'numeric', 'dtype': values.dtype.str}
+
+
+def _column_file(header, name):
+    return f'{header.index(name):03d}.npy'
+
+
+def _write_cache(df, signature, cache_dir, header, rows):
+    # Пишем во временный каталог и переименовываем, чтобы читатели
+    # никогда не увидели наполовину записанный кэш
+    tmp_dir = cache_dir.with_name(cache_dir.name + f'.tmp{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    columns = [_save_column(tmp_dir, _column_file(header, name), name, df[name]) for name in df.columns]
+    meta = {
+        'version': CACHE_VERSION,
+        'source': signature,
+        'rows': rows,
+        'header': header,
+        'columns': columns,
+    }
+    _write_meta(tmp_dir, meta)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return meta
+
+
+def _write_meta(cache_dir, meta):
+    tmp_path = cache_dir / f'meta.json.tmp{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_dir / 'meta.json')
+
+
+def _extend_cache(source, cache_dir, meta, names):
+    """Дочитывание колонок names из CSV в существующий кэш.
+
+    Файлы колонок пишутся под временными именами и переименовываются,
+    meta.json заменяется последним: читатели видят либо старый набор
+    колонок, либо новый.
+    """
+    df = _read_columns(source, meta['header'], names)
+    with stage('write_cache', rows=len(df)):
+        columns = list(meta['columns'])
+        for name in df.columns:
+            filename = _column_file(meta['header'], name)
+            tmp_name = f'{filename}.tmp{os.getpid()}.npy'
+            column = _save_column(cache_dir, tmp_name, name, df[name])
+            os.replace(cache_dir / tmp_name, cache_dir / filename)
+            columns.append({**column, 'file': filename})
+        order = {name: i for i, name in enumerate(meta['header'])}
+        meta = {**meta, 'rows': len(df), 'columns': sorted(columns, key=lambda c: order[c['name']])}
+        _write_meta(cache_dir, meta)
+    return meta
+
+
+def _ensure_cache(source, cache_dir=None, rebuild=False, columns=None):
+    """Каталог кэша и meta; columns - колонки, которые должны быть в кэше
+    (None - все колонки файла)"""
+    source = Path(source)
+    if not source.exists():
+        raise FileNotFoundError(f"Файл {source} не найден")
+
+    # Готовый колоночный каталог (ColumnarWriter) - читаем как есть
+    if source.is_dir():
+        meta = _read_meta(source)
+        if meta is None:
+            raise FileNotFoundError(f"В каталоге {source} нет meta.json")
+        return source, meta
+
+    cache_dir = Path(cache_dir) if cache_dir else cache_dir_for(source)
+    if rebuild or not is_cache_valid(source, cache_dir):
+        return cache_dir, build_cache(source, cache_dir, columns)
+    meta = _read_meta(cache_dir)
+    cached = {col['name'] for col in meta['columns']}
+    wanted = meta['header'] if columns is None else columns
+    missing = [name for name in wanted if name in meta['header'] and name not in cached]
+    if missing:
+        meta = _extend_cache(source, cache_dir, meta, missing)
+    return cache_dir, meta
+
+
+def derived_path(source, name, cache_dir=None):
+    """Путь для производных данных (графы, индексы, модели) внутри кэша.
+
+    Файл лежит в каталоге колоночного кэша и удаляется вместе с ним,
+    когда исходный CSV меняется - отдельная проверка актуальности не нужна.
+    """
+    cache_dir, _ = _ensure_cache(source, cache_dir, columns=())
+    return cache_dir / name
+
+
+def load_columns(source, columns=None, cache_dir=None, rebuild=False, missing='raise'):
+    """Колонки из кэша в сыром виде.
+
+    Возвращает dict: имя -> np.ndarray (числовые колонки)
+    или (codes, categories) для словарных колонок. Массивы отображены
+    в память и доступны только для чтения. Из CSV разбираются только
+    колонки, которых еще нет в кэше.
+
+    missing='ignore' - колонки, которых нет в файле, пропускаются
+    (для необязательных колонок), иначе KeyError.
+    """
+    if missing not in ('raise', 'ignore'):
+        raise ValueError(f"missing должен быть 'raise' или 'ignore', получено {missing!r}")
+    cache_dir, meta = _ensure_cache(source, cache_dir, rebuild, columns)
+    wanted = set(columns) if columns is not None else None
+
+    result = {}
+    for col in meta['columns']:
+        if wanted is not None and col['name'] not in wanted:
+            continue
+        # np.asarray: обычный ndarray-view поверх mmap, без копирования
+        values = np.asarray(np.load(cache_dir / col['file'], mmap_mode='r'))[:meta['rows']]
+        if col['kind'] == 'category':
+            result[col['name']] = (values, col['categories'])
+        else:
+            result[col['name']] = values
+
+    if wanted is not None and missing == 'raise':
+        absent = wanted - result.keys()
+        if absent:
+            raise KeyError(f"В файле {source} нет колонок: {', '.join(sorted(absent))}")
+    return result
+
+
+def load_shipments(source, columns=None, cache_dir=None, rebuild=False, missing='raise'):
+    """Загрузка перевозок в DataFrame через колоночный кэш.
+
+    columns - нужные колонки (None - все): разбираются и читаются только они.
+    Строковые колонки возвращаются как упорядоченные pd.Categorical
+    (порядок категорий лексикографический, так что min/max и сортировка
+    ведут себя как у строк).
+    """
+    with stage('read_cache'):
+        raw = load_columns(source, columns, cache_dir, rebuild, missing)
+    with stage('to_frame') as record:
+        data = {}
+        for name, values in raw.items():
+            if isinstance(values, tuple):
+                codes, categories = values
+                data[name] = pd.Categorical.from_codes(
+                    np.asarray(codes), categories=categories, ordered=True
+                )
+            else:
+                data[name] = values
+        df = pd.DataFrame(data, copy=False)
+        record['rows'] = len(df)
+        return df
+
+
+def store_upload(content, uploads_dir=UPLOADS_DIR):
+    """Сохранение загруженного CSV по хэшу содержимого.
+
+    Один и тот же файл попадает по одному и тому же пути, поэтому
+    колоночный кэш для него строится только при первой загрузке.
+    """
+    digest = hashlib.sha1(content).hexdigest()
+    path = Path(uploads_dir) / f'{digest}.csv'
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.tmp{os.getpid()}')
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    return path
+
+
+class ColumnarWriter:
+    """Запись набора данных в колоночном формате порциями.
+
+    Число строк задается заранее: каждая колонка - .npy файл, открытый
+    через np.lib.format.open_memmap, порции пишутся в него срезами.
+    Колонки с dtype category сохраняются кодами; их категории должны
+    совпадать во всех порциях и быть отсортированы.
+    """
+
+    def __init__(self, directory, rows):
+        self.directory = Path(directory)
+        self.rows = rows
+        self.position = 0
+        self.columns = None
+        self._arrays = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _open(self, df):
+        self.columns = []
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            filename = f'{i:03d}.npy'
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                categories = [str(c) for c in series.cat.categories]
+                dtype = _codes_dtype(len(categories))
+                self.columns.append({
+                    'name': name, 'file': filename, 'kind': 'category', 'categories': categories,
+                })
+            else:
+                dtype = series.to_numpy().dtype
+                self.columns.append({
+                    'name': name, 'file': filename, 'kind': 'numeric', 'dtype': dtype.str,
+                })
+            self._arrays[name] = np.lib.format.open_memmap(
+                self.directory / filename, mode='w+', dtype=dtype, shape=(self.rows,)
+            )
+
+    def write(self, df):
+        """Дописать порцию строк"""
+        if self.columns is None:
+            self._open(df)
+        end = self.position + len(df)
+        if end > self.rows:
+            raise ValueError(f"Превышено заявленное число строк ({self.rows})")
+        for col in self.columns:
+            series = df[col['name']]
+            if col['kind'] == 'category':
+                values = series.cat.codes.to_numpy()
+            else:
+                values = series.to_numpy()
+            self._arrays[col['name']][self.position:end] = values
+        self.position = end
+
+    def close(self):
+        """Сбросить данные на диск и записать meta.json"""
+        for array in self._arrays.values():
+            array.flush()
+        self._arrays.clear()
+        meta = {
+            'version': CACHE_VERSION,
+            'source': None,
+            'rows': self.position,
+            'header': [col['name'] for col in self.columns or []],
+            'columns': self.columns or [],
+        }
+        with open(self.directory / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,50 @@
+"""
+Даты перевозок как целые номера дней
+
+Номер дня - число дней от 1970-01-01 (как datetime64[D] в NumPy). Эту же
+нумерацию используют индекс дат, куб предагрегатов и остальные модули
+на NumPy, поэтому номера дней из разных модулей сравнимы.
+
+Даты в файлах - строки ISO 'YYYY-MM-DD'. iso_day() переводит строку
+в номер дня через date.fromisoformat и кэширует результат: различных
+дат в данных - сотни, строк - миллионы, поэтому каждая строка даты
+разбирается один раз.
+
+Модуль использует только стандартную библиотеку (нужен LogisticsAnalyzer).
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+
+# date.toordinal() для 1970-01-01 - начало отсчета номеров дней
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=1 << 16)
+def iso_day(text):
+    """'YYYY-MM-DD' (допускается время после даты) -> номер дня"""
+    return date.fromisoformat(text[:10]).toordinal() - EPOCH_ORDINAL
+
+
+def as_day(value):
+    """Дата, datetime, строка ISO или номер дня -> номер дня (None - без границы)"""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, datetime):
+        return value.date().toordinal() - EPOCH_ORDINAL
+    if isinstance(value, date):
+        return value.toordinal() - EPOCH_ORDINAL
+    return iso_day(str(value))
+
+
+def day_date(day):
+    """Номер дня -> date"""
+    return date.fromordinal(int(day) + EPOCH_ORDINAL)
+
+
+def last_days(n, until):
+    """Окно из n последних дней по until включительно: (start, end) номерами дней"""
+    if n < 1:
+        raise ValueError("Число дней должно быть положительным")
+    end = as_day(until)
+    return end - n + 1, end
@@ -0,0 +1,19 @@
+"""
+Разбор входных путей CLI
+
+Модуль использует только стандартную библиотеку: его импортирует
+scripts/cli.py до выбора движка, не загружая pandas.
+"""
+
+import glob
+from pathlib import Path
+
+
+def resolve_inputs(spec):
+    """Список CSV файлов по пути к файлу, каталогу или glob-шаблону"""
+    path = Path(spec)
+    if path.is_dir():
+        return sorted(path.glob('*.csv'))
+    if glob.has_magic(str(spec)):
+        return sorted(Path(p) for p in glob.glob(str(spec), recursive=True))
+    return [path]
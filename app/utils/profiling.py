@@ -0,0 +1,261 @@
+"""
+Замеры этапов анализа: время, CPU, строки в секунду, память
+
+У каждого анализатора есть Profiler (атрибут profiler), который всегда
+включен: этап - два вызова perf_counter/process_time и чтение RSS на
+границах, поэтому замеры можно оставлять в ночных прогонах. Методы
+анализа оборачиваются декоратором profiled, загрузка и разбор файла -
+вложенными этапами stage().
+
+Библиотечный код (app.utils.data_loader и т.п.) пишет этапы через
+функцию stage(): они попадают в профайлер, этап которого сейчас
+выполняется, а без активного профайлера ничего не стоят.
+
+Память: rss_mb - RSS в конце этапа, peak_rss_mb - пик процесса, если
+этап его поднял (ru_maxrss), иначе максимум RSS на границах этапа.
+Где память процесса узнать нельзя (нет /proc и модуля resource, например
+в Windows), оба поля - None.
+
+Результат - JSON (save(path)) или Chrome trace (save(path, 'trace'),
+открывается в chrome://tracing и Perfetto). compare_profiles() находит
+этапы, ставшие медленнее baseline, - для алертов по ночным отчетам.
+
+Модуль использует только стандартную библиотеку.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_FORMATS = ('json', 'trace')
+
+# Сколько последних этапов хранит профайлер долго живущего процесса
+MAX_STAGES = 10_000
+
+# Порог регрессии по пропускной способности и минимальная заметная разница
+THROUGHPUT_TOLERANCE = 0.20
+TIME_NOISE_S = 0.05
+
+# Профайлер, этап которого выполняется в текущем потоке/задаче
+_active = contextvars.ContextVar('active_profiler', default=None)
+
+
+def current_rss_mb():
+    """Текущий RSS процесса (Linux: /proc, иначе - пиковый через getrusage; None - неизвестен)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса с момента запуска (None - без модуля resource)"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    return maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+class Profiler:
+    """Журнал этапов одного анализатора.
+
+    rows - число строк данных: подставляется в этапы, для которых число
+    обработанных строк не задано явно (методы анализа после загрузки).
+    """
+
+    def __init__(self, name='', max_stages=MAX_STAGES):
+        self.name = name
+        self.rows = None
+        self.stages = deque(maxlen=max_stages)
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Этап name; в блоке можно уточнить record['rows'] и добавить поля"""
+        stack = self._stack()
+        record = {'stage': '/'.join([*(s['name'] for s in stack), name]), 'name': name,
+                  'depth': len(stack), 'rows': rows}
+        stack.append(record)
+        token = _active.set(self)
+        rss_before, peak_before = current_rss_mb(), peak_rss_mb()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu
+            rss, peak = current_rss_mb(), peak_rss_mb()
+            _active.reset(token)
+            stack.pop()
+            if record['rows'] is None:
+                record['rows'] = self.rows
+            # Пик процесса - только если его поднял этот этап
+            grown = peak if peak is not None and peak_before is not None and peak > peak_before else None
+            peaks = [value for value in (grown, rss_before, rss) if value is not None]
+            record.update(self._measures(wall, record['rows']),
+                          start_s=round(start - self._origin, 6), cpu_s=round(cpu, 6),
+                          rss_mb=round(rss, 1) if rss is not None else None,
+                          peak_rss_mb=round(max(peaks), 1) if peaks else None,
+                          thread=threading.get_ident())
+            self.stages.append(record)
+
+    def add(self, name, wall_s, rows=None):
+        """Этап, замеренный по частям (например, суммарное время разбора порций).
+
+        Записывается вложенным в текущий этап, без времени начала.
+        """
+        stack = self._stack()
+        record = {'stage': '/'.join([*(s['name'] for s in stack), name]), 'name': name,
+                  'depth': len(stack), 'rows': rows if rows is not None else self.rows,
+                  'start_s': None, 'thread': threading.get_ident()}
+        record.update(self._measures(wall_s, record['rows']))
+        self.stages.append(record)
+        return record
+
+    @staticmethod
+    def _measures(wall, rows):
+        return {'wall_s': round(wall, 6),
+                'rows_per_s': round(rows / wall) if rows and wall > 0 else None}
+
+    def to_dict(self):
+        """Отчет в JSON: meta и этапы в порядке завершения"""
+        return {
+            'meta': {
+                'analyzer': self.name,
+                'started_at': self.started_at,
+                'rows': self.rows,
+                'python': platform.python_version(),
+                'pid': os.getpid(),
+            },
+            'stages': [{'analyzer': self.name, **record} for record in self.stages],
+        }
+
+    def to_trace(self):
+        """Отчет в формате Chrome trace (события 'X' с длительностью)"""
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                   'args': {'name': self.name or 'analyzer'}}]
+        timed = [r for r in self.stages if r['start_s'] is not None]
+        # Этапы, замеренные по частям, - аргументы родительского события
+        parts = {}
+        for r in self.stages:
+            if r['start_s'] is None:
+                parts.setdefault(r['stage'].rpartition('/')[0], {})[f"{r['name']}_s"] = r['wall_s']
+        for r in timed:
+            args = {key: r[key] for key in ('rows', 'rows_per_s', 'cpu_s', 'rss_mb', 'peak_rss_mb')}
+            args.update(parts.get(r['stage'], {}))
+            events.append({
+                'name': r['name'], 'cat': 'stage', 'ph': 'X', 'pid': pid, 'tid': r['thread'],
+                'ts': round(r['start_s'] * 1e6, 1), 'dur': round(r['wall_s'] * 1e6, 1),
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.to_dict()['meta']}
+
+    def save(self, path, fmt='json'):
+        """Запись отчета: fmt - json или trace"""
+        if fmt not in PROFILE_FORMATS:
+            raise ValueError(f"Неизвестный формат профиля {fmt}, доступны: {', '.join(PROFILE_FORMATS)}")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.to_trace() if fmt == 'trace' else self.to_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        return path
+
+    def summary_lines(self):
+        """Строки сводки по этапам (с отступом по вложенности)"""
+        parts = {}
+        for r in self.stages:
+            if r['start_s'] is None:
+                parts.setdefault(r['stage'].rpartition('/')[0], []).append(r)
+        yield f"{'Этап':<40} {'Время, с':>9} {'CPU, с':>8} {'Строк/с':>12} {'Пик RSS, МБ':>12}"
+        for stage in sorted((r for r in self.stages if r['start_s'] is not None),
+                            key=lambda r: r['start_s']):
+            for r in [stage, *parts.get(stage['stage'], ())]:
+                name = '  ' * r['depth'] + r['name']
+                cpu = f"{r['cpu_s']:.3f}" if 'cpu_s' in r else '-'
+                rate = f"{r['rows_per_s']:,}" if r['rows_per_s'] else '-'
+                peak = f"{r['peak_rss_mb']:.1f}" if r.get('peak_rss_mb') is not None else '-'
+                yield f"{name:<40} {r['wall_s']:>9.3f} {cpu:>8} {rate:>12} {peak:>12}"
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """Этап в активном профайлере; без него - пустой блок"""
+    profiler = _active.get()
+    if profiler is None:
+        yield {}
+        return
+    with profiler.stage(name, rows) as record:
+        yield record
+
+
+def profiled(method=None, *, name=None):
+    """Декоратор метода анализатора: вызов - этап в self.profiler"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name or func.__name__):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorate(method) if method is not None else decorate
+
+
+def save_profile(profiler, path, fmt='json'):
+    """Сохранение профиля с сообщением в консоль (для флага --profile)"""
+    path = profiler.save(path, fmt)
+    print(f"⏱️  Профиль ({fmt}) сохранен в {path}")
+    return path
+
+
+def compare_profiles(current, baseline, tolerance=THROUGHPUT_TOLERANCE, noise_s=TIME_NOISE_S):
+    """Этапы JSON-профиля current, ставшие медленнее baseline.
+
+    Этапы с числом строк сравниваются по строкам в секунду (объем данных
+    в ночных прогонах растет), остальные - по времени.
+    """
+    def key(r):
+        return r.get('analyzer'), r['stage']
+
+    base = {key(r): r for r in baseline.get('stages', [])}
+    regressions = []
+    for r in current.get('stages', []):
+        old = base.get(key(r))
+        if old is None or r['wall_s'] - old['wall_s'] <= noise_s:
+            continue
+        if r['rows_per_s'] and old['rows_per_s']:
+            metric, new_value, old_value = 'rows_per_s', r['rows_per_s'], old['rows_per_s']
+            slower = new_value < old_value * (1 - tolerance)
+        else:
+            metric, new_value, old_value = 'wall_s', r['wall_s'], old['wall_s']
+            slower = new_value > old_value * (1 + tolerance)
+        if slower:
+            regressions.append({'analyzer': r.get('analyzer'), 'stage': r['stage'], 'metric': metric,
+                                'baseline': old_value, 'current': new_value})
+    return regressions
@@ -0,0 +1,66 @@
+"""
+Схема колонок файла перевозок
+
+SHIPMENT_SCHEMA задает тип каждой колонки выгрузки: строковые - category
+(словарь значений + коды), целые - наименьший достаточный тип, дробные -
+float64 для денег и float32 для справочных характеристик. pd.read_csv
+получает типы сразу (read_dtypes), поэтому строки не проходят через
+object, а целые ужимаются после разбора (apply_schema): колонка с
+пропусками или значениями вне диапазона остается как есть.
+
+Анализы объявляют нужные им колонки (COLUMNS у классов), загрузка читает
+только объединение объявленных (union_columns).
+"""
+
+import numpy as np
+
+SHIPMENT_SCHEMA = {
+    'shipment_id': 'int64',
+    'from_city': 'category',
+    'to_city': 'category',
+    'distance_km': 'int32',
+    'weight_kg': 'int32',
+    'volume_m3': 'float32',
+    'cargo_type': 'category',
+    'carrier': 'category',
+    'cost_rub': 'float64',
+    'base_cost_per_km': 'float32',
+    'date': 'category',
+    'status': 'category',
+    'delivery_days': 'float32',           # пусто у недоставленных
+    'carrier_reliability': 'float32',
+    'cargo_fragility': 'float32',
+    'customer_id': 'int32',
+    'customer_segment': 'category',
+    'insurance': 'bool',
+    'insurance_cost': 'float64',
+    'fuel_surcharge': 'float64',
+    'priority': 'category',
+    'payment_method': 'category',
+    'has_return': 'bool',
+    'return_cost': 'float64',
+}
+
+
+def read_dtypes(columns):
+    """Типы для pd.read_csv: категории и дробные (целые и bool ужимаются после)"""
+    return {name: SHIPMENT_SCHEMA[name] for name in columns
+            if SHIPMENT_SCHEMA.get(name, '').startswith(('category', 'float'))}
+
+
+def apply_schema(df):
+    """Целые колонки схемы - в объявленный тип, если значения в него помещаются"""
+    for name in df.columns:
+        dtype = SHIPMENT_SCHEMA.get(name, '')
+        if not dtype.startswith('int') or df[name].dtype.kind not in 'iu':
+            continue
+        values = df[name].to_numpy()
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            df[name] = values.astype(dtype)
+    return df
+
+
+def union_columns(*groups):
+    """Объединение наборов колонок в порядке первого появления"""
+    return tuple(dict.fromkeys(name for group in groups for name in group))
@@ -0,0 +1,165 @@
+"""
+Объединяемые скетчи для статистик с ограниченной памятью
+
+QuantileSketch - квантили с гарантированной относительной ошибкой
+(логарифмические корзины в духе DDSketch): оценка квантиля отличается
+от точного значения не более чем на relative_accuracy. Корзин не больше
+max_bins: при переполнении младшие сворачиваются в одну, и гарантия
+остается только для квантилей выше свернутого диапазона (accurate_above).
+Два скетча объединяются сложением счетчиков корзин.
+
+HyperLogLog - число уникальных значений с относительной ошибкой
+около 1.04 / sqrt(2**precision). Объединение - поэлементный максимум
+регистров.
+
+Оба скетча обновляются целыми массивами NumPy и занимают фиксированную
+память независимо от числа значений.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class QuantileSketch:
+    """Скетч квантилей для неотрицательных значений.
+
+    Относительная ошибка оценки не больше relative_accuracy для квантилей,
+    точное значение которых больше accurate_above (0, пока корзины не
+    сворачивались). Значения ниже свернуты в одну корзину: их квантили
+    оцениваются сверху значением accurate_above.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy должна быть в интервале (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0       # значения <= 0
+        self.min_key = 0          # ключ корзины bins[0]
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.collapsed_key = None  # верхний ключ свернутых корзин
+
+    @property
+    def accurate_above(self):
+        """Граница, выше которой квантили оцениваются с гарантированной точностью"""
+        return 0.0 if self.collapsed_key is None else self.gamma ** self.collapsed_key
+
+    def _collapse(self, key):
+        if self.collapsed_key is None or key > self.collapsed_key:
+            self.collapsed_key = key
+
+    def update(self, values):
+        """Добавить массив значений (NaN пропускаются)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        if len(positive):
+            keys = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            lo = int(keys.min())
+            counts = np.bincount(keys - lo)
+            self._add_bins(lo, counts)
+        return self
+
+    def _add_bins(self, lo, counts):
+        if not len(self.bins):
+            self.min_key, self.bins = lo, counts.astype(np.int64)
+        else:
+            new_lo = min(self.min_key, lo)
+            new_hi = max(self.min_key + len(self.bins), lo + len(counts))
+            bins = np.zeros(new_hi - new_lo, dtype=np.int64)
+            bins[self.min_key - new_lo:self.min_key - new_lo + len(self.bins)] += self.bins
+            bins[lo - new_lo:lo - new_lo + len(counts)] += counts
+            self.min_key, self.bins = new_lo, bins
+        if len(self.bins) > self.max_bins:
+            # Сворачиваем младшие корзины: точность сохраняется для верхних квантилей
+            extra = len(self.bins) - self.max_bins
+            self.bins[extra] += self.bins[:extra].sum()
+            self.bins = self.bins[extra:]
+            self.min_key += extra
+            self._collapse(self.min_key)
+
+    def merge(self, other):
+        """Объединение со скетчем с той же точностью (на месте)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Нельзя объединить скетчи с разной точностью")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        if other.collapsed_key is not None:
+            self._collapse(other.collapsed_key)
+        if len(other.bins):
+            self._add_bins(other.min_key, other.bins)
+        return self
+
+    def quantile(self, q):
+        """Оценка квантиля q (0..1); NaN для пустого скетча"""
+        if not self.count:
+            return float('nan')
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative = np.cumsum(self.bins)
+        i = int(np.searchsorted(cumulative, rank - self.zero_count, side='right'))
+        key = self.min_key + min(i, len(self.bins) - 1)
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class HyperLogLog:
+    """Оценка числа уникальных значений"""
+
+    def __init__(self, error=0.01):
+        # 1.04 / sqrt(m) <= error  ->  m = 2**precision
+        self.precision = min(18, max(4, math.ceil(math.log2((1.04 / error) ** 2))))
+        self.m = 1 << self.precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    @property
+    def error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def update(self, values):
+        """Добавить массив значений (любого типа, хэшируются pandas)"""
+        values = pd.Series(values).dropna()
+        if not len(values):
+            return self
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+
+        # bit_length остатка: через две 32-битные половины, чтобы float был точным
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        bit_length = np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+        rank = (64 - p) - bit_length + 1
+
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Нельзя объединить HyperLogLog с разной точностью")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """Оценка числа уникальных значений"""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Малые мощности: линейный подсчет
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
@@ -2,95 +2,79 @@
 """
 Генератор реалистичных данных по логистике
 Создает датасет с 1000+ записей для анализа
+
+Данные генерируются векторно (NumPy) порциями по batch_size строк
+и сразу пишутся в CSV или колоночный каталог, поэтому 10-100 млн
+записей не требуют держать весь датасет в памяти. При одинаковом
+seed результат воспроизводится.
 """
 
+import argparse
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
-from faker import Faker
 import os
+from pathlib import Path
+
+# Корень проекта для импорта общих модулей app/*
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Справочники перевозчиков и грузов общие с тарифным расчетом
+from app.services.pricing import (
+    CARGO_TYPES, CARRIERS, LONG_HAUL_FACTOR, LONG_HAUL_KM, SHORT_HAUL_FACTOR, SHORT_HAUL_KM,
+    WEIGHT_STEP_KG, PricingEngine
+)
+# Расстояния - по общей матрице городов (как в тарифах и проверке данных)
+from app.services.distances import default_matrix
+
+DEFAULT_OUTPUT = 'data/shipments_extended.csv'
+DEFAULT_STATS = 'data/dataset_statistics.txt'
+DEFAULT_SAMPLE = 'data/shipments_sample.csv'
 
-# Инициализация Faker для русских данных
-fake = Faker('ru_RU')
+CITIES_WEIGHTS = {
+    'Москва': 0.25,           # 25% всех перевозок
+    'Санкт-Петербург': 0.15,  # 15%
+    'Екатеринбург': 0.10,
+    'Новосибирск': 0.10,
+    'Казань': 0.08,
+    'Красноярск': 0.07,
+    'Нижний Новгород': 0.06,
+    'Челябинск': 0.05,
+    'Омск': 0.05,
+    'Самара': 0.04,
+    'Ростов-на-Дону': 0.03,
+    'Уфа': 0.02
+}
+
+STATUS_OPTIONS = ['Доставлен', 'В пути', 'Ожидает отправки', 'Задержан', 'Отменен']
+STATUS_WEIGHTS = [0.85, 0.08, 0.04, 0.02, 0.01]
+SEGMENTS = ['A', 'B', 'C']
+PRIORITIES = ['Стандарт', 'Экспресс', 'Супер-экспресс']
+PAYMENT_METHODS = ['Предоплата', 'Постоплата', '50/50']
+
+START_DATE = datetime(2023, 1, 1)
+END_DATE = datetime(2024, 1, 31)
 
 def generate_cities_weights():
     """Генерация городов с весами (вероятностью отправки)"""
-    cities = {
-        'Москва': 0.25,           # 25% всех перевозок
-        'Санкт-Петербург': 0.15,  # 15%
-        'Екатеринбург': 0.10,
-        'Новосибирск': 0.10,
-        'Казань': 0.08,
-        'Красноярск': 0.07,
-        'Нижний Новгород': 0.06,
-        'Челябинск': 0.05,
-        'Омск': 0.05,
-        'Самара': 0.04,
-        'Ростов-на-Дону': 0.03,
-        'Уфа': 0.02
-    }
-    return cities
+    return CITIES_WEIGHTS
 
 def generate_carriers():
     """Генерация перевозчиков с характеристиками"""
-    carriers = [
-        {'name': 'Деловые Линии', 'price_factor': 1.0, 'reliability': 0.95},
-        {'name': 'ПЭК', 'price_factor': 0.9, 'reliability': 0.92},
-        {'name': 'ЖДД', 'price_factor': 0.8, 'reliability': 0.98},
-        {'name': 'Грузовоз', 'price_factor': 0.85, 'reliability': 0.90},
-        {'name': 'Энергия', 'price_factor': 1.1, 'reliability': 0.96},
-        {'name': 'Мэйджор', 'price_factor': 1.2, 'reliability': 0.99},
-        {'name': 'Байкал Сервис', 'price_factor': 0.95, 'reliability': 0.93},
-        {'name': 'Ратэк', 'price_factor': 0.88, 'reliability': 0.91}
-    ]
-    return carriers
+    return CARRIERS
 
 def generate_cargo_types():
     """Типы грузов с характеристиками"""
-    cargo_types = [
-        {'type': 'Электроника', 'fragility': 0.8, 'density': 0.3, 'price_factor': 1.5},
-        {'type': 'Одежда', 'fragility': 0.2, 'density': 0.4, 'price_factor': 1.0},
-        {'type': 'Продукты', 'fragility': 0.6, 'density': 0.7, 'price_factor': 1.2},
-        {'type': 'Стройматериалы', 'fragility': 0.1, 'density': 2.5, 'price_factor': 0.8},
-        {'type': 'Автозапчасти', 'fragility': 0.4, 'density': 1.2, 'price_factor': 1.1},
-        {'type': 'Мебель', 'fragility': 0.5, 'density': 0.9, 'price_factor': 1.3},
-        {'type': 'Химия', 'fragility': 0.7, 'density': 1.1, 'price_factor': 1.4},
-        {'type': 'Медицина', 'fragility': 0.9, 'density': 0.5, 'price_factor': 1.6},
-        {'type': 'Канцелярия', 'fragility': 0.3, 'density': 0.6, 'price_factor': 1.0},
-        {'type': 'Игрушки', 'fragility': 0.4, 'density': 0.4, 'price_factor': 1.1}
-    ]
-    return cargo_types
+    return CARGO_TYPES
 
 def get_distance(from_city, to_city):
-    """Примерные расстояния между городами (в км)"""
-    distances = {
-        ('Москва', 'Санкт-Петербург'): 710,
-        ('Москва', 'Екатеринбург'): 1800,
-        ('Москва', 'Новосибирск'): 2800,
-        ('Москва', 'Казань'): 800,
-        ('Москва', 'Нижний Новгород'): 400,
-        ('Санкт-Петербург', 'Москва'): 710,
-        ('Санкт-Петербург', 'Екатеринбург'): 2200,
-        ('Екатеринбург', 'Новосибирск'): 1500,
-        ('Екатеринбург', 'Москва'): 1800,
-        ('Новосибирск', 'Красноярск'): 800,
-        ('Казань', 'Москва'): 800,
-        ('Казань', 'Санкт-Петербург'): 1500,
-        # Добавьте другие расстояния по необходимости
-    }
-    
-    # Если расстояние известно - возвращаем его
-    if (from_city, to_city) in distances:
-        return distances[(from_city, to_city)]
-    else:
-        # Иначе генерируем случайное расстояние
-        base_distance = random.randint(300, 3000)
-        # Добавляем случайное отклонение
-        return base_distance + random.randint(-100, 100)
+    """Расстояние между городами (в км) по матрице app.services.distances"""
+    return int(default_matrix().distance([from_city], [to_city])[0])
 
 def generate_shipment(shipment_id, cities_weights):
-    """Генерация одной записи о перевозке"""
+    """Генерация одной записи о перевозке (построчный эталон для generate_batch)"""
     
     # Выбор городов с учетом весов
     cities = list(cities_weights.keys())
@@ -106,12 +90,10 @@ def generate_shipment(shipment_id, cities_weights):
     distance = get_distance(from_city, to_city)
     
     # Выбор перевозчика
-    carriers = generate_carriers()
-    carrier = random.choice(carriers)
+    carrier = random.choice(CARRIERS)
     
     # Выбор типа груза
-    cargo_types = generate_cargo_types()
-    cargo = random.choice(cargo_types)
+    cargo = random.choice(CARGO_TYPES)
     
     # Вес груза (кг)
     weight = random.randint(50, 5000)
@@ -124,10 +106,10 @@ def generate_shipment(shipment_id, cities_weights):
     
     # Модификаторы стоимости
     distance_modifier = 1.0
-    if distance > 2000:
-        distance_modifier = 0.9  # скидка на длинные расстояния
-    elif distance < 500:
-        distance_modifier = 1.2  # надбавка на короткие
+    if distance > LONG_HAUL_KM:
+        distance_modifier = LONG_HAUL_FACTOR  # скидка на длинные расстояния
+    elif distance < SHORT_HAUL_KM:
+        distance_modifier = SHORT_HAUL_FACTOR  # надбавка на короткие
     
     # Финальная стоимость
     cost = (
@@ -136,7 +118,7 @@ def generate_shipment(shipment_id, cities_weights):
         carrier['price_factor'] * 
         cargo['price_factor'] * 
         distance_modifier * 
-        (1 + weight / 10000)  # чем больше вес, тем дороже
+        (1 + weight / WEIGHT_STEP_KG)  # чем больше вес, тем дороже
     )
     
     # Добавляем случайное отклонение
@@ -144,16 +126,12 @@ def generate_shipment(shipment_id, cities_weights):
     cost = round(cost, 2)
     
     # Дата перевозки (за последний год)
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2024, 1, 31)
-    random_date = start_date + timedelta(
-        days=random.randint(0, (end_date - start_date).days)
+    random_date = START_DATE + timedelta(
+        days=random.randint(0, (END_DATE - START_DATE).days)
     )
     
     # Статус доставки
-    status_options = ['Доставлен', 'В пути', 'Ожидает отправки', 'Задержан', 'Отменен']
-    status_weights = [0.85, 0.08, 0.04, 0.02, 0.01]
-    status = random.choices(status_options, weights=status_weights)[0]
+    status = random.choices(STATUS_OPTIONS, weights=STATUS_WEIGHTS)[0]
     
     # Время доставки (дни)
     if status == 'Доставлен':
@@ -180,88 +158,291 @@ def generate_shipment(shipment_id, cities_weights):
         'delivery_days': delivery_days,
         'carrier_reliability': carrier['reliability'],
         'cargo_fragility': cargo['fragility'],
-        'customer_id': fake.random_int(min=1000, max=9999),
-        'customer_segment': random.choice(['A', 'B', 'C']),
+        'customer_id': random.randint(1000, 9999),
+        'customer_segment': random.choice(SEGMENTS),
         'insurance': random.choice([True, False]),
         'insurance_cost': round(cost * 0.02, 2) if random.random() > 0.7 else 0,
         'fuel_surcharge': round(cost * random.uniform(0.05, 0.15), 2),
-        'priority': random.choice(['Стандарт', 'Экспресс', 'Супер-экспресс']),
-        'payment_method': random.choice(['Предоплата', 'Постоплата', '50/50']),
+        'priority': random.choice(PRIORITIES),
+        'payment_method': random.choice(PAYMENT_METHODS),
         'has_return': random.random() > 0.9,  # 10% имеют обратный рейс
         'return_cost': round(cost * 0.8, 2) if random.random() > 0.9 else 0
     }
 
+
+class _Tables:
+    """Справочники генератора в виде массивов NumPy (строятся один раз)"""
+
+    def __init__(self):
+        self.cities = list(CITIES_WEIGHTS)
+        self.city_p = np.array(list(CITIES_WEIGHTS.values()))
+        self.city_p /= self.city_p.sum()
+
+        self.distances = default_matrix()
+        self.city_ids = self.distances.city_ids(self.cities)
+
+        self.pricing = PricingEngine(CARRIERS, CARGO_TYPES)
+        self.carrier_names = [c['name'] for c in CARRIERS]
+        self.carrier_reliability = np.array([c['reliability'] for c in CARRIERS])
+
+        self.cargo_names = [c['type'] for c in CARGO_TYPES]
+        self.cargo_density = np.array([c['density'] for c in CARGO_TYPES])
+        self.cargo_fragility = np.array([c['fragility'] for c in CARGO_TYPES])
+
+        self.status_p = np.array(STATUS_WEIGHTS) / sum(STATUS_WEIGHTS)
+        self.date_strings = np.array([
+            (START_DATE + timedelta(days=d)).strftime('%Y-%m-%d')
+            for d in range((END_DATE - START_DATE).days + 1)
+        ])
+
+
+_TABLES = None
+
+def _tables():
+    global _TABLES
+    if _TABLES is None:
+        _TABLES = _Tables()
+    return _TABLES
+
+
+def _categorical(codes, names):
+    """pd.Categorical с отсортированными категориями (как в колоночном кэше)"""
+    names = np.asarray(names)
+    order = np.argsort(names)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return pd.Categorical.from_codes(rank[codes], categories=names[order], ordered=True)
+
+
+def generate_batch(rng, start_id, size):
+    """Векторная генерация size записей (те же колонки и распределения,
+    что у generate_shipment). rng - np.random.Generator."""
+    t = _tables()
+    n_cities = len(t.cities)
+
+    from_idx = rng.choice(n_cities, size=size, p=t.city_p)
+    # Город назначения - равновероятно среди остальных городов
+    to_idx = rng.integers(0, n_cities - 1, size=size)
+    to_idx += to_idx >= from_idx
+
+    distance = t.distances.lookup(t.city_ids[from_idx], t.city_ids[to_idx]).astype(np.int64)
+
+    carrier_idx = rng.integers(0, len(t.carrier_names), size=size)
+    cargo_idx = rng.integers(0, len(t.cargo_names), size=size)
+    weight = rng.integers(50, 5001, size=size)
+    volume = np.round(weight / 1000 * t.cargo_density[cargo_idx], 2)
+    base_cost_per_km = rng.uniform(15, 50, size=size)
+
+    cost = t.pricing.freight(base_cost_per_km, distance, carrier_idx, cargo_idx, weight)
+    cost = np.round(cost * rng.uniform(0.9, 1.1, size=size), 2)
+
+    day = rng.integers(0, len(t.date_strings), size=size)
+    status_idx = rng.choice(len(STATUS_OPTIONS), size=size, p=t.status_p)
+
+    delivered = status_idx == 0
+    low = np.maximum(1, distance // 800)
+    high = np.maximum(3, distance // 400)
+    delivery_days = low + np.floor(rng.random(size) * (high - low + 1))
+    delivery_days = np.where(delivered, delivery_days, np.nan)
+
+    insurance_cost = np.where(rng.random(size) > 0.7, np.round(cost * 0.02, 2), 0.0)
+    fuel_surcharge = np.round(cost * rng.uniform(0.05, 0.15, size=size), 2)
+    return_cost = np.where(rng.random(size) > 0.9, np.round(cost * 0.8, 2), 0.0)
+
+    return pd.DataFrame({
+        'shipment_id': np.arange(start_id, start_id + size),
+        'from_city': _categorical(from_idx, t.cities),
+        'to_city': _categorical(to_idx, t.cities),
+        'distance_km': distance,
+        'weight_kg': weight,
+        'volume_m3': volume,
+        'cargo_type': _categorical(cargo_idx, t.cargo_names),
+        'carrier': _categorical(carrier_idx, t.carrier_names),
+        'cost_rub': cost,
+        'base_cost_per_km': np.round(base_cost_per_km, 2),
+        'date': _categorical(day, t.date_strings),
+        'status': _categorical(status_idx, STATUS_OPTIONS),
+        'delivery_days': delivery_days,
+        'carrier_reliability': t.carrier_reliability[carrier_idx],
+        'cargo_fragility': t.cargo_fragility[cargo_idx],
+        'customer_id': rng.integers(1000, 10000, size=size),
+        'customer_segment': _categorical(rng.integers(0, 3, size=size), SEGMENTS),
+        'insurance': rng.random(size) < 0.5,
+        'insurance_cost': insurance_cost,
+        'fuel_surcharge': fuel_surcharge,
+        'priority': _categorical(rng.integers(0, 3, size=size), PRIORITIES),
+        'payment_method': _categorical(rng.integers(0, 3, size=size), PAYMENT_METHODS),
+        'has_return': rng.random(size) > 0.9,  # 10% имеют обратный рейс
+        'return_cost': return_cost,
+    })
+
+
+def _format_column(series):
+    """Строковое представление колонки, как у DataFrame.to_csv.
+
+    Каждое уникальное значение форматируется один раз (pd.factorize),
+    что в разы быстрее to_csv на колонках с повторами.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        names = np.asarray(series.cat.categories, dtype=object)
+        return names[series.cat.codes.to_numpy()].tolist()
+    values = series.to_numpy()
+    if values.dtype == bool:
+        return np.where(values, 'True', 'False').tolist()
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    if values.dtype.kind == 'f':
+        # NaN пишется пустой строкой, остальное - кратчайшим repr
+        text = ['' if u != u else repr(u) for u in uniques.tolist()]
+    else:
+        text = list(map(str, uniques.tolist()))
+    return np.array(text, dtype=object)[codes].tolist()
+
+
+def to_csv_text(df, header=True):
+    """CSV-текст порции (значения не содержат запятых и кавычек)"""
+    lines = map(','.join, zip(*(_format_column(df[name]) for name in df.columns)))
+    body = '\n'.join(lines) + '\n' if len(df) else ''
+    return (','.join(df.columns) + '\n' + body) if header else body
+
+
+def stream_shipments(num_records, batch_size=250_000, seed=42):
+    """Генератор порций DataFrame общим объемом num_records строк"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_records, batch_size):
+        size = min(batch_size, num_records - start)
+        yield generate_batch(rng, start + 1, size)
+
+
+def write_dataset(output_path, num_records, batch_size=250_000, seed=42, fmt='csv',
+                  on_batch=None):
+    """Запись датасета порциями в CSV или колоночный каталог (fmt='npy').
+
+    on_batch(df) вызывается для каждой порции (статистика, выборка и т.п.).
+    """
+    output_path = Path(output_path)
+    batches = stream_shipments(num_records, batch_size, seed)
+
+    if fmt == 'npy':
+        from app.utils.data_loader import ColumnarWriter
+        with ColumnarWriter(output_path, num_records) as writer:
+            for df in batches:
+                writer.write(df)
+                if on_batch:
+                    on_batch(df)
+        return
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        for i, df in enumerate(batches):
+            f.write(to_csv_text(df, header=(i == 0)))
+            if on_batch:
+                on_batch(df)
+
+
+class _DatasetStats:
+    """Статистика датасета, накапливаемая по порциям"""
+
+    def __init__(self):
+        self.rows = 0
+        self.total_cost = 0.0
+        self.total_weight = 0
+        self.date_min = None
+        self.date_max = None
+        self.from_cities = pd.Series(dtype='int64')
+        self.carriers = pd.Series(dtype='int64')
+        self.cargo_types = set()
+
+    def update(self, df):
+        self.rows += len(df)
+        self.total_cost += df['cost_rub'].sum()
+        self.total_weight += df['weight_kg'].sum()
+        date_min, date_max = str(df['date'].min()), str(df['date'].max())
+        self.date_min = min(self.date_min or date_min, date_min)
+        self.date_max = max(self.date_max or date_max, date_max)
+        self.from_cities = self._add_counts(self.from_cities, df['from_city'])
+        self.carriers = self._add_counts(self.carriers, df['carrier'])
+        self.cargo_types.update(str(c) for c in df['cargo_type'].unique())
+
+    @staticmethod
+    def _add_counts(counts, column):
+        batch = column.value_counts()
+        batch = batch[batch > 0]
+        batch.index = batch.index.astype(str)
+        return counts.add(batch, fill_value=0).astype('int64')
+
+
 def main():
     """Основная функция"""
-    print("🚚 Генерация реалистичных данных по логистике...")
+    parser = argparse.ArgumentParser(description='Генерация тестовых данных по логистике')
+    parser.add_argument('-n', '--rows', type=int, default=1500, help='Количество записей')
+    parser.add_argument('-o', '--output', default=None,
+                        help=f'Выходной файл (по умолчанию {DEFAULT_OUTPUT})')
+    parser.add_argument('--format', choices=['csv', 'npy'], default='csv',
+                        help='csv или колоночный каталог .npy (формат app.utils.data_loader)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора')
+    parser.add_argument('--batch-size', type=int, default=250_000, help='Размер порции')
+    parser.add_argument('--stats', default=None, help='Файл статистики датасета')
+    parser.add_argument('--sample', default=None, help='Файл выборки из 100 записей')
+    args = parser.parse_args()
     
-    # Параметры генерации
-    NUM_RECORDS = 1500  # Количество записей
+    # Для датасета по умолчанию обновляем и сопутствующие файлы
+    if args.output is None:
+        args.output = DEFAULT_OUTPUT
+        args.stats = args.stats or DEFAULT_STATS
+        args.sample = args.sample or DEFAULT_SAMPLE
     
-    # Генерация данных
-    cities_weights = generate_cities_weights()
-    data = []
+    print("🚚 Генерация реалистичных данных по логистике...")
     
-    for i in range(1, NUM_RECORDS + 1):
-        if i % 100 == 0:
-            print(f"  Генерация записи {i}/{NUM_RECORDS}...")
-        
-        shipment = generate_shipment(i, cities_weights)
-        data.append(shipment)
+    stats = _DatasetStats()
+    sample = []
     
-    # Создание DataFrame
-    df = pd.DataFrame(data)
+    def on_batch(df):
+        stats.update(df)
+        if args.sample and not sample:
+            # Записи независимы, поэтому выборка из первой порции репрезентативна
+            sample.append(df.sample(min(100, len(df)), random_state=args.seed))
+        print(f"  Сгенерировано {stats.rows:,}/{args.rows:,} записей...")
     
-    # Сохранение в CSV
-    output_path = 'data/shipments_extended.csv'
-    df.to_csv(output_path, index=False, encoding='utf-8')
+    write_dataset(args.output, args.rows, args.batch_size, args.seed, args.format, on_batch)
     
     # Статистика
-    print(f"\n✅ Данные сохранены в {output_path}")
+    print(f"\n✅ Данные сохранены в {args.output}")
     print(f"📊 Статистика:")
-    print(f"   Всего записей: {len(df)}")
-    print(f"   Период данных: {df['date'].min()} - {df['date'].max()}")
-    print(f"   Городов отправления: {df['from_city'].nunique()}")
-    print(f"   Перевозчиков: {df['carrier'].nunique()}")
-    print(f"   Типов грузов: {df['cargo_type'].nunique()}")
-    print(f"   Общая стоимость: {df['cost_rub'].sum():,.0f} руб")
-    print(f"   Средняя стоимость: {df['cost_rub'].mean():,.0f} руб")
-    print(f"   Общий вес: {df['weight_kg'].sum():,.0f} кг")
+    print(f"   Всего записей: {stats.rows}")
+    print(f"   Период данных: {stats.date_min} - {stats.date_max}")
+    print(f"   Городов отправления: {len(stats.from_cities)}")
+    print(f"   Перевозчиков: {len(stats.carriers)}")
+    print(f"   Типов грузов: {len(stats.cargo_types)}")
+    print(f"   Общая стоимость: {stats.total_cost:,.0f} руб")
+    print(f"   Средняя стоимость: {stats.total_cost / max(stats.rows, 1):,.0f} руб")
+    print(f"   Общий вес: {stats.total_weight:,.0f} кг")
     
     # Сохранение дополнительной информации
-    stats_path = 'data/dataset_statistics.txt'
-    with open(stats_path, 'w', encoding='utf-8') as f:
-        f.write("Статистика датасета shipments_extended.csv\n")
-        f.write("="*50 + "\n\n")
-        f.write(f"Всего записей: {len(df)}\n")
-        f.write(f"Период: {df['date'].min()} - {df['date'].max()}\n")
-        f.write(f"Уникальных городов: {df['from_city'].nunique()}\n")
-        f.write(f"Уникальных перевозчиков: {df['carrier'].nunique()}\n\n")
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            f.write(f"Статистика датасета {os.path.basename(args.output)}\n")
+            f.write("="*50 + "\n\n")
+            f.write(f"Всего записей: {stats.rows}\n")
+            f.write(f"Период: {stats.date_min} - {stats.date_max}\n")
+            f.write(f"Уникальных городов: {len(stats.from_cities)}\n")
+            f.write(f"Уникальных перевозчиков: {len(stats.carriers)}\n\n")
+            
+            f.write("Топ-5 городов отправления:\n")
+            top_cities = stats.from_cities.sort_values(ascending=False, kind='stable').head(5)
+            for city, count in top_cities.items():
+                f.write(f"  {city}: {count} перевозок\n")
+            
+            f.write("\nТоп-5 перевозчиков:\n")
+            top_carriers = stats.carriers.sort_values(ascending=False, kind='stable').head(5)
+            for carrier, count in top_carriers.items():
+                f.write(f"  {carrier}: {count} перевозок\n")
         
-        f.write("Топ-5 городов отправления:\n")
-        top_cities = df['from_city'].value_counts().head(5)
-        for city, count in top_cities.items():
-            f.write(f"  {city}: {count} перевозок\n")
-        
-        f.write("\nТоп-5 перевозчиков:\n")
-        top_carriers = df['carrier'].value_counts().head(5)
-        for carrier, count in top_carriers.items():
-            f.write(f"  {carrier}: {count} перевозок\n")
-    
-    print(f"\n📋 Подробная статистика сохранена в {stats_path}")
+        print(f"\n📋 Подробная статистика сохранена в {args.stats}")
     
     # Также создаем уменьшенную версию для быстрых тестов
-    sample_df = df.sample(100, random_state=42)
-    sample_path = 'data/shipments_sample.csv'
-    sample_df.to_csv(sample_path, index=False, encoding='utf-8')
-    print(f"📦 Создан sample файл: {sample_path} (100 записей)")
+    if args.sample and sample:
+        sample[0].to_csv(args.sample, index=False, encoding='utf-8')
+        print(f"📦 Создан sample файл: {args.sample} ({len(sample[0])} записей)")
 
 if __name__ == '__main__':
-    # Установите faker если нет: pip install faker
-    try:
-        from faker import Faker
-    except ImportError:
-        print("Установите faker: pip install faker")
-        exit(1)
-    
     main()
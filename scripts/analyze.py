@@ -6,18 +6,376 @@
 """
 
 import csv
+import hashlib
+import heapq
+import json
+import os
 import statistics
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from collections import defaultdict
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# Корень проекта для импорта общих модулей app/* (app.utils.profiling - только stdlib)
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.utils.anomalies import CostAnomalyDetector
+from app.utils.dates import as_day, day_date, iso_day, last_days
+from app.utils.profiling import PROFILE_FORMATS, Profiler, profiled, save_profile
+
+# Состояние инкрементального пересчета KPI для main()
+DEFAULT_STATE_PATH = 'data/.cache/kpi_state.json'
+STATE_VERSION = 1
+
+
+def _new_carrier_stats():
+    return {'count': 0, 'total_cost': 0, 'total_distance': 0, 'total_weight': 0}
+
+
+def _finalize_carrier_stats(carrier_stats):
+    """Расчет средних значений по перевозчикам из накопленных сумм"""
+    for stats in carrier_stats.values():
+        stats['avg_cost_per_shipment'] = stats['total_cost'] / stats['count']
+        stats['avg_cost_per_km'] = (
+            stats['total_cost'] / stats['total_distance'] if stats['total_distance'] else 0
+        )
+        stats['avg_cost_per_kg'] = (
+            stats['total_cost'] / stats['total_weight'] if stats['total_weight'] else 0
+        )
+    return carrier_stats
+
+
+class ShipmentAggregator:
+    """Накопитель KPI, статистики перевозчиков и лучших маршрутов за один проход.
+
+    Хранит только суммы и по одной записи на маршрут, поэтому память
+    не зависит от числа обработанных перевозок.
+    """
+
+    def __init__(self):
+        self.total_shipments = 0
+        self.total_cost = 0.0
+        self.total_distance = 0
+        self.total_weight = 0
+        self.cost_per_km_sum = 0.0
+        self.cost_per_km_count = 0
+        self.cost_per_kg_sum = 0.0
+        self.cost_per_kg_count = 0
+        self.carriers = defaultdict(_new_carrier_stats)
+        self.routes = {}
+
+    def update(self, from_city, to_city, carrier, distance, weight, cost):
+        """Учет одной перевозки"""
+        self.total_shipments += 1
+        self.total_cost += cost
+        self.total_distance += distance
+        self.total_weight += weight
+
+        if weight > 0:
+            self.cost_per_kg_sum += cost / weight
+            self.cost_per_kg_count += 1
+
+        stats = self.carriers[carrier]
+        stats['count'] += 1
+        stats['total_cost'] += cost
+        stats['total_distance'] += distance
+        stats['total_weight'] += weight
+
+        if distance > 0:
+            cost_per_km = cost / distance
+            self.cost_per_km_sum += cost_per_km
+            self.cost_per_km_count += 1
+
+            route_key = f"{from_city} → {to_city}"
+            best = self.routes.get(route_key)
+            if best is None or cost_per_km < best['cost_per_km']:
+                self.routes[route_key] = {
+                    'cost_per_km': cost_per_km,
+                    'carrier': carrier,
+                    'distance': distance,
+                    'cost': cost
+                }
+
+    def merge(self, other):
+        """Объединение с другим накопителем (например, по другому файлу)"""
+        self.total_shipments += other.total_shipments
+        self.total_cost += other.total_cost
+        self.total_distance += other.total_distance
+        self.total_weight += other.total_weight
+        self.cost_per_km_sum += other.cost_per_km_sum
+        self.cost_per_km_count += other.cost_per_km_count
+        self.cost_per_kg_sum += other.cost_per_kg_sum
+        self.cost_per_kg_count += other.cost_per_kg_count
+
+        for carrier, other_stats in other.carriers.items():
+            stats = self.carriers[carrier]
+            for key in ('count', 'total_cost', 'total_distance', 'total_weight'):
+                stats[key] += other_stats[key]
+
+        for route_key, other_best in other.routes.items():
+            best = self.routes.get(route_key)
+            if best is None or other_best['cost_per_km'] < best['cost_per_km']:
+                self.routes[route_key] = dict(other_best)
+        return self
+
+    def to_dict(self):
+        """Состояние накопителя в виде, пригодном для JSON"""
+        state = {key: value for key, value in vars(self).items() if key not in ('carriers', 'routes')}
+        state['carriers'] = {carrier: dict(stats) for carrier, stats in self.carriers.items()}
+        state['routes'] = self.routes
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        """Восстановление накопителя из to_dict()"""
+        aggregator = cls()
+        for key, value in state.items():
+            if key == 'carriers':
+                aggregator.carriers.update(value)
+            elif key == 'routes':
+                aggregator.routes = dict(value)
+            else:
+                setattr(aggregator, key, value)
+        return aggregator
+
+    def kpis(self):
+        """KPI в том же формате, что и LogisticsAnalyzer.calculate_kpis"""
+        if not self.total_shipments:
+            return {}
+
+        return {
+            'total_shipments': self.total_shipments,
+            'total_cost': self.total_cost,
+            'total_distance': self.total_distance,
+            'total_weight': self.total_weight,
+            'avg_cost_per_km': (
+                self.cost_per_km_sum / self.cost_per_km_count if self.cost_per_km_count else 0
+            ),
+            'avg_cost_per_kg': (
+                self.cost_per_kg_sum / self.cost_per_kg_count if self.cost_per_kg_count else 0
+            ),
+            'avg_distance': self.total_distance / self.total_shipments,
+            'avg_weight': self.total_weight / self.total_shipments,
+        }
+
+    def carrier_stats(self):
+        """Статистика по перевозчикам"""
+        carrier_stats = {carrier: dict(stats) for carrier, stats in self.carriers.items()}
+        return _finalize_carrier_stats(carrier_stats)
+
+    def best_routes(self, top_n=3):
+        """Top-N маршрутов с минимальной стоимостью за км"""
+        return heapq.nsmallest(top_n, self.routes.items(), key=lambda x: x[1]['cost_per_km'])
+
+
+class ShipmentTable:
+    """Компактное колоночное хранилище перевозок.
+
+    Каждая колонка - типизированный массив (array): расстояние и вес - int,
+    стоимость - double, дата - номер дня (от 1970-01-01), города и
+    перевозчики - целочисленные коды в справочниках cities / carriers.
+    Одна запись занимает ~32 байта вместо нескольких сотен у dict.
+    
+    Для выборок по окну дат строится индекс: номера дней по возрастанию и
+    перестановка строк (для уже отсортированного файла - без перестановки);
+    rows(start, end) находит строки окна бинарным поиском.
+    """
+
+    def __init__(self):
+        self.distance_km = array('i')
+        self.weight_kg = array('i')
+        self.cost_rub = array('d')
+        self.date = array('i')
+        self.from_city = array('I')
+        self.to_city = array('I')
+        self.carrier = array('I')
+
+        # Справочники: код -> название и название -> код
+        self.cities = []
+        self.carriers = []
+        self._city_codes = {}
+        self._carrier_codes = {}
+        self._date_index = None
+
+    def __len__(self):
+        return len(self.cost_rub)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        """Запись в виде dict (для совместимости со старым форматом)"""
+        return {
+            'from_city': self.cities[self.from_city[i]],
+            'to_city': self.cities[self.to_city[i]],
+            'carrier': self.carriers[self.carrier[i]],
+            'distance_km': self.distance_km[i],
+            'weight_kg': self.weight_kg[i],
+            'cost_rub': self.cost_rub[i],
+            'date': datetime.combine(day_date(self.date[i]), datetime.min.time()),
+        }
+
+    def city_code(self, name):
+        """Код города (добавляется в справочник при первом появлении)"""
+        code = self._city_codes.get(name)
+        if code is None:
+            code = self._city_codes[name] = len(self.cities)
+            self.cities.append(name)
+        return code
+
+    def carrier_code(self, name):
+        """Код перевозчика (добавляется в справочник при первом появлении)"""
+        code = self._carrier_codes.get(name)
+        if code is None:
+            code = self._carrier_codes[name] = len(self.carriers)
+            self.carriers.append(name)
+        return code
+
+    def append(self, from_city, to_city, carrier, distance, weight, cost, day):
+        """Добавление одной перевозки"""
+        self.from_city.append(self.city_code(from_city))
+        self.to_city.append(self.city_code(to_city))
+        self.carrier.append(self.carrier_code(carrier))
+        self.distance_km.append(distance)
+        self.weight_kg.append(weight)
+        self.cost_rub.append(cost)
+        self.date.append(day)
+
+    def date_index(self):
+        """Номера дней по возрастанию и перестановка строк (None - строки уже
+        по порядку дат). Строится при первом обращении после загрузки."""
+        n = len(self)
+        if self._date_index is None or self._date_index[0] != n:
+            dates = self.date
+            if all(a <= b for a, b in zip(dates, islice(dates, 1, None))):
+                days, order = dates, None
+            else:
+                order = array('I', sorted(range(n), key=dates.__getitem__))
+                days = array('i', (dates[i] for i in order))
+            self._date_index = (n, days, order)
+        return self._date_index[1:]
+    
+    def rows(self, start=None, end=None):
+        """Строки в окне дат [start, end] включительно (None - все строки).
+        
+        Границы - дата, строка ISO или номер дня. Возвращает range или
+        список номеров строк по возрастанию.
+        """
+        if start is None and end is None:
+            return None
+        days, order = self.date_index()
+        lo = 0 if start is None else bisect_left(days, as_day(start))
+        hi = len(days) if end is None else bisect_right(days, as_day(end))
+        if order is None:
+            return range(lo, max(lo, hi))
+        return sorted(order[lo:hi])
+    
+    def column(self, name, rows=None):
+        """Значения колонки по строкам rows (см. rows())"""
+        values = getattr(self, name)
+        if rows is None:
+            return values
+        if isinstance(rows, range):
+            return values[rows.start:rows.stop]
+        return [values[i] for i in rows]
+    
+    def nbytes(self):
+        """Объем памяти, занятый колонками (без справочников)"""
+        columns = (self.distance_km, self.weight_kg, self.cost_rub, self.date,
+                   self.from_city, self.to_city, self.carrier)
+        return sum(len(col) * col.itemsize for col in columns)
+
+
+def _parse_header(line):
+    return next(csv.reader([line.decode('utf-8')]), [])
+
+
+def iter_csv_chunks(path, chunk_size=10_000, offset=None):
+    """Чтение CSV файла порциями по chunk_size строк.
+
+    Возвращает заголовок, начальное смещение и генератор пар
+    (строки порции, смещение в байтах после порции). Чтение начинается с offset (по умолчанию - сразу после
+    заголовка). Незавершенная последняя строка (файл еще дописывается)
+    не читается и не учитывается в смещении.
+    """
+    file = open(path, 'rb')
+    header_line = file.readline()
+    header = _parse_header(header_line)
+    start = position = len(header_line) if offset is None else offset
+    file.seek(position)
+
+    def chunks():
+        nonlocal position
+        with file:
+            while True:
+                lines = list(islice(file, chunk_size))
+                complete = bool(lines) and lines[-1].endswith(b'\n')
+                if lines and not complete:
+                    lines.pop()
+                if not lines:
+                    break
+                position += sum(map(len, lines))
+                rows = [row for row in csv.reader(line.decode('utf-8') for line in lines) if row]
+                yield rows, position
+                if not complete:
+                    break
+
+    return header, start, chunks()
+
+
+def _prefix_digest(path, offset, window=4096):
+    """Хэш последних window байт перед offset - признак того,
+    что уже обработанная часть файла не была перезаписана"""
+    with open(path, 'rb') as f:
+        start = max(0, offset - window)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
 
 class LogisticsAnalyzer:
-    """Класс для анализа логистических данных"""
+    """Класс для анализа логистических данных
+    
+    При streaming=True файл читается порциями по chunk_size строк и сразу
+    сворачивается в ShipmentAggregator: записи в памяти не хранятся,
+    поэтому потребление памяти не зависит от размера файла.
     
-    def __init__(self, data_path):
+    При use_cache=True колонки читаются из колоночного кэша
+    app.utils.data_loader (нужен numpy) вместо разбора CSV.
+    
+    При streaming=True и заданном state_path состояние накопителя
+    сохраняется вместе со смещением в файле: следующий запуск дочитывает
+    только дописанные строки. Если файл был перезаписан или усечен,
+    состояние пересчитывается с нуля.
+    
+    При detect_anomalies=True (только потоковый режим) каждая перевозка
+    при чтении проверяется CostAnomalyDetector по статистике цен своего
+    маршрута, перевозчика и типа груза; состояние детектора сохраняется
+    вместе с состоянием накопителя.
+    
+    Загрузка и методы анализа замеряются в self.profiler (см.
+    app.utils.profiling): чтение и разбор CSV и преобразование типов -
+    отдельными вложенными этапами.
+    """
+    
+    def __init__(self, data_path, streaming=False, chunk_size=10_000, use_cache=False,
+                 state_path=None, detect_anomalies=False):
+        if detect_anomalies and not streaming:
+            raise ValueError("Поиск аномалий работает только в потоковом режиме")
         self.data_path = Path(data_path)
-        self.shipments = []
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.use_cache = use_cache
+        self.state_path = Path(state_path) if state_path else None
+        self.shipments = ShipmentTable()
+        self.aggregator = None
+        self.detector = CostAnomalyDetector() if detect_anomalies else None
+        self.profiler = Profiler(type(self).__name__)
         self.load_data()
     
     def load_data(self):
@@ -25,95 +383,324 @@ class LogisticsAnalyzer:
         if not self.data_path.exists():
             raise FileNotFoundError(f"Файл {self.data_path} не найден")
         
-        with open(self.data_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # Преобразование типов данных
-                row['distance_km'] = int(row['distance_km'])
-                row['weight_kg'] = int(row['weight_kg'])
-                row['cost_rub'] = float(row['cost_rub'])
-                row['date'] = datetime.strptime(row['date'], '%Y-%m-%d')
-                self.shipments.append(row)
+        with self.profiler.stage('load') as stage:
+            if self.streaming:
+                self._stream_data()
+                stage['rows'] = self.profiler.rows = self.aggregator.total_shipments
+                return
+            
+            if self.use_cache:
+                self._load_cached()
+            else:
+                self._load_csv()
+            stage['rows'] = self.profiler.rows = len(self.shipments)
+    
+    def _load_csv(self):
+        """Разбор CSV в ShipmentTable порциями по chunk_size строк"""
+        table = self.shipments
+        read_s = convert_s = 0.0
+        with open(self.data_path, 'r', encoding='utf-8', newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader, [])
+            i_from = header.index('from_city')
+            i_to = header.index('to_city')
+            i_carrier = header.index('carrier')
+            i_distance = header.index('distance_km')
+            i_weight = header.index('weight_kg')
+            i_cost = header.index('cost_rub')
+            i_date = header.index('date')
+            
+            # Замер по порциям: чтение и разбор CSV отдельно от преобразования типов
+            while True:
+                started = time.perf_counter()
+                rows = list(islice(reader, self.chunk_size))
+                parsed = time.perf_counter()
+                read_s += parsed - started
+                if not rows:
+                    break
+                for row in rows:
+                    # Преобразование типов данных
+                    table.append(
+                        row[i_from], row[i_to], row[i_carrier],
+                        int(row[i_distance]), int(row[i_weight]), float(row[i_cost]),
+                        iso_day(row[i_date])
+                    )
+                convert_s += time.perf_counter() - parsed
         
+        self.profiler.add('read_csv', read_s, len(table))
+        self.profiler.add('convert', convert_s, len(table))
         print(f"✅ Загружено {len(self.shipments)} записей")
     
-    def calculate_kpis(self):
-        """Расчет ключевых показателей эффективности"""
-        if not self.shipments:
+    def _load_cached(self):
+        """Заполнение ShipmentTable из колоночного кэша без разбора CSV"""
+        import numpy as np
+        from app.utils.data_loader import load_columns
+        
+        columns = load_columns(self.data_path, [
+            'from_city', 'to_city', 'carrier', 'distance_km', 'weight_kg', 'cost_rub', 'date'
+        ])
+        table = self.shipments
+        converted = time.perf_counter()
+        
+        def recode(name, intern, typecode='I'):
+            # Коды кэша -> значения таблицы (intern вызывается один раз на значение словаря)
+            codes, categories = columns[name]
+            mapping = np.array([intern(value) for value in categories], dtype=typecode)
+            return array(typecode, mapping[codes].tobytes())
+        
+        table.from_city = recode('from_city', table.city_code)
+        table.to_city = recode('to_city', table.city_code)
+        table.carrier = recode('carrier', table.carrier_code)
+        table.date = recode('date', iso_day, 'i')
+        table.distance_km = array('i', np.asarray(columns['distance_km'], dtype=np.int32).tobytes())
+        table.weight_kg = array('i', np.asarray(columns['weight_kg'], dtype=np.int32).tobytes())
+        table.cost_rub = array('d', np.asarray(columns['cost_rub'], dtype=np.float64).tobytes())
+        self.profiler.add('convert', time.perf_counter() - converted, len(table))
+        
+        print(f"✅ Загружено {len(table)} записей (колоночный кэш)")
+    
+    def _stream_data(self):
+        """Однопроходная агрегация файла порциями"""
+        state = self._load_state()
+        if state:
+            self.aggregator = ShipmentAggregator.from_dict(state['aggregator'])
+            if self.detector is not None:
+                self.detector = CostAnomalyDetector.from_dict(state['detector'])
+            offset, rows_before = state['offset'], state['rows']
+        else:
+            self.aggregator = ShipmentAggregator()
+            offset, rows_before = None, 0
+        update = self.aggregator.update
+        
+        header, offset, chunks = iter_csv_chunks(self.data_path, self.chunk_size, offset)
+        i_from = header.index('from_city')
+        i_to = header.index('to_city')
+        i_carrier = header.index('carrier')
+        i_distance = header.index('distance_km')
+        i_weight = header.index('weight_kg')
+        i_cost = header.index('cost_rub')
+        if self.detector is not None:
+            i_cargo = header.index('cargo_type')
+            i_id = header.index('shipment_id') if 'shipment_id' in header else None
+            check = self.detector.update
+            flagged_before = self.detector.flagged
+        
+        rows = rows_before
+        read_s = convert_s = 0.0
+        started = time.perf_counter()
+        for chunk, offset in chunks:
+            parsed = time.perf_counter()
+            read_s += parsed - started
+            if self.detector is None:
+                for row in chunk:
+                    update(
+                        row[i_from], row[i_to], row[i_carrier],
+                        int(row[i_distance]), int(row[i_weight]), float(row[i_cost])
+                    )
+            else:
+                for row in chunk:
+                    distance, weight, cost = int(row[i_distance]), int(row[i_weight]), float(row[i_cost])
+                    update(row[i_from], row[i_to], row[i_carrier], distance, weight, cost)
+                    check(row[i_from], row[i_to], row[i_carrier], row[i_cargo],
+                          distance, weight, cost, None if i_id is None else row[i_id])
+            rows += len(chunk)
+            started = time.perf_counter()
+            convert_s += started - parsed
+        read_s += time.perf_counter() - started
+        self.profiler.add('read_csv', read_s, rows - rows_before)
+        self.profiler.add('convert_aggregate', convert_s, rows - rows_before)
+        
+        if self.state_path:
+            self._save_state(header, offset, rows)
+            print(f"✅ Обработано {rows - rows_before} новых записей, всего {rows} (потоковый режим)")
+        else:
+            print(f"✅ Обработано {self.aggregator.total_shipments} записей (потоковый режим)")
+        if self.detector is not None:
+            print(f"🚨 Аномальных цен среди новых записей: {self.detector.flagged - flagged_before}")
+    
+    def _load_state(self):
+        """Сохраненное состояние, если оно относится к текущему файлу"""
+        if not self.state_path or not self.state_path.exists():
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        offset = state.get('offset', 0)
+        if (state.get('version') != STATE_VERSION
+                or state.get('source') != str(self.data_path.resolve())
+                or self.data_path.stat().st_size < offset
+                or state.get('header') != self._read_header()
+                or state.get('prefix_digest') != _prefix_digest(self.data_path, offset)
+                or (self.detector is not None and 'detector' not in state)):
+            print("⚠️  Файл изменился не дописыванием - KPI пересчитываются полностью")
+            return None
+        return state
+    
+    def _read_header(self):
+        with open(self.data_path, 'rb') as f:
+            return _parse_header(f.readline())
+    
+    def _save_state(self, header, offset, rows):
+        state = {
+            'version': STATE_VERSION,
+            'source': str(self.data_path.resolve()),
+            'header': header,
+            'offset': offset,
+            'rows': rows,
+            'prefix_digest': _prefix_digest(self.data_path, offset),
+            'aggregator': self.aggregator.to_dict(),
+        }
+        if self.detector is not None:
+            state['detector'] = self.detector.to_dict()
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+    
+    def _window(self, start, end):
+        """Строки окна дат; в потоковом режиме окно не поддерживается"""
+        if self.streaming:
+            if start is not None or end is not None:
+                raise ValueError("Окно дат недоступно в потоковом режиме: перевозки не хранятся")
+            return None
+        return self.shipments.rows(start, end)
+    
+    def last_days(self, n):
+        """Окно из n последних дней данных: (start, end) номерами дней"""
+        if self.streaming:
+            raise ValueError("Окно дат недоступно в потоковом режиме: перевозки не хранятся")
+        days, _ = self.shipments.date_index()
+        if not days:
+            raise ValueError("Нет данных")
+        return last_days(n, days[-1])
+    
+    @profiled
+    def calculate_kpis(self, start=None, end=None):
+        """Расчет ключевых показателей эффективности (start/end - окно дат)"""
+        rows = self._window(start, end)
+        if self.streaming:
+            return self.aggregator.kpis()
+        
+        table = self.shipments
+        cost_rub = table.column('cost_rub', rows)
+        distance_km = table.column('distance_km', rows)
+        weight_kg = table.column('weight_kg', rows)
+        n = len(cost_rub)
+        if not n:
             return {}
         
         # Базовые метрики
-        total_cost = sum(s['cost_rub'] for s in self.shipments)
-        total_distance = sum(s['distance_km'] for s in self.shipments)
-        total_weight = sum(s['weight_kg'] for s in self.shipments)
+        total_cost = sum(cost_rub)
+        total_distance = sum(distance_km)
+        total_weight = sum(weight_kg)
         
         # Стоимость за км и за кг
-        cost_per_km = [s['cost_rub'] / s['distance_km'] for s in self.shipments if s['distance_km'] > 0]
-        cost_per_kg = [s['cost_rub'] / s['weight_kg'] for s in self.shipments if s['weight_kg'] > 0]
+        cost_per_km = [c / d for c, d in zip(cost_rub, distance_km) if d > 0]
+        cost_per_kg = [c / w for c, w in zip(cost_rub, weight_kg) if w > 0]
         
         kpis = {
-            'total_shipments': len(self.shipments),
+            'total_shipments': n,
             'total_cost': total_cost,
             'total_distance': total_distance,
             'total_weight': total_weight,
-            'avg_cost_per_km': statistics.mean(cost_per_km) if cost_per_km else 0,
-            'avg_cost_per_kg': statistics.mean(cost_per_kg) if cost_per_kg else 0,
-            'avg_distance': total_distance / len(self.shipments),
-            'avg_weight': total_weight / len(self.shipments),
+            'avg_cost_per_km': statistics.fmean(cost_per_km) if cost_per_km else 0,
+            'avg_cost_per_kg': statistics.fmean(cost_per_kg) if cost_per_kg else 0,
+            'avg_distance': total_distance / n,
+            'avg_weight': total_weight / n,
         }
         
         return kpis
     
-    def analyze_by_carrier(self):
-        """Анализ по перевозчикам"""
-        carrier_stats = defaultdict(lambda: {
-            'count': 0, 'total_cost': 0, 'total_distance': 0, 'total_weight': 0
-        })
+    @profiled
+    def analyze_by_carrier(self, start=None, end=None):
+        """Анализ по перевозчикам (start/end - окно дат)"""
+        rows = self._window(start, end)
+        if self.streaming:
+            return self.aggregator.carrier_stats()
         
-        for shipment in self.shipments:
-            carrier = shipment['carrier']
-            stats = carrier_stats[carrier]
-            stats['count'] += 1
-            stats['total_cost'] += shipment['cost_rub']
-            stats['total_distance'] += shipment['distance_km']
-            stats['total_weight'] += shipment['weight_kg']
+        table = self.shipments
+        n_carriers = len(table.carriers)
+        counts = [0] * n_carriers
+        costs = [0] * n_carriers
+        distances = [0] * n_carriers
+        weights = [0] * n_carriers
         
-        # Рассчитываем средние значения для каждого перевозчика
-        for carrier, stats in carrier_stats.items():
-            stats['avg_cost_per_shipment'] = stats['total_cost'] / stats['count']
-            stats['avg_cost_per_km'] = stats['total_cost'] / stats['total_distance']
-            stats['avg_cost_per_kg'] = stats['total_cost'] / stats['total_weight']
+        for code, cost, distance, weight in zip(
+                table.column('carrier', rows), table.column('cost_rub', rows),
+                table.column('distance_km', rows), table.column('weight_kg', rows)):
+            counts[code] += 1
+            costs[code] += cost
+            distances[code] += distance
+            weights[code] += weight
+        
+        carrier_stats = {
+            name: {
+                'count': counts[code],
+                'total_cost': costs[code],
+                'total_distance': distances[code],
+                'total_weight': weights[code],
+            }
+            for code, name in enumerate(table.carriers)
+            if counts[code]
+        }
         
-        return dict(carrier_stats)
+        # Рассчитываем средние значения для каждого перевозчика
+        return _finalize_carrier_stats(carrier_stats)
     
-    def find_most_profitable_routes(self, top_n=3):
-        """Поиск самых выгодных маршрутов (мин стоимость за км)"""
-        routes = {}
+    @profiled
+    def find_most_profitable_routes(self, top_n=3, start=None, end=None):
+        """Поиск самых выгодных маршрутов (мин стоимость за км; start/end - окно дат)"""
+        rows = self._window(start, end)
+        if self.streaming:
+            return self.aggregator.best_routes(top_n)
         
-        for shipment in self.shipments:
-            route_key = f"{shipment['from_city']} → {shipment['to_city']}"
-            cost_per_km = shipment['cost_rub'] / shipment['distance_km']
-            
-            if route_key not in routes or cost_per_km < routes[route_key]['cost_per_km']:
-                routes[route_key] = {
-                    'cost_per_km': cost_per_km,
-                    'carrier': shipment['carrier'],
-                    'distance': shipment['distance_km'],
-                    'cost': shipment['cost_rub']
-                }
+        table = self.shipments
+        best = {}  # (from_code, to_code) -> (cost_per_km, индекс записи)
+        
+        for i, from_code, to_code, cost, distance in zip(
+                range(len(table)) if rows is None else rows,
+                table.column('from_city', rows), table.column('to_city', rows),
+                table.column('cost_rub', rows), table.column('distance_km', rows)):
+            if distance <= 0:
+                continue
+            cost_per_km = cost / distance
+            key = (from_code, to_code)
+            current = best.get(key)
+            if current is None or cost_per_km < current[0]:
+                best[key] = (cost_per_km, i)
         
-        # Сортируем по стоимости за км (самые выгодные первые)
-        sorted_routes = sorted(routes.items(), key=lambda x: x[1]['cost_per_km'])
-        return sorted_routes[:top_n]
+        # Самые выгодные первые; строки маршрутов собираем только для top_n
+        top = heapq.nsmallest(top_n, best.items(), key=lambda x: x[1][0])
+        cities = table.cities
+        return [
+            (f"{cities[from_code]} → {cities[to_code]}", {
+                'cost_per_km': cost_per_km,
+                'carrier': table.carriers[table.carrier[i]],
+                'distance': table.distance_km[i],
+                'cost': table.cost_rub[i]
+            })
+            for (from_code, to_code), (cost_per_km, i) in top
+        ]
     
-    def generate_report(self):
-        """Генерация полного отчета"""
+    @profiled
+    def generate_report(self, start=None, end=None):
+        """Генерация полного отчета (start/end - окно дат)"""
         print("\n" + "="*60)
         print("📊 ОТЧЕТ ПО ЛОГИСТИЧЕСКИМ ДАННЫМ")
         print("="*60)
+        if start is not None or end is not None:
+            period = [str(day_date(as_day(d))) if d is not None else '…' for d in (start, end)]
+            print(f"   Период: {period[0]} - {period[1]}")
         
         # 1. Общие KPI
-        kpis = self.calculate_kpis()
+        kpis = self.calculate_kpis(start, end)
+        if not kpis:
+            print("\n   Нет перевозок в выбранном периоде")
+            return kpis
         print("\n1. КЛЮЧЕВЫЕ ПОКАЗАТЕЛИ:")
         print(f"   • Всего перевозок: {kpis['total_shipments']}")
         print(f"   • Общая стоимость: {kpis['total_cost']:,} руб")
@@ -124,7 +711,7 @@ class LogisticsAnalyzer:
         
         # 2. Анализ по перевозчикам
         print("\n2. АНАЛИЗ ПО ПЕРЕВОЗЧИКАМ:")
-        carrier_stats = self.analyze_by_carrier()
+        carrier_stats = self.analyze_by_carrier(start, end)
         for carrier, stats in carrier_stats.items():
             print(f"   📦 {carrier}:")
             print(f"      Перевозок: {stats['count']}")
@@ -133,7 +720,7 @@ class LogisticsAnalyzer:
         
         # 3. Самые выгодные маршруты
         print("\n3. САМЫЕ ВЫГОДНЫЕ МАРШРУТЫ (низкая стоимость за км):")
-        best_routes = self.find_most_profitable_routes()
+        best_routes = self.find_most_profitable_routes(start=start, end=end)
         for i, (route, data) in enumerate(best_routes, 1):
             print(f"   {i}. {route}")
             print(f"      Перевозчик: {data['carrier']}")
@@ -142,19 +729,49 @@ class LogisticsAnalyzer:
         
         print("\n" + "="*60)
         print("✅ Отчет сгенерирован успешно!")
+        
+        return kpis
+
+
+def print_anomalies(detector, top_n=10):
+    """Сводка детектора аномальных цен"""
+    print(f"\n🚨 Аномальные цены: {detector.flagged} из {detector.checked} проверенных перевозок "
+          f"({len(detector)} ключей маршрут/перевозчик/груз)")
+    for anomaly in detector.top(top_n):
+        print(f"   • #{anomaly['shipment_id']} {anomaly['route']}, {anomaly['carrier']}, "
+              f"{anomaly['cargo_type']}: {anomaly['cost_per_km']:.2f} руб/км "
+              f"(обычно {anomaly['expected_cost_per_km']:.2f}, z={anomaly['z_cost_per_km']:+.1f})")
 
 
 def main():
     """Основная функция"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Анализ логистических данных')
+    parser.add_argument('--full', action='store_true',
+                        help='Пересчитать KPI по всему файлу, игнорируя сохраненное состояние')
+    parser.add_argument('--anomalies', action='store_true',
+                        help='Проверять цены перевозок при чтении (CostAnomalyDetector)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Сохранить замеры этапов (время, строки/с, память) в FILE')
+    parser.add_argument('--profile-format', choices=PROFILE_FORMATS, default='json',
+                        help='Формат профиля: json или trace (Chrome trace, chrome://tracing)')
+    args = parser.parse_args()
+    
     try:
-        # Создаем анализатор
-        analyzer = LogisticsAnalyzer('data/shipments_extended.csv')
+        if args.full and os.path.exists(DEFAULT_STATE_PATH):
+            os.remove(DEFAULT_STATE_PATH)
+        
+        # Создаем анализатор (потоковый режим: один проход, постоянная память;
+        # при повторном запуске дочитываются только новые строки)
+        analyzer = LogisticsAnalyzer('data/shipments_extended.csv', streaming=True,
+                                     state_path=DEFAULT_STATE_PATH,
+                                     detect_anomalies=args.anomalies)
         
         # Генерируем отчет
-        analyzer.generate_report()
+        kpis = analyzer.generate_report()
         
         # Дополнительно: сохраняем KPI в файл
-        kpis = analyzer.calculate_kpis()
         with open('data/kpi_report.txt', 'w', encoding='utf-8') as f:
             f.write("Отчет KPI\n")
             f.write("="*40 + "\n")
@@ -163,6 +780,12 @@ def main():
         
         print("\n📁 Отчет KPI сохранен в data/kpi_report.txt")
         
+        if analyzer.detector is not None:
+            print_anomalies(analyzer.detector)
+        
+        if args.profile:
+            save_profile(analyzer.profiler, args.profile, args.profile_format)
+        
     except FileNotFoundError as e:
         print(f"❌ Ошибка: {e}")
         print("Создайте файл data/shipments.csv с данными")
@@ -3,73 +3,248 @@
 Анализ расширенного датасета
 """
 
+import sys
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 
+# Корень проекта для импорта общих модулей app/*
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.data_loader import load_shipments
+from app.utils.inputs import resolve_inputs
+from app.utils.profiling import PROFILE_FORMATS, Profiler, profiled, save_profile
+from app.utils.schema import union_columns
+from app.services.aggregates import ShipmentPartial, aggregate_files
+from app.services.aggregation_plan import COLUMNS as METRIC_COLUMNS, AggregationPlan
+from app.services.date_index import DateIndex, load_date_index
+from app.services.sql_store import ENGINES, ShipmentStore
+from app.services.reporter import FORMATS, build_report, render_reports
+
+def _open_store(paths, engine, approx, db_path):
+    """Хранилище SQLite для engine='sql', иначе None"""
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок {engine}, доступны: {', '.join(ENGINES)}")
+    if engine != 'sql':
+        return None
+    if approx:
+        raise ValueError("Приближенный режим не поддерживается движком sql")
+    return ShipmentStore.for_files(paths, db_path)
+
 class ExtendedLogisticsAnalyzer:
-    def __init__(self, data_path):
-        self.df = pd.read_csv(data_path)
-        print(f"📁 Загружено {len(self.df)} записей из {data_path}")
+    """Анализ по одному файлу или по объединенным агрегатам нескольких файлов.
+    
+    Все разделы отчета строятся из ShipmentPartial, поэтому отчет по
+    каталогу файлов (from_files) совпадает с отчетом по их объединению.
+    
+    approx=True включает приближенные статистики: медианы и перцентили
+    по скетчам с ошибкой quantile_accuracy, уникальные значения по
+    HyperLogLog с ошибкой distinct_error.
+    
+    engine='sql' - данные загружаются в SQLite (db_path или рядом с кэшем
+    файла), все разделы отчета считаются агрегирующими запросами в базе.
+    
+    Загрузка, агрегация и разделы отчета замеряются в self.profiler.
+    
+    window(start, end) - анализатор по окну дат: строки выбираются по
+    отсортированному индексу дат (DateIndex) бинарным поиском.
+    
+    aggregate(*aggregations) - произвольные агрегации (Aggregation) одним
+    планом: по строкам, если данные в памяти, иначе по кубу агрегатов.
+    
+    Из файла читаются только колонки columns(approx); колонки ключей и
+    фильтров агрегаций, которых среди них нет, дочитываются из кэша файла.
+    """
+    
+    def __init__(self, data_path=None, partial=None, approx=False,
+                 quantile_accuracy=0.01, distinct_error=0.01, engine='pandas', db_path=None, df=None):
+        self.df = df
+        self._partial = partial
+        self._report = None
+        self._date_index = None
+        self.data_path = data_path
+        self.source = str(data_path) if data_path is not None else ''
+        self.sketch_options = dict(approx=approx, quantile_accuracy=quantile_accuracy,
+                                   distinct_error=distinct_error)
+        self.profiler = Profiler(type(self).__name__)
+        if df is not None:
+            self.profiler.rows = len(df)
+        elif partial is None:
+            with self.profiler.stage('load') as stage:
+                store = _open_store([data_path], engine, approx, db_path)
+                if store is not None:
+                    self._partial = ShipmentPartial.from_store(store)
+                    rows = self._partial.count
+                    print(f"📁 Загружено {rows} записей из {data_path} (SQLite)")
+                else:
+                    # CSV разбирается один раз, дальше читается колоночный кэш
+                    self.df = load_shipments(data_path, self.columns(approx), missing='ignore')
+                    rows = len(self.df)
+                    print(f"📁 Загружено {rows} записей из {data_path}")
+                stage['rows'] = self.profiler.rows = int(rows)
+        else:
+            self.profiler.rows = int(partial.count)
+    
+    @classmethod
+    def from_files(cls, paths, workers=None, engine='pandas', db_path=None, **sketch_options):
+        """Анализ набора файлов: по процессу на файл, затем объединение агрегатов
+        (engine='sql' - все файлы загружаются в одну базу SQLite)"""
+        paths = list(paths)
+        profiler = Profiler(cls.__name__)
+        with profiler.stage('load') as stage:
+            store = _open_store(paths, engine, sketch_options.get('approx'), db_path)
+            if store is not None:
+                partial = ShipmentPartial.from_store(store)
+            else:
+                partial = aggregate_files(paths, workers, **sketch_options)
+            stage['rows'] = int(partial.count)
+        print(f"📁 Загружено {partial.count} записей из {len(paths)} файлов")
+        analyzer = cls(partial=partial, **sketch_options)
+        # Этап загрузки - в профайлере анализатора
+        profiler.rows = analyzer.profiler.rows
+        analyzer.profiler = profiler
+        analyzer.source = f"{len(paths)} файлов в {Path(paths[0]).parent}"
+        return analyzer
+    
+    @property
+    def date_index(self):
+        """Отсортированный индекс дат по данным (для файла - из кэша рядом с ним)"""
+        if self.df is None:
+            raise ValueError("Окно дат доступно для анализа одного файла движком pandas")
+        if self._date_index is None:
+            with self.profiler.stage('date_index'):
+                if self.data_path is not None:
+                    self._date_index = load_date_index(self.data_path, self.df)
+                else:
+                    self._date_index = DateIndex.from_frame(self.df)
+        return self._date_index
+    
+    def window(self, start=None, end=None, last_days=None):
+        """Анализатор по перевозкам в окне дат [start, end] или за last_days
+        последних дней данных"""
+        index = self.date_index
+        if last_days is not None:
+            start, end = index.last_days(last_days, end)
+        with self.profiler.stage('window') as stage:
+            df = index.select(self.df, start, end)
+            stage['rows'] = len(df)
+        if not len(df):
+            raise ValueError(f"Нет перевозок в окне {start or '…'} - {end or '…'}")
+        analyzer = type(self)(df=df, **self.sketch_options)
+        analyzer.source = f"{self.source} за {start or '…'} - {end or '…'}"
+        return analyzer
+    
+    @staticmethod
+    def columns(approx=False):
+        """Колонки, читаемые из файла: для агрегатов и колонок метрик агрегаций"""
+        return union_columns(ShipmentPartial.columns(approx), METRIC_COLUMNS.values())
+    
+    def _require(self, columns):
+        """Дозагрузка из кэша файла колонок, которых нет в self.df"""
+        missing = [name for name in columns if name not in self.df.columns]
+        if missing and self.data_path is not None:
+            extra = load_shipments(self.data_path, missing, missing='ignore')
+            self.df = self.df.assign(**{name: extra[name] for name in extra.columns})
+    
+    @property
+    def partial(self):
+        """Агрегаты по данным (считаются один раз)"""
+        if self._partial is None:
+            with self.profiler.stage('aggregate'):
+                self._partial = ShipmentPartial.from_frame(self.df, **self.sketch_options)
+        return self._partial
         
+    def aggregate(self, *aggregations):
+        """Агрегации одним планом (AggregationPlan): имя -> DataFrame"""
+        plan = AggregationPlan(aggregations)
+        with self.profiler.stage('aggregate_plan') as stage:
+            if self.df is not None:
+                stage['rows'] = len(self.df)
+                self._require(plan.columns)
+                return plan.execute(self.df)
+            return plan.execute_cube(self.partial.cube)
+        
+    @profiled
     def basic_analysis(self):
         """Базовый анализ"""
+        p = self.partial
         print("\n" + "="*60)
         print("📊 БАЗОВЫЙ АНАЛИЗ ДАННЫХ")
         print("="*60)
         
         # Основные статистики
         print(f"\n📈 Основные показатели:")
-        print(f"   Всего перевозок: {len(self.df):,}")
-        print(f"   Период данных: {self.df['date'].min()} - {self.df['date'].max()}")
-        print(f"   Уникальных городов отправления: {self.df['from_city'].nunique()}")
-        print(f"   Уникальных перевозчиков: {self.df['carrier'].nunique()}")
+        print(f"   Всего перевозок: {p.count:,}")
+        print(f"   Период данных: {p.date_min} - {p.date_max}")
+        print(f"   Уникальных городов отправления: {len(p.from_cities)}")
+        print(f"   Уникальных перевозчиков: {len(p.carriers)}")
+        if p.approx:
+            error = p.distinct['cities'].error
+            print(f"   Уникальных городов (≈, ±{error:.1%}): {p.distinct_count('cities'):,}")
+            print(f"   Уникальных маршрутов (≈, ±{error:.1%}): {p.distinct_count('routes'):,}")
+            print(f"   Уникальных клиентов (≈, ±{error:.1%}): {p.distinct_count('customers'):,}")
         
         # Финансы
-        total_cost = self.df['cost_rub'].sum()
-        avg_cost = self.df['cost_rub'].mean()
+        total_cost = p.cost_sum
+        avg_cost = total_cost / p.count
         print(f"\n💰 Финансовые показатели:")
         print(f"   Общая стоимость: {total_cost:,.0f} руб")
         print(f"   Средняя стоимость: {avg_cost:,.0f} руб")
-        print(f"   Медианная стоимость: {self.df['cost_rub'].median():,.0f} руб")
+        median_label = f"Медианная стоимость (≈, ±{p.quantile_accuracy:.0%})" if p.approx else "Медианная стоимость"
+        print(f"   {median_label}: {p.median_cost():,.0f} руб")
         
         # Вес и расстояние
-        total_weight = self.df['weight_kg'].sum()
-        total_distance = self.df['distance_km'].sum()
+        total_weight = p.weight_sum
+        total_distance = p.distance_sum
         print(f"\n⚖️  Физические показатели:")
         print(f"   Общий вес: {total_weight:,.0f} кг")
         print(f"   Общее расстояние: {total_distance:,.0f} км")
         print(f"   Средняя стоимость за км: {(total_cost/total_distance):.2f} руб/км")
         print(f"   Средняя стоимость за кг: {(total_cost/total_weight):.2f} руб/кг")
     
+    @profiled
     def carrier_analysis(self):
         """Анализ перевозчиков"""
         print("\n" + "="*60)
         print("🚚 АНАЛИЗ ПЕРЕВОЗЧИКОВ")
         print("="*60)
         
-        carrier_stats = self.df.groupby('carrier').agg({
-            'shipment_id': 'count',
-            'cost_rub': ['sum', 'mean', 'median'],
-            'distance_km': 'mean',
-            'weight_kg': 'mean'
+        c = self.partial.by_carrier
+        carrier_stats = pd.DataFrame({
+            'Кол-во': c['count'],
+            'Сумма_руб': c['cost_sum'],
+            'Среднее_руб': c['cost_sum'] / c['count'],
+            'Медиана_руб': self.partial.carrier_median_cost(),
+            'Ср_расстояние_км': c['distance_sum'] / c['count'],
+            'Ср_вес_кг': c['weight_sum'] / c['count'],
         }).round(2)
         
-        carrier_stats.columns = ['Кол-во', 'Сумма_руб', 'Среднее_руб', 'Медиана_руб', 'Ср_расстояние_км', 'Ср_вес_кг']
-        
         print("\n📋 Статистика по перевозчикам:")
         print(carrier_stats.sort_values('Кол-во', ascending=False))
         
         # Эффективность перевозчиков
-        self.df['cost_per_km'] = self.df['cost_rub'] / self.df['distance_km']
-        carrier_efficiency = self.df.groupby('carrier')['cost_per_km'].mean().sort_values()
+        carrier_efficiency = (c['cost_per_km_sum'] / c['cost_per_km_count']).sort_values()
         
         print(f"\n🏆 Самые выгодные перевозчики (низкая стоимость за км):")
         for carrier, cost in carrier_efficiency.head(5).items():
             print(f"   {carrier}: {cost:.2f} руб/км")
+        
+        if self.partial.approx:
+            self._carrier_percentiles()
+    
+    def _carrier_percentiles(self):
+        """Перцентили по перевозчикам из скетчей"""
+        p = self.partial
+        percentiles = pd.concat({
+            'Стоимость_руб': p.carrier_quantiles('cost'),
+            'Руб_за_км': p.carrier_quantiles('cost_per_km'),
+            'Дней_доставки': p.carrier_quantiles('delivery_days'),
+        }, axis=1).round(2)
+        percentiles.columns = [f"{metric}_{q}" for metric, q in percentiles.columns]
+        
+        print(f"\n📐 Перцентили по перевозчикам (≈, ±{p.quantile_accuracy:.0%}):")
+        print(percentiles.sort_index())
     
+    @profiled
     def route_analysis(self):
         """Анализ маршрутов"""
         print("\n" + "="*60)
@@ -77,39 +252,36 @@ class ExtendedLogisticsAnalyzer:
         print("="*60)
         
         # Самые популярные маршруты
-        routes = self.df.groupby(['from_city', 'to_city']).agg({
-            'shipment_id': 'count',
-            'cost_rub': 'mean',
-            'distance_km': 'mean'
+        r = self.partial.by_route
+        routes = pd.DataFrame({
+            'Кол-во': r['count'],
+            'Ср_стоимость': r['cost_sum'] / r['count'],
+            'Ср_расстояние': r['distance_sum'] / r['count'],
         }).round(2)
-        
-        routes.columns = ['Кол-во', 'Ср_стоимость', 'Ср_расстояние']
         routes = routes.sort_values('Кол-во', ascending=False)
         
         print("\n🔥 Топ-10 самых популярных маршрутов:")
         print(routes.head(10))
         
         # Самые дорогие маршруты
-        self.df['route'] = self.df['from_city'] + ' → ' + self.df['to_city']
-        route_cost = self.df.groupby('route')['cost_per_km'].mean().sort_values(ascending=False)
+        route_cost = r['cost_per_km_sum'] / r['cost_per_km_count']
+        route_cost.index = [f"{from_city} → {to_city}" for from_city, to_city in route_cost.index]
+        route_cost = route_cost.sort_index().sort_values(ascending=False)
         
         print(f"\n💸 Топ-5 самых дорогих маршрутов (за км):")
         for route, cost in route_cost.head(5).items():
             print(f"   {route}: {cost:.2f} руб/км")
     
+    @profiled
     def seasonal_analysis(self):
-        """Анализ сезонности"""
-        if 'month' in self.df.columns:
+        """Анализ сезонности (месяцы и кварталы из куба агрегатов)"""
+        m = self.partial.by_month
+        if m is not None:
             print("\n" + "="*60)
             print("🌦️  АНАЛИЗ СЕЗОННОСТИ")
             print("="*60)
             
-            monthly_stats = self.df.groupby('month').agg({
-                'shipment_id': 'count',
-                'cost_rub': 'sum',
-                'weight_kg': 'sum'
-            })
-            
+            monthly_stats = m[['count', 'cost_sum', 'weight_sum']].copy()
             monthly_stats.columns = ['Кол-во_перевозок', 'Общая_стоимость', 'Общий_вес']
             
             print("\n📅 Статистика по месяцам:")
@@ -119,7 +291,26 @@ class ExtendedLogisticsAnalyzer:
             busiest_month = monthly_stats['Кол-во_перевозок'].idxmax()
             print(f"\n📊 Самый загруженный месяц: {busiest_month}")
             print(f"   Перевозок: {monthly_stats.loc[busiest_month, 'Кол-во_перевозок']}")
+            
+            quarters = self.partial.cube.query(grain='quarter')
+            print("\n📆 По кварталам:")
+            for quarter, count, cost in zip(quarters.index, quarters['count'], quarters['cost_sum']):
+                print(f"   {quarter}: {count:,} перевозок, {cost:,.0f} руб")
+    
+    def report_model(self):
+        """Модель отчета (считается один раз для всех форматов)"""
+        if self._report is None:
+            partial = self.partial
+            with self.profiler.stage('build_report'):
+                self._report = build_report(partial, self.source)
+        return self._report
     
+    @profiled
+    def save_reports(self, outputs):
+        """Отчет в нескольких форматах сразу: формат -> путь (рендер параллельно)"""
+        return render_reports(self.report_model(), outputs)
+    
+    @profiled
     def generate_report(self, output_file=None):
         """Генерация полного отчета"""
         print("\n" + "="*60)
@@ -131,49 +322,66 @@ class ExtendedLogisticsAnalyzer:
         self.route_analysis()
         self.seasonal_analysis()
         
-        # Сохранение отчета
+        # Сохранение отчета: формат по расширению файла (по умолчанию txt)
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write("ОТЧЕТ ПО АНАЛИЗУ ЛОГИСТИЧЕСКИХ ДАННЫХ\n")
-                f.write("="*60 + "\n\n")
-                
-                # Базовые показатели
-                f.write("Базовые показатели:\n")
-                f.write(f"  Всего перевозок: {len(self.df):,}\n")
-                f.write(f"  Общая стоимость: {self.df['cost_rub'].sum():,.0f} руб\n")
-                f.write(f"  Общий вес: {self.df['weight_kg'].sum():,.0f} кг\n\n")
-                
-                # Топ перевозчиков
-                f.write("Топ-5 перевозчиков по количеству:\n")
-                top_carriers = self.df['carrier'].value_counts().head(5)
-                for carrier, count in top_carriers.items():
-                    f.write(f"  {carrier}: {count} перевозок\n")
-                
-                # Топ маршрутов
-                f.write("\nТоп-5 маршрутов:\n")
-                top_routes = self.df.groupby(['from_city', 'to_city']).size().sort_values(ascending=False).head(5)
-                for (from_city, to_city), count in top_routes.items():
-                    f.write(f"  {from_city} → {to_city}: {count} перевозок\n")
-            
+            fmt = Path(output_file).suffix.lstrip('.').lower()
+            self.save_reports({fmt if fmt in FORMATS else 'txt': output_file})
             print(f"\n✅ Отчет сохранен в {output_file}")
 
 def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Анализ расширенного датасета логистики')
-    parser.add_argument('input', help='Входной CSV файл')
+    parser.add_argument('input', help='Входной CSV файл, каталог с CSV или glob-шаблон')
     parser.add_argument('-o', '--output', help='Выходной файл отчета')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Число процессов для набора файлов (по умолчанию - все ядра)')
+    parser.add_argument('--approx', action='store_true',
+                        help='Приближенные медианы, перцентили и уникальные значения (фиксированная память)')
+    parser.add_argument('--quantile-accuracy', type=float, default=0.01,
+                        help='Относительная ошибка квантилей в режиме --approx (по умолчанию 0.01)')
+    parser.add_argument('--distinct-error', type=float, default=0.01,
+                        help='Относительная ошибка числа уникальных значений (по умолчанию 0.01)')
+    
+    parser.add_argument('--engine', choices=ENGINES, default='pandas',
+                        help='pandas - в памяти, sql - агрегация в SQLite (данные больше памяти)')
+    parser.add_argument('--db', help='Файл базы SQLite для --engine sql (по умолчанию рядом с кэшем)')
+    parser.add_argument('--start', help='Начало окна дат (YYYY-MM-DD, включительно)')
+    parser.add_argument('--end', help='Конец окна дат (YYYY-MM-DD, включительно)')
+    parser.add_argument('--last-days', type=int,
+                        help='Окно из N последних дней данных (или до --end)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Сохранить замеры этапов (время, строки/с, память) в FILE')
+    parser.add_argument('--profile-format', choices=PROFILE_FORMATS, default='json',
+                        help='Формат профиля: json или trace (Chrome trace, chrome://tracing)')
     
     args = parser.parse_args()
+    sketch_options = dict(approx=args.approx, quantile_accuracy=args.quantile_accuracy,
+                          distinct_error=args.distinct_error)
+    engine_options = dict(engine=args.engine, db_path=args.db)
     
     # Проверка файла
-    if not Path(args.input).exists():
+    paths = [p for p in resolve_inputs(args.input) if p.exists()]
+    if not paths:
         print(f"❌ Файл {args.input} не найден")
         return
     
     # Запуск анализа
-    analyzer = ExtendedLogisticsAnalyzer(args.input)
+    if len(paths) == 1:
+        analyzer = ExtendedLogisticsAnalyzer(paths[0], **engine_options, **sketch_options)
+    else:
+        analyzer = ExtendedLogisticsAnalyzer.from_files(paths, args.workers, **engine_options,
+                                                        **sketch_options)
+    if args.start or args.end or args.last_days:
+        try:
+            analyzer = analyzer.window(args.start, args.end, args.last_days)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        print(f"📅 Окно дат: {analyzer.source}, {len(analyzer.df)} записей")
     analyzer.generate_report(args.output)
+    if args.profile:
+        save_profile(analyzer.profiler, args.profile, args.profile_format)
 
 if __name__ == '__main__':
     main()
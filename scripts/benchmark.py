@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк анализаторов на синтетических данных
+
+Для каждого размера датасета (по умолчанию 1k, 100k, 1M, 10M записей)
+генерируется воспроизводимый CSV (generate_realistic_data, фиксированный seed),
+затем для LogisticsAnalyzer, ExtendedLogisticsAnalyzer и
+AdvancedLogisticsAnalyzer замеряются загрузка и каждый метод анализа:
+время (wall) и пиковый RSS на этапе. Каждый анализатор запускается в
+отдельном процессе, чтобы память одного не влияла на замеры другого.
+
+Результаты пишутся в JSON и сравниваются с сохраненным baseline
+(benchmarks/baseline.json, размеры 1k и 100k): этапы, ставшие медленнее
+(или тяжелее по памяти) больше допуска, печатаются как регрессии, а код
+возврата становится 1. Без файла baseline бенчмарк не запускается (код 2),
+пока baseline не сохранен через --save-baseline.
+
+    python scripts/benchmark.py --sizes 1000 100000 -o bench.json
+    python scripts/benchmark.py --sizes 1000 100000 --save-baseline
+
+--startup проверяет время холодного запуска CLI (--help и анализ
+небольшого файла) против бюджетов STARTUP_BUDGETS и печатает тяжелые
+модули, загруженные без необходимости:
+
+    python scripts/benchmark.py --startup
+
+--check-profile сравнивает профиль ночного прогона (--profile у
+анализаторов) с профилем-эталоном и возвращает 1 при замедлении этапов:
+
+    python scripts/benchmark.py --check-profile nightly.json baseline_profile.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.utils.profiling import compare_profiles, current_rss_mb
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_DATA_DIR = PROJECT_ROOT / 'data' / '.cache' / 'bench'
+DEFAULT_BASELINE = PROJECT_ROOT / 'benchmarks' / 'baseline.json'
+SEED = 42
+
+# Порог регрессии: относительный допуск и абсолютный "шумовой" минимум
+TIME_TOLERANCE = 0.20
+TIME_NOISE_S = 0.05
+MEMORY_TOLERANCE = 0.20
+MEMORY_NOISE_MB = 16
+
+# Бюджеты холодного запуска CLI: команда (аргументы cli.py) -> секунды wall
+STARTUP_BUDGETS = {
+    'help': (['--help'], 0.5),
+    'analyze_small': (['analyze', 'data/shipments.csv', '--engine', 'stdlib'], 0.5),
+}
+STARTUP_REPEATS = 5
+
+# Модули, которые не должны загружаться в легких командах
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'seaborn', 'sklearn', 'sqlite3', 'fastapi')
+
+# Запуск cli.py в новом интерпретаторе; при выходе печатает загруженные тяжелые модули
+_STARTUP_PROBE = """
+import atexit, runpy, sys
+heavy = {heavy!r}
+def report():
+    loaded = sorted(name for name in heavy if name in sys.modules)
+    sys.stderr.write('\\nHEAVY_MODULES=' + ','.join(loaded) + '\\n')
+atexit.register(report)
+sys.argv = [{script!r}] + {args!r}
+runpy.run_path({script!r}, run_name='__main__')
+"""
+
+
+class StageMeter:
+    """Замер этапа: время и пиковый RSS (фоновый поток опрашивает RSS)"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.results = []
+
+    @contextlib.contextmanager
+    def stage(self, analyzer, name, rows):
+        peak = start_rss = current_rss_mb()
+        stop = threading.Event()
+
+        def sample():
+            nonlocal peak
+            # Без замера памяти (None) опрашивать нечего
+            while start_rss is not None and not stop.wait(self.interval):
+                peak = max(peak, current_rss_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+            if start_rss is not None:
+                peak = max(peak, current_rss_mb())
+            self.results.append({
+                'size': rows,
+                'analyzer': analyzer,
+                'stage': name,
+                'wall_s': round(wall, 6),
+                'rows_per_s': round(rows / wall) if wall > 0 else None,
+                'peak_rss_mb': round(peak, 1) if peak is not None else None,
+                'rss_delta_mb': round(peak - start_rss, 1) if peak is not None else None,
+            })
+
+
+def _clear_cache(path):
+    from app.utils.data_loader import cache_dir_for
+    shutil.rmtree(cache_dir_for(path), ignore_errors=True)
+
+
+def bench_logistics(path, rows):
+    from scripts.analyze import LogisticsAnalyzer
+    meter = StageMeter()
+    name = 'LogisticsAnalyzer'
+
+    with meter.stage(name, 'load', rows):
+        analyzer = LogisticsAnalyzer(path)
+    with meter.stage(name, 'calculate_kpis', rows):
+        analyzer.calculate_kpis()
+    with meter.stage(name, 'analyze_by_carrier', rows):
+        analyzer.analyze_by_carrier()
+    with meter.stage(name, 'find_most_profitable_routes', rows):
+        analyzer.find_most_profitable_routes()
+    del analyzer
+
+    with meter.stage(name, 'load_streaming', rows):
+        LogisticsAnalyzer(path, streaming=True)
+
+    _clear_cache(path)
+    with meter.stage(name, 'load_cache_cold', rows):
+        LogisticsAnalyzer(path, use_cache=True)
+    with meter.stage(name, 'load_cache_warm', rows):
+        LogisticsAnalyzer(path, use_cache=True)
+    return meter.results
+
+
+def bench_extended(path, rows):
+    from scripts.analyze_extended import ExtendedLogisticsAnalyzer
+    meter = StageMeter()
+    name = 'ExtendedLogisticsAnalyzer'
+
+    _clear_cache(path)
+    with meter.stage(name, 'load_cold', rows):
+        ExtendedLogisticsAnalyzer(path)
+    with meter.stage(name, 'load_warm', rows):
+        analyzer = ExtendedLogisticsAnalyzer(path)
+    for method in ('basic_analysis', 'carrier_analysis', 'route_analysis',
+                   'seasonal_analysis', 'generate_report'):
+        with meter.stage(name, method, rows):
+            getattr(analyzer, method)()
+    return meter.results
+
+
+def bench_advanced(path, rows):
+    from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+    meter = StageMeter()
+    name = 'AdvancedLogisticsAnalyzer'
+
+    _clear_cache(path)
+    with meter.stage(name, 'load_cold', rows):
+        AdvancedLogisticsAnalyzer(path)
+    with meter.stage(name, 'load_warm', rows):
+        analyzer = AdvancedLogisticsAnalyzer(path)
+    for method in ('calculate_kpis', 'optimize_routes', 'route_index'):
+        with meter.stage(name, method, rows):
+            getattr(analyzer, method)()
+    return meter.results
+
+
+BENCHMARKS = {
+    'LogisticsAnalyzer': bench_logistics,
+    'ExtendedLogisticsAnalyzer': bench_extended,
+    'AdvancedLogisticsAnalyzer': bench_advanced,
+}
+
+
+def _run_quietly(analyzer, path, rows):
+    """Запуск в дочернем процессе; вывод анализаторов подавляется"""
+    sys.path.insert(0, str(PROJECT_ROOT))
+    with contextlib.redirect_stdout(io.StringIO()):
+        return BENCHMARKS[analyzer](path, rows)
+
+
+def ensure_dataset(rows, data_dir=DEFAULT_DATA_DIR, seed=SEED):
+    """Воспроизводимый датасет заданного размера (генерируется один раз)"""
+    from data.generate_realistic_data import write_dataset
+    path = Path(data_dir) / f'shipments_{rows}_seed{seed}.csv'
+    if not path.exists():
+        print(f"🧪 Генерация датасета {path.name}...")
+        tmp_path = path.with_suffix('.tmp')
+        write_dataset(tmp_path, rows, seed=seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def run(sizes, analyzers, data_dir=DEFAULT_DATA_DIR, isolate=True):
+    """Прогон бенчмарка; возвращает результаты в формате JSON-отчета"""
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for rows in sizes:
+        path = str(ensure_dataset(rows, data_dir))
+        for analyzer in analyzers:
+            print(f"⏱️  {analyzer}: {rows:,} записей")
+            if isolate:
+                with ctx.Pool(1) as pool:
+                    stages = pool.apply(_run_quietly, (analyzer, path, rows))
+            else:
+                stages = _run_quietly(analyzer, path, rows)
+            results.extend(stages)
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': SEED,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline):
+    """Список регрессий относительно baseline"""
+    def key(r):
+        return (r['size'], r['analyzer'], r['stage'])
+
+    base = {key(r): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in current['results']:
+        old = base.get(key(result))
+        if old is None:
+            continue
+        for metric, tolerance, noise in (('wall_s', TIME_TOLERANCE, TIME_NOISE_S),
+                                         ('peak_rss_mb', MEMORY_TOLERANCE, MEMORY_NOISE_MB)):
+            new_value, old_value = result[metric], old[metric]
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + tolerance) and new_value - old_value > noise:
+                regressions.append({
+                    'size': result['size'],
+                    'analyzer': result['analyzer'],
+                    'stage': result['stage'],
+                    'metric': metric,
+                    'baseline': old_value,
+                    'current': new_value,
+                    'ratio': round(new_value / old_value, 2) if old_value else None,
+                })
+    return regressions
+
+
+def measure_startup(args, repeats=STARTUP_REPEATS):
+    """Время запуска `cli.py args` (минимум из repeats) и загруженные тяжелые модули"""
+    script = str(PROJECT_ROOT / 'scripts' / 'cli.py')
+    probe = _STARTUP_PROBE.format(heavy=HEAVY_MODULES, script=script, args=list(args))
+    timings, heavy = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-c', probe], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"cli.py {' '.join(args)} завершился с кодом {proc.returncode}: {proc.stderr}")
+        marker = proc.stderr.rsplit('HEAVY_MODULES=', 1)[-1].strip()
+        heavy = [name for name in marker.split(',') if name]
+    return {'wall_s': round(min(timings), 4), 'heavy_modules': heavy}
+
+
+def check_startup(budgets=STARTUP_BUDGETS, repeats=STARTUP_REPEATS):
+    """Замер всех команд из budgets; возвращает (результаты, превышения)"""
+    results, failures = [], []
+    for name, (args, budget) in budgets.items():
+        result = dict(measure_startup(args, repeats), command=name, budget_s=budget)
+        results.append(result)
+        if result['wall_s'] > budget or result['heavy_modules']:
+            failures.append(result)
+    return results, failures
+
+
+def print_results(report):
+    print(f"\n{'Размер':>10}  {'Анализатор':<26} {'Этап':<28} {'Время, с':>9} {'Пик RSS, МБ':>12}")
+    for r in report['results']:
+        peak = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else '-'
+        print(f"{r['size']:>10,}  {r['analyzer']:<26} {r['stage']:<28} "
+              f"{r['wall_s']:>9.3f} {peak:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк анализаторов логистических данных')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Размеры датасетов (записей)')
+    parser.add_argument('--analyzers', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS), help='Какие анализаторы замерять')
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help='Файл для результатов (JSON)')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE),
+                        help='Baseline для сравнения (JSON)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Сохранить результаты как новый baseline')
+    parser.add_argument('--data-dir', default=str(DEFAULT_DATA_DIR),
+                        help='Каталог для сгенерированных датасетов')
+    parser.add_argument('--startup', action='store_true',
+                        help='Проверить время запуска CLI против STARTUP_BUDGETS')
+    parser.add_argument('--check-profile', nargs=2, metavar=('CURRENT', 'BASELINE'),
+                        help='Сравнить JSON-профиль анализатора с эталонным профилем')
+    args = parser.parse_args()
+
+    if args.check_profile:
+        profiles = []
+        for path in args.check_profile:
+            with open(path, 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        regressions = compare_profiles(*profiles)
+        if not regressions:
+            print("✅ Этапы не медленнее эталонного профиля")
+            return 0
+        print(f"❌ Замедлившихся этапов: {len(regressions)}")
+        for r in regressions:
+            print(f"   {r['analyzer']}.{r['stage']} {r['metric']}: {r['baseline']} → {r['current']}")
+        return 1
+
+    if args.startup:
+        results, failures = check_startup()
+        print(f"\n{'Команда':<16} {'Время, с':>9} {'Бюджет, с':>10}  Тяжелые модули")
+        for r in results:
+            print(f"{r['command']:<16} {r['wall_s']:>9.3f} {r['budget_s']:>10.2f}  "
+                  f"{', '.join(r['heavy_modules']) or '-'}")
+        if failures:
+            print(f"\n❌ Превышен бюджет запуска: {', '.join(r['command'] for r in failures)}")
+            return 1
+        print("\n✅ Запуск CLI в пределах бюджета")
+        return 0
+
+    if not args.save_baseline and not Path(args.baseline).exists():
+        print(f"❌ Baseline {args.baseline} не найден: сохраните его флагом --save-baseline "
+              f"или укажите файл через --baseline")
+        return 2
+
+    report = run(args.sizes, args.analyzers, args.data_dir)
+    print_results(report)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📁 Результаты сохранены в {args.output}")
+
+    if args.save_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📌 Baseline обновлен: {args.baseline}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        regressions = compare(report, json.load(f))
+    if not regressions:
+        print("✅ Регрессий относительно baseline нет")
+        return 0
+
+    print(f"\n❌ Найдено регрессий: {len(regressions)}")
+    for r in regressions:
+        print(f"   {r['size']:,} {r['analyzer']}.{r['stage']} {r['metric']}: "
+              f"{r['baseline']} → {r['current']} (x{r['ratio']})")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,128 @@
 #!/usr/bin/env python3
-"""CLI интерфейс для Logistics Analyzer"""
+"""CLI интерфейс для Logistics Analyzer
+
+На верхнем уровне импортируется только стандартная библиотека: pandas,
+numpy и прочие тяжелые модули загружаются внутри команд, когда движку
+они действительно нужны. Движок stdlib (--engine stdlib, или auto для
+небольших файлов) - потоковый LogisticsAnalyzer на модуле csv; он
+включается явно, так как в -o пишет отчет KPI, а не статистики describe().
+
+Движок pandas читает файл через колоночный кэш (load_shipments) с типами
+схемы: текстовые колонки - category, справочные дробные - float32. Набор
+колонок describe() тот же, что у pd.read_csv, но статистики float32-колонок
+(volume_m3, delivery_days и т.п.) точны до ~7 значащих цифр.
+Время запуска контролирует `python scripts/benchmark.py --startup`.
+"""
 
 import argparse
+import os
 import sys
 from pathlib import Path
 
-def analyze_data(input_file, output_file=None):
-    """Анализ данных"""
-    import pandas as pd
+# Корень проекта для импорта общих модулей app/*
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ANALYZE_ENGINES = ('auto', 'stdlib', 'pandas', 'sql')
+
+# auto: файлы меньше этого размера анализируются без pandas
+SMALL_FILE_BYTES = 8 * 2**20
+
+def choose_engine(paths, engine='auto'):
+    """Движок для набора файлов: auto -> stdlib для одного небольшого файла"""
+    if engine != 'auto':
+        return engine
+    if len(paths) == 1 and paths[0].exists() and os.path.getsize(paths[0]) < SMALL_FILE_BYTES:
+        return 'stdlib'
+    return 'pandas'
+
+def _save_profile(profiler, profile, profile_format):
+    """Сводка этапов и файл профиля (флаг --profile)"""
+    if not profile:
+        return
+    from app.utils.profiling import save_profile
+    
+    print()
+    for line in profiler.summary_lines():
+        print(line)
+    save_profile(profiler, profile, profile_format)
+
+def analyze_stdlib(input_file, output_file=None, profile=None, profile_format='json'):
+    """Анализ одного файла только стандартной библиотекой (один проход по CSV)"""
+    from scripts.analyze import LogisticsAnalyzer
+    
+    try:
+        analyzer = LogisticsAnalyzer(input_file, streaming=True)
+        kpis = analyzer.generate_report()
+        _save_profile(analyzer.profiler, profile, profile_format)
+        
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write("Отчет KPI\n")
+                f.write("="*40 + "\n")
+                for key, value in kpis.items():
+                    f.write(f"{key}: {value}\n")
+            print(f"📁 Результаты сохранены в {output_file}")
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+    
+    return True
+
+def analyze_files(paths, output_file=None, workers=None, engine='pandas', profile=None,
+                  profile_format='json'):
+    """Анализ набора файлов в несколько процессов (или в SQLite) с общим отчетом"""
+    from scripts.analyze_extended import ExtendedLogisticsAnalyzer
+    
+    print(f"📊 Анализ {len(paths)} файлов")
+    
+    try:
+        analyzer = ExtendedLogisticsAnalyzer.from_files(paths, workers, engine=engine)
+        analyzer.generate_report(output_file)
+        _save_profile(analyzer.profiler, profile, profile_format)
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+    
+    return True
+
+def analyze_data(input_file, output_file=None, workers=None, engine='pandas', profile=None,
+                 profile_format='json'):
+    """Анализ данных (файл, каталог с CSV или glob-шаблон)"""
+    from app.utils.inputs import resolve_inputs
+    
+    paths = resolve_inputs(input_file)
+    engine = choose_engine(paths, engine)
+    if engine == 'stdlib':
+        if len(paths) > 1:
+            print("❌ Движок stdlib анализирует только один файл")
+            return False
+        return analyze_stdlib(paths[0], output_file, profile, profile_format)
+    if len(paths) > 1 or engine == 'sql':
+        return analyze_files(paths, output_file, workers, engine, profile, profile_format)
     
     print(f"📊 Анализ данных из {input_file}")
     
     try:
-        df = pd.read_csv(input_file)
+        from app.utils.data_loader import load_shipments
+        from app.utils.profiling import Profiler
+        
+        profiler = Profiler('cli.analyze')
+        with profiler.stage('load') as stage:
+            df = load_shipments(input_file)
+            stage['rows'] = profiler.rows = len(df)
         print(f"✅ Загружено {len(df)} записей")
+        with profiler.stage('describe'):
+            # Статистики в float64: суммы по float32-колонкам не копят ошибку
+            numeric = df.select_dtypes('number')
+            wide = {name: 'float64' for name in numeric.select_dtypes('float32').columns}
+            stats = numeric.astype(wide).describe()
         print("\n📈 Основные статистики:")
-        print(df.describe())
+        print(stats)
         
         if output_file:
-            df.describe().to_csv(output_file)
+            stats.to_csv(output_file)
             print(f"📁 Результаты сохранены в {output_file}")
+        _save_profile(profiler, profile, profile_format)
             
     except Exception as e:
         print(f"❌ Ошибка: {e}")
@@ -27,6 +130,115 @@ def analyze_data(input_file, output_file=None):
     
     return True
 
+def generate_reports(input_file, formats, output_dir='reports', workers=None, engine='pandas',
+                     profile=None, profile_format='json'):
+    """Отчет в нескольких форматах: анализ один раз, рендер форматов параллельно"""
+    from app.utils.inputs import resolve_inputs
+    
+    paths = [p for p in resolve_inputs(input_file) if p.exists()]
+    if not paths:
+        print(f"❌ Файл {input_file} не найден")
+        return False
+    
+    try:
+        from scripts.analyze_extended import ExtendedLogisticsAnalyzer
+        
+        if len(paths) == 1:
+            analyzer = ExtendedLogisticsAnalyzer(paths[0], engine=engine)
+        else:
+            analyzer = ExtendedLogisticsAnalyzer.from_files(paths, workers, engine=engine)
+        stem = paths[0].stem if len(paths) == 1 else Path(input_file).stem or 'shipments'
+        outputs = {fmt: Path(output_dir) / f"{stem}_report.{fmt}" for fmt in dict.fromkeys(formats)}
+        print(f"Генерация отчета в форматах: {', '.join(outputs)}...")
+        for fmt, path in analyzer.save_reports(outputs).items():
+            print(f"📁 {fmt}: {path}")
+        _save_profile(analyzer.profiler, profile, profile_format)
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+    
+    return True
+
+def forecast_costs(input_file, scenario_file, output_file=None, by='route'):
+    """Прогноз стоимости перевозок сценария по моделям, обученным на input_file"""
+    print(f"🔮 Прогноз стоимости для {scenario_file} (модели по {input_file}, разрез: {by})")
+    
+    try:
+        import pandas as pd
+        from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+        
+        analyzer = AdvancedLogisticsAnalyzer(input_file)
+        scenario = pd.read_csv(scenario_file)
+        scenario['forecast_cost_rub'] = analyzer.forecast_costs(scenario, by).round(2)
+        print(f"✅ Спрогнозировано {len(scenario)} перевозок, "
+              f"итого {scenario['forecast_cost_rub'].sum():,.0f} руб")
+        
+        if output_file:
+            scenario.to_csv(output_file, index=False)
+            print(f"📁 Результаты сохранены в {output_file}")
+        else:
+            print(scenario.head(10))
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+    
+    return True
+
+def consolidate_loads(input_file, output_file=None, window_days=1, start=None, end=None):
+    """Консолидация перевозок в загрузки машин и экономия против cost_rub"""
+    print(f"🚛 Консолидация перевозок {input_file} (окно {window_days} дн.)")
+    
+    try:
+        from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+        
+        analyzer = AdvancedLogisticsAnalyzer(input_file)
+        plan = analyzer.consolidate(window_days=window_days, start=start, end=end)
+        s = plan.summary()
+        print(f"✅ {s['consolidated_shipments']:,} из {s['shipments']:,} перевозок - "
+              f"в {s['trucks']:,} машин")
+        if s['trucks']:
+            print(f"   Средняя загрузка по весу: {s['avg_weight_util']:.0%}")
+        print(f"   Стоимость: {s['original_cost']:,.0f} → {s['consolidated_cost']:,.0f} руб "
+              f"(экономия {s['saved']:,.0f} руб, {s['saved_pct']:.1%})")
+        print(plan.by_lane().head(10))
+        
+        if output_file:
+            plan.loads.to_csv(output_file, index_label='load')
+            print(f"📁 Загрузки сохранены в {output_file}")
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+    
+    return True
+
+def check_distances(input_file, output_file=None, tolerance=None):
+    """Проверка distance_km по матрице расстояний между городами"""
+    print(f"📏 Проверка расстояний в {input_file}")
+    
+    try:
+        from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+        from app.services.distances import DISTANCE_TOLERANCE
+        
+        tolerance = DISTANCE_TOLERANCE if tolerance is None else tolerance
+        analyzer = AdvancedLogisticsAnalyzer(input_file)
+        flagged = analyzer.check_distances(tolerance)
+        print(f"{'⚠️ ' if len(flagged) else '✅'} Расхождений больше {tolerance:.0%}: "
+              f"{len(flagged)} из {analyzer.profiler.rows} перевозок")
+        if len(flagged):
+            routes = flagged.groupby(['from_city', 'to_city']).agg(
+                rows=('distance_km', 'size'), expected_km=('expected_km', 'first'),
+                distance_km=('distance_km', 'mean'))
+            print(routes.sort_values('rows', ascending=False, kind='stable').head(10))
+        
+        if output_file:
+            flagged.to_csv(output_file, index_label='row')
+            print(f"📁 Результаты сохранены в {output_file}")
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return False
+    
+    return True
+
 def main():
     """Основная функция CLI"""
     parser = argparse.ArgumentParser(description='Анализатор логистических данных')
@@ -35,14 +247,58 @@ def main():
     
     # Команда analyze
     analyze_parser = subparsers.add_parser('analyze', help='Анализ данных')
-    analyze_parser.add_argument('input', help='Входной CSV файл')
-    analyze_parser.add_argument('-o', '--output', help='Выходной файл')
+    analyze_parser.add_argument('input', help='Входной CSV файл, каталог с CSV или glob-шаблон')
+    analyze_parser.add_argument('-o', '--output',
+                                help='Выходной файл (pandas: CSV статистик describe() по типам схемы, '
+                                     'float32-колонки - с точностью ~7 значащих цифр)')
+    analyze_parser.add_argument('-j', '--workers', type=int, default=None,
+                                help='Число процессов для набора файлов (по умолчанию - все ядра)')
+    analyze_parser.add_argument('--engine', choices=ANALYZE_ENGINES, default='pandas',
+                                help='pandas - в памяти (по умолчанию), sql - агрегация в SQLite, '
+                                     'stdlib - без pandas (быстрый запуск, в -o - отчет KPI), '
+                                     f'auto - stdlib для файлов меньше {SMALL_FILE_BYTES // 2**20} МБ')
     
     # Команда report
     report_parser = subparsers.add_parser('report', help='Генерация отчета')
-    report_parser.add_argument('input', help='Входной CSV файл')
-    report_parser.add_argument('--format', choices=['html', 'pdf', 'txt'], 
-                              default='txt', help='Формат отчета')
+    report_parser.add_argument('input', help='Входной CSV файл, каталог с CSV или glob-шаблон')
+    report_parser.add_argument('--format', nargs='+', choices=['txt', 'html', 'csv', 'xlsx', 'pdf'],
+                              default=['txt'], help='Форматы отчета (можно несколько)')
+    report_parser.add_argument('-o', '--output-dir', default='reports', help='Каталог для отчетов')
+    report_parser.add_argument('-j', '--workers', type=int, default=None,
+                               help='Число процессов для набора файлов (по умолчанию - все ядра)')
+    report_parser.add_argument('--engine', choices=['pandas', 'sql'], default='pandas',
+                               help='sql - загрузка в SQLite и агрегация запросами')
+    
+    # Команда forecast
+    forecast_parser = subparsers.add_parser('forecast', help='Прогноз стоимости перевозок (what-if)')
+    forecast_parser.add_argument('input', help='CSV с историей перевозок для обучения моделей')
+    forecast_parser.add_argument('scenario', help='CSV со сценарием: distance_km, weight_kg, '
+                                                  'cargo_type, carrier, from_city, to_city, date')
+    forecast_parser.add_argument('-o', '--output', help='Файл для сценария с прогнозом')
+    forecast_parser.add_argument('--by', choices=['route', 'carrier', 'global'], default='route',
+                                 help='Модели по маршрутам, перевозчикам или общая')
+    
+    # Команда consolidate
+    consolidate_parser = subparsers.add_parser('consolidate', help='Консолидация перевозок в машины')
+    consolidate_parser.add_argument('input', help='Входной CSV файл')
+    consolidate_parser.add_argument('-o', '--output', help='CSV с загрузками машин')
+    consolidate_parser.add_argument('--window-days', type=int, default=1,
+                                    help='Окно дат для объединения перевозок, дней')
+    consolidate_parser.add_argument('--start', help='Начало периода (YYYY-MM-DD)')
+    consolidate_parser.add_argument('--end', help='Конец периода (YYYY-MM-DD)')
+    
+    # Команда distances
+    distances_parser = subparsers.add_parser('distances', help='Проверка расстояний по матрице городов')
+    distances_parser.add_argument('input', help='Входной CSV файл')
+    distances_parser.add_argument('-o', '--output', help='CSV со строками, где расстояние расходится')
+    distances_parser.add_argument('--tolerance', type=float, default=None,
+                                  help='Допустимое относительное отклонение (по умолчанию 0.05)')
+    
+    for subparser in (analyze_parser, report_parser):
+        subparser.add_argument('--profile', metavar='FILE',
+                               help='Сохранить замеры этапов (время, строки/с, память) в FILE')
+        subparser.add_argument('--profile-format', choices=['json', 'trace'], default='json',
+                               help='Формат профиля: json или trace (Chrome trace, chrome://tracing)')
     
     args = parser.parse_args()
     
@@ -51,11 +307,17 @@ def main():
         return
     
     if args.command == 'analyze':
-        analyze_data(args.input, args.output)
+        analyze_data(args.input, args.output, args.workers, args.engine, args.profile,
+                     args.profile_format)
     elif args.command == 'report':
-        print(f"Генерация отчета в формате {args.format}...")
-        # TODO: Реализовать генерацию отчетов
-        print("Функция в разработке")
+        generate_reports(args.input, args.format, args.output_dir, args.workers, args.engine,
+                         args.profile, args.profile_format)
+    elif args.command == 'forecast':
+        forecast_costs(args.input, args.scenario, args.output, args.by)
+    elif args.command == 'consolidate':
+        consolidate_loads(args.input, args.output, args.window_days, args.start, args.end)
+    elif args.command == 'distances':
+        check_distances(args.input, args.output, args.tolerance)
 
 if __name__ == '__main__':
     main()
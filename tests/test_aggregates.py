@@ -0,0 +1,72 @@
+"""Тесты объединяемых агрегатов"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.aggregates import ShipmentPartial, aggregate_files
+from app.utils.inputs import resolve_inputs
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestShipmentPartial(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        df = pd.read_csv(DATA_PATH)
+        for i in range(3):
+            df.iloc[i::3].to_csv(os.path.join(cls.tmp, f'part{i}.csv'), index=False)
+        cls.df = df
+        cls.full = ShipmentPartial.from_frame(df)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def assert_same(self, merged):
+        self.assertEqual(merged.count, self.full.count)
+        self.assertAlmostEqual(merged.cost_sum, self.full.cost_sum, places=4)
+        self.assertEqual((merged.date_min, merged.date_max), (self.full.date_min, self.full.date_max))
+        self.assertEqual(merged.carriers, self.full.carriers)
+        pd.testing.assert_frame_equal(merged.by_carrier, self.full.by_carrier, check_exact=False)
+        pd.testing.assert_frame_equal(merged.by_route, self.full.by_route, check_exact=False)
+        pd.testing.assert_series_equal(merged.carrier_median_cost(), self.full.carrier_median_cost())
+        self.assertEqual(merged.median_cost(), self.full.median_cost())
+
+    def test_merge_matches_single_pass(self):
+        self.assert_same(aggregate_files(resolve_inputs(self.tmp), workers=1))
+
+    def test_process_pool(self):
+        self.assert_same(aggregate_files(resolve_inputs(os.path.join(self.tmp, '*.csv')), workers=2))
+
+    def test_exact_medians_from_value_counts(self):
+        # Точные медианы - по различным стоимостям с числом повторов
+        medians = self.df.groupby('carrier')['cost_rub'].median().rename_axis('carrier')
+        pd.testing.assert_series_equal(self.full.carrier_median_cost().sort_index(), medians,
+                                       check_names=False)
+        self.assertEqual(self.full.median_cost(), float(np.median(self.df['cost_rub'])))
+        for values, counts in self.full.carrier_costs.values():
+            self.assertTrue((np.diff(values) > 0).all())
+        self.assertEqual(sum(c.sum() for _, c in self.full.carrier_costs.values()), len(self.df))
+
+        # Четное и нечетное число строк, повторы значений
+        df = pd.DataFrame({'carrier': ['A'] * 6, 'cost_rub': [5.0, 1.0, 5.0, 3.0, 5.0, 2.0]})
+        for n in (5, 6):
+            part = ShipmentPartial.from_frame(df.iloc[:n].assign(
+                date='2024-01-01', from_city='X', to_city='Y', distance_km=1, weight_kg=1))
+            self.assertEqual(part.median_cost(), float(np.median(df['cost_rub'][:n])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Тесты планировщика агрегаций"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.aggregation_plan import Aggregation, AggregationPlan
+from app.services.rollup_cube import RollupCube
+from app.utils.data_loader import load_shipments
+from scripts.analyze_extended import ExtendedLogisticsAnalyzer
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+SPECS = [
+    Aggregation('carriers', ('count', 'cost_sum', 'cost_mean', 'cost_median', 'cost_per_km_mean',
+                             'distance_max'), keys='carrier'),
+    Aggregation('routes', ('count', 'cost_per_km_mean', 'cost_median'), keys='route',
+                filters={'cargo_type': ['Мебель', 'Химия']}),
+    Aggregation('months', ('count', 'cost_sum', 'delivery_days_mean'), grain='month',
+                start='2023-03-01', end='2023-08-31'),
+    Aggregation('total', ('count', 'cost_sum', 'cost_median')),
+]
+
+
+class TestAggregationPlan(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = load_shipments(DATA_PATH)
+        cls.raw = pd.read_csv(DATA_PATH)
+        cls.raw['cost_per_km'] = cls.raw['cost_rub'] / cls.raw['distance_km']
+
+    def assert_frame(self, actual, expected):
+        self.assertEqual(list(actual.index), list(expected.index))
+        np.testing.assert_allclose(actual.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+    def test_matches_groupby(self):
+        columns = list(self.df.columns)
+        results = AggregationPlan(SPECS).execute(self.df)
+        self.assertEqual(list(self.df.columns), columns)     # исходные данные не изменяются
+
+        d = self.raw
+        self.assert_frame(results['carriers'], d.groupby('carrier').agg(
+            count=('cost_rub', 'size'), cost_sum=('cost_rub', 'sum'), cost_mean=('cost_rub', 'mean'),
+            cost_median=('cost_rub', 'median'), cost_per_km_mean=('cost_per_km', 'mean'),
+            distance_max=('distance_km', 'max')))
+
+        subset = d[d['cargo_type'].isin(['Мебель', 'Химия'])]
+        routes = subset.groupby(subset['from_city'] + ' → ' + subset['to_city']).agg(
+            count=('cost_rub', 'size'), cost_per_km_mean=('cost_per_km', 'mean'),
+            cost_median=('cost_rub', 'median'))
+        self.assert_frame(results['routes'], routes)
+
+        window = d[(d['date'] >= '2023-03-01') & (d['date'] <= '2023-08-31')]
+        self.assert_frame(results['months'], window.groupby(window['date'].str[:7]).agg(
+            count=('cost_rub', 'size'), cost_sum=('cost_rub', 'sum'),
+            delivery_days_mean=('delivery_days', 'mean')))
+
+        total = results['total'].iloc[0]
+        self.assertEqual(total['count'], len(d))
+        self.assertAlmostEqual(total['cost_median'], d['cost_rub'].median())
+
+    def test_fused_passes(self):
+        plan = AggregationPlan(SPECS)
+        # Все свертываемые метрики - один проход, медианы - по проходу на набор ключей
+        self.assertEqual(plan.cell_keys, ['carrier', 'route', 'cargo_type', 'day'])
+        self.assertEqual(plan.passes, 4)
+        self.assertEqual(len(plan.explain()), plan.passes)
+        additive = [Aggregation(s.name, [m for m in s.metrics if not m.endswith('median')], s.keys,
+                                s.grain, s.filters, s.start, s.end) for s in SPECS]
+        self.assertEqual(AggregationPlan(additive).passes, 1)
+
+    def test_cube_matches_rows(self):
+        specs = [Aggregation('carriers', ('count', 'cost_sum', 'cost_per_km_mean'), keys='carrier',
+                             filters={'priority': 'Экспресс'}),
+                 Aggregation('routes', ('count', 'distance_mean'), keys='route', grain='quarter'),
+                 Aggregation('total', ('count', 'weight_sum'), start='2023-06-15')]
+        plan = AggregationPlan(specs)
+        rows = plan.execute(self.df)
+        cube = plan.execute_cube(RollupCube.from_frame(self.df))
+        for name in rows:
+            self.assert_frame(cube[name], rows[name])
+
+        with self.assertRaises(ValueError):
+            AggregationPlan([Aggregation('m', 'cost_median', keys='carrier')]).execute_cube(
+                RollupCube.from_frame(self.df))
+
+    def test_columns(self):
+        plan = AggregationPlan(SPECS)
+        self.assertEqual(set(plan.columns), {'carrier', 'cost_rub', 'distance_km', 'from_city', 'to_city',
+                                             'cargo_type', 'date', 'delivery_days'})
+        # Ключ, которого нет среди колонок анализатора, дочитывается из кэша
+        analyzer = ExtendedLogisticsAnalyzer(DATA_PATH)
+        self.assertNotIn('status', analyzer.df.columns)
+        result = analyzer.aggregate(Aggregation('statuses', 'count', keys='status'))['statuses']
+        self.assert_frame(result, self.raw.groupby('status').agg(count=('cost_rub', 'size')))
+
+    def test_missing_dates(self):
+        df = pd.DataFrame({'carrier': ['A', 'A', 'B'], 'date': ['2024-01-15', None, None],
+                           'cost_rub': [1.0, 2.0, 4.0], 'distance_km': [1, 1, 1], 'weight_kg': [1, 1, 1]})
+        results = AggregationPlan([
+            Aggregation('months', ('count', 'cost_sum', 'cost_median'), keys='carrier', grain='month'),
+            Aggregation('until', ('count', 'cost_median'), end='2024-01-31'),
+        ]).execute(df)
+        # Строки без даты не попадают ни в периоды, ни в окно дат
+        self.assertEqual(list(results['months'].index), [('2024-01', 'A')])
+        self.assertEqual(results['months']['cost_sum'].tolist(), [1.0])
+        self.assertEqual(results['until'][['count', 'cost_median']].values.tolist(), [[1, 1.0]])
+
+    def test_invalid_specs(self):
+        with self.assertRaises(ValueError):
+            Aggregation('x', 'cost_mode')
+        with self.assertRaises(ValueError):
+            Aggregation('x', 'count', grain='hour')
+        with self.assertRaises(ValueError):
+            AggregationPlan([Aggregation('x', 'count'), Aggregation('x', 'cost_sum')])
+
+    def test_analyzer_aggregate(self):
+        analyzer = ExtendedLogisticsAnalyzer(DATA_PATH)
+        spec = Aggregation('carriers', ('count', 'cost_sum'), keys='carrier')
+        by_rows = analyzer.aggregate(spec)['carriers']
+        by_cube = ExtendedLogisticsAnalyzer(partial=analyzer.partial).aggregate(spec)['carriers']
+        self.assert_frame(by_cube, by_rows)
+        self.assert_frame(by_rows, analyzer.partial.by_carrier[['count', 'cost_sum']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Тесты анализатора логистических данных"""
+
+import unittest
+import shutil
+import sys
+import os
+import tempfile
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from scripts.analyze import LogisticsAnalyzer
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestStreamingAnalyzer(unittest.TestCase):
+    """Потоковый режим должен давать те же результаты, что и загрузка в память"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.memory = LogisticsAnalyzer(DATA_PATH)
+        cls.streaming = LogisticsAnalyzer(DATA_PATH, streaming=True, chunk_size=128)
+
+    def test_kpis_match(self):
+        expected = self.memory.calculate_kpis()
+        actual = self.streaming.calculate_kpis()
+        self.assertEqual(expected.keys(), actual.keys())
+        for key, value in expected.items():
+            self.assertAlmostEqual(value, actual[key], places=6)
+
+    def test_carrier_stats_match(self):
+        self.assertEqual(self.memory.analyze_by_carrier(), self.streaming.analyze_by_carrier())
+
+    def test_best_routes_match(self):
+        self.assertEqual(
+            self.memory.find_most_profitable_routes(5),
+            self.streaming.find_most_profitable_routes(5)
+        )
+
+    def test_streaming_keeps_no_rows(self):
+        self.assertEqual(len(self.streaming.shipments), 0)
+
+
+class TestShipmentTable(unittest.TestCase):
+    """Колоночное хранилище перевозок"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = LogisticsAnalyzer(DATA_PATH).shipments
+
+    def test_strings_are_interned(self):
+        self.assertEqual(len(self.table), 1500)
+        self.assertLessEqual(len(self.table.cities), 12)
+        self.assertEqual(len(self.table.carriers), 8)
+
+    def test_row_roundtrip(self):
+        row = self.table[0]
+        self.assertEqual(row['from_city'], 'Екатеринбург')
+        self.assertEqual(row['to_city'], 'Омск')
+        self.assertEqual(row['distance_km'], 1279)
+        self.assertEqual(row['date'].strftime('%Y-%m-%d'), '2023-03-07')
+
+    def test_compact_rows(self):
+        self.assertLessEqual(self.table.nbytes() / len(self.table), 32)
+
+
+class TestIncrementalRefresh(unittest.TestCase):
+    """Дочитывание дописанных строк по сохраненному состоянию"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'shipments.csv')
+        self.state = os.path.join(self.tmp, 'state.json')
+        with open(DATA_PATH, encoding='utf-8') as f:
+            self.lines = f.readlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def analyzer(self):
+        return LogisticsAnalyzer(self.path, streaming=True, state_path=self.state, chunk_size=50)
+
+    def test_refresh_matches_full_pass(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(self.lines[:700])
+        self.analyzer()
+
+        # Дописываем строки, последняя - не до конца
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(self.lines[700:1200])
+            f.write(self.lines[1200][:10])
+        self.assertEqual(self.analyzer().aggregator.total_shipments, 1199)
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(self.lines[1200][10:])
+            f.writelines(self.lines[1201:])
+        refreshed = self.analyzer()
+
+        full = LogisticsAnalyzer(DATA_PATH, streaming=True)
+        self.assertEqual(refreshed.calculate_kpis(), full.calculate_kpis())
+        self.assertEqual(refreshed.analyze_by_carrier(), full.analyze_by_carrier())
+        self.assertEqual(refreshed.find_most_profitable_routes(10), full.find_most_profitable_routes(10))
+
+    def test_rewritten_file_is_recomputed(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(self.lines[:700])
+        self.analyzer()
+
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.writelines(self.lines[:1] + self.lines[800:1500])
+        self.assertEqual(self.analyzer().aggregator.total_shipments, 700)
+
+
+if __name__ == '__main__':
+    unittest.main()
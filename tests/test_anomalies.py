@@ -0,0 +1,107 @@
+"""Тесты потокового поиска аномальных цен"""
+
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.utils.anomalies import CostAnomalyDetector
+from scripts.analyze import LogisticsAnalyzer
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+KEY = ('Москва', 'Казань', 'ПЭК', 'Мебель')
+
+
+def read_rows():
+    with open(DATA_PATH, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def feed(detector, rows):
+    for row in rows:
+        detector.update(row['from_city'], row['to_city'], row['carrier'], row['cargo_type'],
+                        int(row['distance_km']), int(row['weight_kg']), float(row['cost_rub']),
+                        row['shipment_id'])
+
+
+class TestCostAnomalyDetector(unittest.TestCase):
+
+    def test_flags_overbilled_shipment(self):
+        detector = CostAnomalyDetector(min_count=20)
+        rng = random.Random(0)
+        for _ in range(50):
+            self.assertIsNone(detector.update(*KEY, 800, 1000, 800 * 30 * rng.uniform(0.9, 1.1)))
+        stats = detector.stats(*KEY)
+        self.assertEqual(stats['count'], 50)
+        self.assertAlmostEqual(stats['cost_per_km'], 30, delta=1)
+
+        anomaly = detector.update(*KEY, 800, 1000, 800 * 30 * 3, shipment_id=7)
+        self.assertEqual(anomaly['shipment_id'], 7)
+        self.assertGreater(anomaly['z_cost_per_km'], detector.threshold)
+        # Аномалия не учитывается в статистике ключа
+        self.assertEqual(detector.stats(*KEY)['count'], 50)
+        self.assertEqual((detector.checked, detector.flagged), (31, 1))
+        self.assertEqual(detector.top(1), [anomaly])
+
+    def test_cold_key_is_not_checked(self):
+        detector = CostAnomalyDetector(min_count=20)
+        for _ in range(19):
+            detector.update(*KEY, 800, 1000, 24000)
+        self.assertIsNone(detector.update(*KEY, 800, 1000, 240000))
+        self.assertEqual(detector.checked, 0)
+
+    def test_checkpoint_resume_matches_full_pass(self):
+        rows = read_rows()
+        full = CostAnomalyDetector(threshold=2.0, min_count=2)
+        feed(full, rows)
+        self.assertGreater(full.flagged, 0)
+
+        resumed = CostAnomalyDetector(threshold=2.0, min_count=2)
+        feed(resumed, rows[:700])
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'detector.json')
+            resumed.save(path)
+            resumed = CostAnomalyDetector.load(path)
+        finally:
+            shutil.rmtree(tmp)
+        feed(resumed, rows[700:])
+        self.assertEqual(json.dumps(resumed.to_dict()), json.dumps(full.to_dict()))
+
+
+class TestAnalyzerAnomalies(unittest.TestCase):
+
+    def test_incremental_stream(self):
+        with open(DATA_PATH, encoding='utf-8') as f:
+            lines = f.readlines()
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'shipments.csv')
+            state = os.path.join(tmp, 'state.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:800])
+            LogisticsAnalyzer(path, streaming=True, state_path=state, detect_anomalies=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(lines[800:])
+            resumed = LogisticsAnalyzer(path, streaming=True, state_path=state, detect_anomalies=True)
+            full = LogisticsAnalyzer(path, streaming=True, detect_anomalies=True)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(resumed.detector.to_dict(), full.detector.to_dict())
+        self.assertEqual(sum(resumed.detector.counts) + resumed.detector.flagged, len(lines) - 1)
+
+    def test_requires_streaming(self):
+        with self.assertRaises(ValueError):
+            LogisticsAnalyzer(DATA_PATH, detect_anomalies=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Тесты REST API и сервиса запросов"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.api import create_app
+from app.services.query_service import LatencyHistogram, QueryService
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestApi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'shipments.csv')
+        shutil.copy(DATA_PATH, cls.path)
+        cls.df = pd.read_csv(DATA_PATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_endpoints(self):
+        with TestClient(create_app(self.path)) as client:
+            kpis = client.get('/kpis').json()
+            self.assertEqual(kpis['total_shipments'], len(self.df))
+            self.assertAlmostEqual(kpis['total_revenue'], self.df['cost_rub'].sum(), places=2)
+
+            carriers = client.get('/carriers', params={'cargo_type': 'Медицина'}).json()
+            expected = self.df[self.df['cargo_type'] == 'Медицина']['carrier'].value_counts()
+            self.assertEqual({c['carrier']: c['count'] for c in carriers}, expected.to_dict())
+
+            routes = client.get('/routes', params={'n': 3, 'metric': 'count', 'largest': True}).json()
+            self.assertEqual(len(routes), 3)
+            self.assertEqual(routes[0]['count'], self.df.groupby(['from_city', 'to_city']).size().max())
+
+            months = client.get('/seasonal').json()
+            self.assertEqual(sum(m['count'] for m in months), len(self.df))
+
+            self.assertEqual(client.get('/seasonal', params={'grain': 'hour'}).status_code, 400)
+            self.assertEqual(client.get('/metrics').json()['latency']['/kpis']['count'], 1)
+
+    def test_quotes(self):
+        lanes = {'distance_km': [400.0, 1800.0, 2800.0] * 1000, 'weight_kg': [1000.0] * 3000,
+                 'cargo_type': ['Одежда', 'Мебель', 'Медицина'] * 1000}
+        with TestClient(create_app(self.path)) as client:
+            body = client.post('/quotes', json=lanes).json()
+            self.assertEqual(len(body['carriers']), 8)
+            self.assertEqual(len(body['total']), 3000)
+            self.assertEqual(len(body['total'][0]), 8)
+            self.assertNotIn('freight', body)
+
+            body = client.post('/quotes', json={**lanes, 'carriers': ['ЖДД'], 'breakdown': True}).json()
+            self.assertEqual(body['carriers'], ['ЖДД'])
+            self.assertIn('fuel_surcharge', body)
+
+            cities = {'from_city': ['Москва'], 'to_city': ['Казань'], 'weight_kg': [1000.0],
+                      'cargo_type': ['Мебель']}
+            by_distance = client.post('/quotes', json={**cities, 'distance_km': [800.0]}).json()
+            self.assertEqual(client.post('/quotes', json=cities).json()['total'], by_distance['total'])
+            self.assertEqual(client.post('/quotes', json={**lanes, 'weight_kg': [1.0]}).status_code, 400)
+            self.assertEqual(client.post('/quotes', json={**lanes, 'carriers': ['Нет']}).status_code, 400)
+
+    def test_coalescing_and_cache(self):
+        async def run():
+            service = QueryService(self.path)
+            bodies = await asyncio.gather(*(service.query('carriers') for _ in range(200)))
+            await service.query('carriers')
+            return service, bodies
+
+        service, bodies = asyncio.run(run())
+        self.assertEqual(len(set(bodies)), 1)
+        self.assertEqual(service.computed, 1)
+
+    def test_reload_on_data_change(self):
+        path = os.path.join(self.tmp, 'changing.csv')
+        self.df.iloc[:1000].to_csv(path, index=False)
+
+        async def run():
+            service = QueryService(path, check_interval=0)
+            before = json.loads(await service.query('kpis'))
+            self.df.to_csv(path, index=False)
+            after = json.loads(await service.query('kpis'))
+            return before, after
+
+        before, after = asyncio.run(run())
+        self.assertEqual(before['total_shipments'], 1000)
+        self.assertEqual(after['total_shipments'], len(self.df))
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_quantiles(self):
+        histogram = LatencyHistogram()
+        for ms in [0.2] * 90 + [7] * 9 + [400]:
+            histogram.record(ms)
+        self.assertEqual(histogram.quantile(0.5), 0.25)
+        self.assertEqual(histogram.quantile(0.95), 10)
+        self.assertEqual(histogram.snapshot()['buckets']['+Inf'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Тесты бенчмарка"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from scripts.benchmark import STARTUP_BUDGETS, check_startup, compare, measure_startup, run
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_small_run(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            report = run([300], ['LogisticsAnalyzer', 'ExtendedLogisticsAnalyzer'],
+                         data_dir=tmp, isolate=False)
+        finally:
+            shutil.rmtree(tmp)
+        stages = {(r['analyzer'], r['stage']) for r in report['results']}
+        self.assertIn(('LogisticsAnalyzer', 'find_most_profitable_routes'), stages)
+        self.assertIn(('ExtendedLogisticsAnalyzer', 'route_analysis'), stages)
+        for r in report['results']:
+            self.assertGreaterEqual(r['wall_s'], 0)
+            self.assertGreater(r['peak_rss_mb'], 0)
+
+    def test_compare_flags_regressions(self):
+        def report(wall, rss):
+            return {'results': [{'size': 1000, 'analyzer': 'A', 'stage': 'load',
+                                 'wall_s': wall, 'peak_rss_mb': rss}]}
+
+        self.assertEqual(compare(report(1.1, 100), report(1.0, 100)), [])
+        self.assertEqual(compare(report(0.06, 100), report(0.01, 100)), [])  # шум
+        regressions = compare(report(2.0, 300), report(1.0, 100))
+        self.assertEqual({r['metric'] for r in regressions}, {'wall_s', 'peak_rss_mb'})
+
+    def test_startup_within_budget(self):
+        # Легкие команды CLI не загружают pandas/numpy; время - с запасом на медленную машину
+        results, _ = check_startup(repeats=2)
+        for r in results:
+            self.assertEqual(r['heavy_modules'], [], r['command'])
+            self.assertLess(r['wall_s'], STARTUP_BUDGETS[r['command']][1] * 4, r['command'])
+
+    def test_startup_probe_reports_heavy_modules(self):
+        result = measure_startup(['analyze', 'data/shipments.csv', '--engine', 'pandas'], repeats=1)
+        self.assertIn('pandas', result['heavy_modules'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""Тесты кодирования колонок"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.utils.codes import category_codes
+
+
+class TestCategoryCodes(unittest.TestCase):
+
+    def setUp(self):
+        self.values = ['Омск', None, 'Казань', 'Омск']
+        self.categorical = pd.Series(pd.Categorical(self.values, categories=['Уфа', 'Омск', 'Казань']))
+
+    def test_strings(self):
+        codes, labels = category_codes(pd.Series(self.values, dtype=object))
+        self.assertEqual(labels, ['Казань', 'Омск'])
+        self.assertEqual(codes.tolist(), [1, -1, 0, 1])
+
+    def test_categorical(self):
+        codes, labels = category_codes(self.categorical)
+        self.assertEqual(labels, ['Уфа', 'Омск', 'Казань'])
+        self.assertEqual(codes.tolist(), [1, -1, 2, 1])
+        codes, labels = category_codes(self.categorical, used_only=True)
+        self.assertEqual([labels[c] if c >= 0 else None for c in codes], self.values)
+        self.assertNotIn('Уфа', labels)
+
+    def test_labels(self):
+        labels = ['Казань', 'Москва', 'Омск']
+        for series in (self.categorical, pd.Series(self.values, dtype=object)):
+            codes = category_codes(series, labels)
+            self.assertEqual(codes.dtype, np.int64)
+            self.assertEqual(codes.tolist(), [2, -1, 0, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
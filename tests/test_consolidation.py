@@ -0,0 +1,82 @@
+"""Тесты консолидации перевозок в загрузки машин"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+from app.services.consolidation import Consolidation, Vehicle, pack_groups
+from app.utils.data_loader import load_shipments
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestPackGroups(unittest.TestCase):
+
+    def test_next_fit_decreasing(self):
+        groups = np.array([0, 0, 0, 0, 0, 1, 1])
+        weight = np.array([9.0, 6.0, 4.0, 3.0, 1.0, 12.0, 2.0])
+        volume = np.array([1.0, 1.0, 1.0, 8.0, 1.0, 1.0, 1.0])
+        # Группа 0: 9 | 6+4 | 3 (объем) +1; группа 1: 12 - больше машины, едет одна
+        starts = pack_groups(groups, weight, volume, max_weight=10.0, max_volume=9.0)
+        self.assertEqual(starts.tolist(), [0, 1, 3, 5, 6])
+
+
+class TestConsolidation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = load_shipments(DATA_PATH, Consolidation.COLUMNS)
+
+    def test_loads(self):
+        truck = Vehicle(max_weight_kg=8000, max_volume_m3=20)
+        plan = Consolidation.from_frame(self.df, truck, window_days=7)
+        loads = plan.loads
+        self.assertEqual(loads['shipments'].sum(), len(self.df))
+        self.assertTrue((plan.load_ids >= 0).all())
+        np.testing.assert_array_equal(np.bincount(plan.load_ids), loads['shipments'])
+
+        # Каждая загрузка - одно направление и одна неделя, в пределах вместимости
+        rows = self.df.assign(load=plan.load_ids, week=pd.to_datetime(self.df['date'].astype(str)).values
+                              .astype('datetime64[D]').astype(np.int64) // 7)
+        per_load = rows.groupby('load').agg(routes=('from_city', 'nunique'), to=('to_city', 'nunique'),
+                                            weeks=('week', 'nunique'), weight=('weight_kg', 'sum'))
+        self.assertTrue((per_load[['routes', 'to', 'weeks']] == 1).all().all())
+        np.testing.assert_allclose(per_load['weight'], loads['weight_kg'])
+        shared = loads[loads['shipments'] > 1]
+        self.assertTrue((shared['weight_kg'] <= truck.max_weight_kg).all())
+        self.assertTrue((shared['volume_m3'] <= truck.max_volume_m3 + 1e-3).all())
+
+        summary = plan.summary()
+        self.assertAlmostEqual(summary['original_cost'], self.df['cost_rub'].sum(), places=2)
+        consolidated = loads[loads['consolidated']]
+        self.assertTrue((consolidated['truck_cost'] < consolidated['original_cost']).all())
+        self.assertAlmostEqual(summary['saved'], (consolidated['original_cost'] - consolidated['truck_cost']).sum(),
+                               places=2)
+        self.assertGreater(summary['saved'], 0)
+        self.assertAlmostEqual(plan.by_lane()['saved'].sum(), summary['saved'], places=2)
+
+    def test_wider_window_saves_more(self):
+        daily = Consolidation.from_frame(self.df).summary()
+        monthly = Consolidation.from_frame(self.df, window_days=30).summary()
+        self.assertGreater(monthly['saved'], daily['saved'])
+        self.assertGreater(monthly['consolidated_shipments'], daily['consolidated_shipments'])
+
+    def test_analyzer_window(self):
+        analyzer = AdvancedLogisticsAnalyzer(DATA_PATH)
+        plan = analyzer.consolidate(window_days=7, start='2023-06-01', end='2023-06-30')
+        dates = self.df['date'].astype(str)
+        subset = self.df[(dates >= '2023-06-01') & (dates <= '2023-06-30')]
+        expected = Consolidation.from_frame(subset, window_days=7).summary()
+        self.assertEqual(plan.summary(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
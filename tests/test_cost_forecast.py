@@ -0,0 +1,92 @@
+"""Тесты прогноза стоимости перевозок"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+from app.services.cost_forecast import CostForecaster, _normal_equations
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestNormalEquations(unittest.TestCase):
+
+    def test_matches_explicit_design(self):
+        rng = np.random.default_rng(0)
+        n, n_groups = 200, 3
+        group = rng.integers(0, n_groups, n)
+        distance, weight = rng.uniform(1, 3, n), rng.uniform(0.1, 5, n)
+        numeric = np.column_stack([np.ones(n), distance, weight, distance * weight])
+        blocks = [(rng.integers(0, 3, n), 3), (rng.integers(0, 2, n), 2)]
+        y = rng.normal(size=n)
+
+        xtx, xty = _normal_equations(group, n_groups, numeric, blocks, distance, y)
+        onehots = [np.eye(levels)[codes] * distance[:, None] for codes, levels in blocks]
+        X = np.hstack([numeric, *onehots])
+        for g in range(n_groups):
+            rows = X[group == g]
+            np.testing.assert_allclose(xtx[g], rows.T @ rows)
+            np.testing.assert_allclose(xty[g], rows.T @ y[group == g])
+
+
+class TestCostForecaster(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = pd.read_csv(DATA_PATH)
+        cls.model = CostForecaster.from_frame(cls.df)
+
+    def test_group_models_beat_global(self):
+        errors = {by: self.model.evaluate(self.df, by)['mape'] for by in ('route', 'carrier', 'global')}
+        self.assertLess(errors['global'], 0.5)
+        self.assertLessEqual(errors['route'], errors['global'])
+        self.assertLessEqual(errors['carrier'], errors['global'])
+
+    def test_unknown_groups_use_global_model(self):
+        scenario = self.df.head(5).copy()
+        scenario['from_city'] = 'Неизвестный'
+        scenario['carrier'] = 'Новый перевозчик'
+        # Неизвестный перевозчик - средняя надбавка, как и в общем прогнозе
+        np.testing.assert_allclose(self.model.predict(scenario, 'route'),
+                                   self.model.predict(scenario, 'global'))
+        np.testing.assert_allclose(self.model.predict(scenario, 'carrier'),
+                                   self.model.predict(scenario, 'global'))
+        with self.assertRaises(ValueError):
+            self.model.predict(scenario, 'city')
+
+    def test_save_load(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'cost_model.npz')
+            self.model.save(path)
+            loaded = CostForecaster.load(path)
+        finally:
+            shutil.rmtree(tmp)
+        for by in ('route', 'carrier', 'global'):
+            np.testing.assert_allclose(loaded.predict(self.df, by), self.model.predict(self.df, by))
+
+    def test_analyzer_forecast(self):
+        analyzer = AdvancedLogisticsAnalyzer(DATA_PATH)
+        scenario = {'distance_km': np.array([500.0, 1500.0]), 'weight_kg': np.array([1000.0, 1000.0]),
+                    'cargo_type': np.array([self.df['cargo_type'].iloc[0]] * 2),
+                    'carrier': np.array([self.df['carrier'].iloc[0]] * 2),
+                    'from_city': np.array([self.df['from_city'].iloc[0]] * 2),
+                    'to_city': np.array([self.df['to_city'].iloc[0]] * 2),
+                    'date': np.array(['2024-07-01'] * 2)}
+        forecast = analyzer.forecast_costs(scenario, by='carrier')
+        self.assertEqual(forecast.shape, (2,))
+        self.assertTrue(np.all(np.isfinite(forecast)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Тесты предагрегатов дашборда"""
+
+import os
+import sys
+import unittest
+from datetime import date
+
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.dashboard_data import DashboardData
+from app.utils.data_loader import load_shipments
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestDashboardData(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = DashboardData(load_shipments(DATA_PATH))
+        cls.df = pd.read_csv(DATA_PATH)
+        cls.df['route'] = cls.df['from_city'] + ' → ' + cls.df['to_city']
+
+    def test_filtered_summary_matches_raw_rows(self):
+        filters = dict(carriers=['ПЭК', 'ЖДД'], cargo_types=['Мебель'],
+                       start=date(2023, 3, 1), end=date(2023, 10, 31))
+        df = self.df[self.df['carrier'].isin(['ПЭК', 'ЖДД']) & (self.df['cargo_type'] == 'Мебель')
+                     & self.df['date'].between('2023-03-01', '2023-10-31')]
+        summary = self.data.summary(**filters)
+        self.assertEqual(summary['count'], len(df))
+        self.assertAlmostEqual(summary['total_cost'], df['cost_rub'].sum(), places=2)
+
+        rows, total = self.data.page(1, 10, **filters)
+        self.assertEqual(total, len(df))
+        self.assertEqual(list(rows['shipment_id']), list(df['shipment_id'].head(10)))
+
+    def test_route_filter_and_carrier_totals(self):
+        route = self.df['route'].iloc[0]
+        by_carrier = self.data.by_carrier(routes=[route])
+        expected = self.df[self.df['route'] == route].groupby('carrier')['cost_rub'].sum()
+        self.assertAlmostEqual(by_carrier.sum(), expected.sum(), places=2)
+        for carrier, cost in expected.items():
+            self.assertAlmostEqual(by_carrier[carrier], cost, places=2)
+
+    def test_timeline_is_downsampled(self):
+        timeline = self.data.timeline(max_points=50)
+        self.assertLessEqual(len(timeline), 50)
+        self.assertEqual(timeline['Перевозок'].sum(), len(self.df))
+
+    def test_missing_dates_and_cities(self):
+        df = self.df.head(300).drop(columns='route').reset_index(drop=True)
+        df.loc[:9, 'date'] = None
+        df.loc[10:19, 'to_city'] = None
+        df.loc[20:29, 'carrier'] = None
+        data = DashboardData(df.astype({'date': 'category', 'to_city': 'category', 'carrier': 'category'}))
+        dated = df[df['date'].notna()]
+        self.assertEqual(data.summary()['count'], len(df))
+        self.assertEqual(data.summary(end=date(2100, 1, 1))['count'], len(dated))
+        self.assertEqual(data.page(1, 10, end=date(2100, 1, 1))[1], len(dated))
+        self.assertEqual(data.timeline()['Перевозок'].sum(), len(dated))
+        self.assertEqual(str(data.date_min), dated['date'].min())
+        self.assertAlmostEqual(data.by_carrier().sum(), df['cost_rub'][df['carrier'].notna()].sum(), places=2)
+        self.assertEqual(len(data.routes), df.dropna(subset=['to_city']).groupby(['from_city', 'to_city']).ngroups)
+
+        # Период по умолчанию (весь диапазон) - без фильтра: строки без даты в итогах
+        self.assertEqual(data.period_filter((data.date_min, data.date_max)), (None, None))
+        self.assertEqual(data.summary(**dict(zip(('start', 'end'), data.period_filter(
+            (data.date_min, data.date_max)))))['count'], len(df))
+        narrowed = (data.date_min, date(2023, 6, 30))
+        self.assertEqual(data.period_filter(narrowed), (None, date(2023, 6, 30)))
+        self.assertEqual(data.period_filter(None), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
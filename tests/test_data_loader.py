@@ -0,0 +1,92 @@
+"""Тесты колоночного кэша"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.utils.data_loader import (
+    _read_meta, cache_dir_for, derived_path, is_cache_valid, load_shipments
+)
+
+SAMPLE_PATH = os.path.join(ROOT, 'data', 'shipments_sample.csv')
+
+
+class TestDataLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'shipments.csv')
+        shutil.copy(SAMPLE_PATH, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_matches_read_csv(self):
+        expected = pd.read_csv(self.path)
+        df = load_shipments(self.path)
+        self.assertEqual(list(df.columns), list(expected.columns))
+        self.assertEqual(df['carrier'].dtype.name, 'category')
+        for name in expected.columns:
+            pd.testing.assert_series_equal(df[name].astype(expected[name].dtype), expected[name])
+
+    def test_cache_reused_and_rebuilt(self):
+        load_shipments(self.path)
+        self.assertTrue(is_cache_valid(self.path))
+        mtime = os.stat(cache_dir_for(self.path) / 'meta.json').st_mtime_ns
+
+        load_shipments(self.path)
+        self.assertEqual(os.stat(cache_dir_for(self.path) / 'meta.json').st_mtime_ns, mtime)
+
+        # Дописываем строку - кэш должен пересобраться
+        with open(self.path, 'a', encoding='utf-8') as f:
+            with open(SAMPLE_PATH, encoding='utf-8') as src:
+                f.write(src.readlines()[1])
+        self.assertFalse(is_cache_valid(self.path))
+        self.assertEqual(len(load_shipments(self.path)), 101)
+
+    def test_column_projection(self):
+        df = load_shipments(self.path, columns=['carrier', 'cost_rub'])
+        self.assertEqual(sorted(df.columns), ['carrier', 'cost_rub'])
+        with self.assertRaises(KeyError):
+            load_shipments(self.path, columns=['no_such_column'])
+        df = load_shipments(self.path, columns=['carrier', 'no_such_column'], missing='ignore')
+        self.assertEqual(list(df.columns), ['carrier'])
+
+    def test_parses_only_requested_columns(self):
+        cache_dir = cache_dir_for(self.path)
+        derived = derived_path(self.path, 'graph.npz')
+        derived.write_bytes(b'x')
+        self.assertEqual(_read_meta(cache_dir)['columns'], [])
+
+        load_shipments(self.path, columns=['cost_rub', 'carrier'])
+        self.assertEqual([c['name'] for c in _read_meta(cache_dir)['columns']], ['carrier', 'cost_rub'])
+
+        # Недостающие колонки дочитываются в тот же кэш, производные данные остаются
+        df = load_shipments(self.path, columns=['distance_km', 'carrier'])
+        self.assertEqual([c['name'] for c in _read_meta(cache_dir)['columns']],
+                         ['distance_km', 'carrier', 'cost_rub'])
+        self.assertTrue(derived.exists())
+        expected = pd.read_csv(self.path)
+        np.testing.assert_array_equal(df['distance_km'], expected['distance_km'])
+        self.assertEqual(len(load_shipments(self.path).columns), len(expected.columns))
+
+    def test_schema_dtypes(self):
+        df = load_shipments(self.path)
+        self.assertEqual(df['from_city'].dtype.name, 'category')
+        self.assertEqual(df['distance_km'].dtype, np.int32)
+        self.assertEqual(df['volume_m3'].dtype, np.float32)
+        self.assertEqual(df['cost_rub'].dtype, np.float64)
+        self.assertEqual(df['shipment_id'].dtype, np.int64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Тесты индекса дат и выборок по окну"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.date_index import DateIndex, day_numbers
+from app.utils.dates import iso_day, last_days
+from scripts.analyze import LogisticsAnalyzer
+from scripts.analyze_extended import ExtendedLogisticsAnalyzer
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestDateIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = pd.read_csv(DATA_PATH)
+
+    def test_day_numbers(self):
+        dates = pd.Series(['2024-01-02', None, '2023-12-31'])
+        days = day_numbers(dates)
+        self.assertEqual(days[0] - days[2], 2)
+        self.assertLess(days[1], days[2])           # пропуск - меньше любой даты
+        np.testing.assert_array_equal(day_numbers(dates.astype('category')), days)
+
+    def test_window_matches_scan(self):
+        index = DateIndex.from_frame(self.df)
+        self.assertFalse(index.is_sorted)
+        self.assertEqual((index.min, index.max), (self.df['date'].min(), self.df['date'].max()))
+        for start, end in (('2023-06-01', '2023-06-30'), (None, '2023-02-15'),
+                           ('2024-01-20', None), ('2030-01-01', None)):
+            mask = pd.Series(True, index=self.df.index)
+            if start:
+                mask &= self.df['date'] >= start
+            if end:
+                mask &= self.df['date'] <= end
+            expected = self.df[mask]
+            selected = index.select(self.df, start, end)
+            self.assertEqual(index.count(start, end), len(expected))
+            # Исходный порядок строк сохраняется
+            self.assertEqual(list(selected.index), list(expected.index))
+
+    def test_sorted_data_uses_slice(self):
+        df = self.df.sort_values('date', kind='stable').reset_index(drop=True)
+        index = DateIndex.from_frame(df)
+        self.assertTrue(index.is_sorted)
+        self.assertIsInstance(index.rows('2023-06-01', '2023-06-30'), slice)
+
+    def test_last_days(self):
+        index = DateIndex.from_frame(self.df)
+        start, end = index.last_days(7)
+        self.assertEqual(end, self.df['date'].max())
+        self.assertEqual(iso_day(end) - iso_day(start), 6)
+        self.assertEqual(last_days(7, end), (iso_day(start), iso_day(end)))
+
+
+class TestAnalyzerWindows(unittest.TestCase):
+
+    def test_logistics_analyzer_window(self):
+        analyzer = LogisticsAnalyzer(DATA_PATH)
+        self.assertEqual(analyzer.calculate_kpis(), analyzer.calculate_kpis('2000-01-01', '2100-01-01'))
+
+        df = pd.read_csv(DATA_PATH)
+        june = df[(df['date'] >= '2023-06-01') & (df['date'] <= '2023-06-30')]
+        kpis = analyzer.calculate_kpis('2023-06-01', '2023-06-30')
+        self.assertEqual(kpis['total_shipments'], len(june))
+        self.assertAlmostEqual(kpis['total_cost'], june['cost_rub'].sum(), places=4)
+        carriers = analyzer.analyze_by_carrier('2023-06-01', '2023-06-30')
+        self.assertEqual({c: s['count'] for c, s in carriers.items()},
+                         june.groupby('carrier').size().to_dict())
+
+    def test_streaming_rejects_window(self):
+        analyzer = LogisticsAnalyzer(DATA_PATH, streaming=True)
+        with self.assertRaises(ValueError):
+            analyzer.calculate_kpis('2023-06-01')
+
+    def test_extended_window(self):
+        analyzer = ExtendedLogisticsAnalyzer(DATA_PATH)
+        window = analyzer.window(last_days=30)
+        self.assertEqual(window.partial.date_max, analyzer.partial.date_max)
+        self.assertLess(window.partial.count, analyzer.partial.count)
+        self.assertEqual(window.partial.count, int(window.partial.by_carrier['count'].sum()))
+
+
+if __name__ == '__main__':
+    unittest.main()
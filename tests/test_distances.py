@@ -0,0 +1,89 @@
+"""Тесты матрицы расстояний между городами"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.distances import KNOWN_DISTANCES, DistanceMatrix, default_matrix, haversine
+from app.services.pricing import PricingEngine
+from data.generate_realistic_data import generate_batch
+
+
+class TestDistanceMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = default_matrix()
+
+    def test_haversine(self):
+        # Москва - Санкт-Петербург по большому кругу ~634 км
+        self.assertAlmostEqual(float(haversine(55.7558, 37.6173, 59.9343, 30.3351)), 634, delta=3)
+
+    def test_matrix(self):
+        km = self.matrix.km
+        self.assertTrue((km == km.T).all())
+        self.assertTrue((np.diag(km) == 0).all())
+        self.assertTrue((km + np.eye(len(km), dtype=np.int32) > 0).all())
+        for (from_city, to_city), distance in KNOWN_DISTANCES.items():
+            self.assertEqual(self.matrix.distance([from_city], [to_city])[0], distance)
+            self.assertEqual(self.matrix.distance([to_city], [from_city])[0], distance)
+
+    def test_batch_lookup(self):
+        rng = np.random.default_rng(0)
+        cities = np.array(self.matrix.cities, dtype=object)
+        from_city, to_city = cities[rng.integers(0, len(cities), (2, 10_000))]
+        expected = [self.matrix.km[self.matrix.cities.get_loc(a), self.matrix.cities.get_loc(b)]
+                    for a, b in zip(from_city[:100], to_city[:100])]
+        by_name = self.matrix.distance(from_city, to_city)
+        np.testing.assert_array_equal(by_name[:100], expected)
+        by_category = self.matrix.distance(pd.Series(from_city, dtype='category'),
+                                           pd.Categorical(to_city, categories=sorted(set(to_city))))
+        np.testing.assert_array_equal(by_category, by_name)
+        with self.assertRaises(ValueError):
+            self.matrix.distance(['Москва'], ['Атлантида'])
+
+    def test_save_load(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'distances.npz')
+            self.matrix.save(path)
+            loaded = DistanceMatrix.load(path)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(list(loaded.cities), list(self.matrix.cities))
+        np.testing.assert_array_equal(loaded.km, self.matrix.km)
+
+    def test_check(self):
+        df = pd.DataFrame({'from_city': ['Москва', 'Москва', 'Казань', 'Атлантида'],
+                           'to_city': ['Казань', 'Казань', 'Москва', 'Москва'],
+                           'distance_km': [800, 1000, 820, 500]}, index=[10, 11, 12, 13])
+        flagged = self.matrix.check(df)
+        self.assertEqual(list(flagged.index), [11, 13])
+        self.assertAlmostEqual(flagged.loc[11, 'deviation'], 0.25)
+        self.assertTrue(np.isnan(flagged.loc[13, 'expected_km']))
+        self.assertEqual(list(self.matrix.check(df, tolerance=0.0).index), [11, 12, 13])
+
+    def test_generator_and_pricing_use_matrix(self):
+        df = generate_batch(np.random.default_rng(3), 1, 5000)
+        self.assertTrue(self.matrix.check(df, tolerance=0.0).empty)
+
+        pricing = PricingEngine()
+        lanes = {'from_city': df['from_city'][:50], 'to_city': df['to_city'][:50],
+                 'weight_kg': df['weight_kg'][:50], 'cargo_type': df['cargo_type'][:50]}
+        by_cities = pricing.quote(lanes)['total']
+        by_distance = pricing.quote({**lanes, 'distance_km': df['distance_km'][:50]})['total']
+        np.testing.assert_allclose(by_cities, by_distance)
+        with self.assertRaises(ValueError):
+            pricing.quote({'weight_kg': [1000], 'cargo_type': ['Одежда']})
+
+
+if __name__ == '__main__':
+    unittest.main()
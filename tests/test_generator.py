@@ -0,0 +1,48 @@
+"""Тесты генератора тестовых данных"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from data.generate_realistic_data import (
+    CITIES_WEIGHTS, generate_batch, generate_shipment, stream_shipments, to_csv_text
+)
+
+
+class TestGenerator(unittest.TestCase):
+
+    def test_schema_matches_row_generator(self):
+        row = generate_shipment(1, CITIES_WEIGHTS)
+        df = generate_batch(np.random.default_rng(0), 1, 10)
+        self.assertEqual(list(df.columns), list(row.keys()))
+
+    def test_seed_is_reproducible(self):
+        a = next(stream_shipments(1000, seed=7))
+        b = next(stream_shipments(1000, seed=7))
+        self.assertTrue(a.equals(b))
+
+    def test_batches_cover_all_rows(self):
+        batches = list(stream_shipments(2500, batch_size=1000))
+        self.assertEqual([len(b) for b in batches], [1000, 1000, 500])
+        self.assertEqual(batches[-1]['shipment_id'].iloc[-1], 2500)
+
+    def test_distributions(self):
+        df = generate_batch(np.random.default_rng(1), 1, 50_000)
+        self.assertFalse((df['from_city'] == df['to_city']).any())
+        self.assertAlmostEqual((df['from_city'] == 'Москва').mean(), 0.25, delta=0.01)
+        self.assertTrue(df['weight_kg'].between(50, 5000).all())
+        self.assertEqual(df['delivery_days'].notna().mean().round(2), 0.85)
+
+    def test_csv_text_matches_pandas(self):
+        df = generate_batch(np.random.default_rng(2), 1, 500)
+        self.assertEqual(to_csv_text(df), df.to_csv(index=False, lineterminator='\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Тесты тарифного расчета"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.pricing import CARGO_TYPES, CARRIERS, COMPONENTS, PricingEngine
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+def reference_cost(base_rate, distance, carrier, cargo, weight):
+    """Построчная формула генератора данных (без случайного отклонения)"""
+    modifier = 0.9 if distance > 2000 else 1.2 if distance < 500 else 1.0
+    return base_rate * distance * carrier['price_factor'] * cargo['price_factor'] \
+        * modifier * (1 + weight / 10000)
+
+
+class TestPricingEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = PricingEngine()
+        self.requests = {'distance_km': np.array([300, 500, 2000, 2500]),
+                         'weight_kg': np.array([100, 5000, 1000, 2000]),
+                         'cargo_type': np.array(['Электроника', 'Мебель', 'Одежда', 'Химия']),
+                         'insurance': np.array([True, False, False, True])}
+
+    def test_matches_row_formula(self):
+        quotes = self.engine.quote(self.requests)
+        self.assertEqual(quotes['carriers'], [c['name'] for c in CARRIERS])
+        self.assertEqual(quotes['total'].shape, (4, len(CARRIERS)))
+        cargo = {c['type']: c for c in CARGO_TYPES}
+        for i in range(4):
+            for j, carrier in enumerate(CARRIERS):
+                freight = reference_cost(32.5, self.requests['distance_km'][i], carrier,
+                                         cargo[self.requests['cargo_type'][i]],
+                                         self.requests['weight_kg'][i])
+                insurance = freight * 0.02 if self.requests['insurance'][i] else 0.0
+                self.assertAlmostEqual(quotes['freight'][i, j], freight)
+                self.assertAlmostEqual(quotes['total'][i, j], freight * 1.1 + insurance)
+
+    def test_matches_dataset_costs(self):
+        # Стоимость в данных - фрахт перевозчика строки со случайным отклонением ±10%
+        df = pd.read_csv(DATA_PATH)
+        quotes = self.engine.quote(df)
+        freight = quotes['freight'][np.arange(len(df)), self.engine.carrier_codes(df['carrier'])]
+        ratio = df['cost_rub'] / freight
+        self.assertTrue(ratio.between(0.89, 1.11).all())
+
+    def test_selected_carriers_and_frame(self):
+        names = ['ЖДД', 'Мэйджор']
+        quotes = self.engine.quote(self.requests, names)
+        self.assertEqual(quotes['carriers'], names)
+        best, total = self.engine.cheapest(quotes)
+        self.assertTrue((best == 'ЖДД').all())
+        np.testing.assert_allclose(total, quotes['total'][:, 0])
+
+        frame = self.engine.quote_frame(self.requests, names)
+        self.assertEqual(frame.shape, (4, 2 * len(COMPONENTS)))
+        np.testing.assert_allclose(frame[('Мэйджор', 'total')], quotes['total'][:, 1].round(2))
+
+    def test_unknown_values(self):
+        with self.assertRaises(ValueError):
+            self.engine.quote(self.requests, ['Неизвестный'])
+        self.requests['cargo_type'][0] = 'Золото'
+        with self.assertRaises(ValueError):
+            self.engine.quote(self.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
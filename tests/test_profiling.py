@@ -0,0 +1,101 @@
+"""Тесты замеров этапов анализа"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.utils import profiling
+from app.utils.profiling import Profiler, compare_profiles, profiled, stage
+from scripts.analyze import LogisticsAnalyzer
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class Worker:
+    def __init__(self):
+        self.profiler = Profiler('Worker')
+
+    @profiled
+    def run(self):
+        with stage('inner', rows=10):
+            return sum(range(1000))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_nested_stages(self):
+        worker = Worker()
+        worker.profiler.rows = 100
+        self.assertEqual(worker.run(), sum(range(1000)))
+
+        inner, outer = worker.profiler.stages
+        self.assertEqual((inner['stage'], inner['depth'], inner['rows']), ('run/inner', 1, 10))
+        self.assertEqual((outer['stage'], outer['depth'], outer['rows']), ('run', 0, 100))
+        self.assertGreaterEqual(outer['wall_s'], inner['wall_s'])
+        self.assertGreater(outer['peak_rss_mb'], 0)
+
+    def test_memory_unavailable(self):
+        # Без /proc и модуля resource (Windows) память не замеряется
+        worker = Worker()
+        with mock.patch.object(profiling, 'resource', None), \
+                mock.patch('builtins.open', side_effect=OSError):
+            worker.run()
+        self.assertTrue(all(r['rss_mb'] is None and r['peak_rss_mb'] is None
+                            for r in worker.profiler.stages))
+        self.assertEqual(len(list(worker.profiler.summary_lines())), 3)
+
+    def test_stage_without_profiler_is_noop(self):
+        with stage('free') as record:
+            record['rows'] = 1
+
+    def test_trace_format(self):
+        worker = Worker()
+        worker.run()
+        worker.profiler.add('parts', 0.5)
+        events = worker.profiler.to_trace()['traceEvents']
+        timed = [e for e in events if e['ph'] == 'X']
+        self.assertEqual({e['name'] for e in timed}, {'run', 'inner'})
+        for e in timed:
+            self.assertGreaterEqual(e['ts'], 0)
+            self.assertGreaterEqual(e['dur'], 0)
+
+    def test_compare_profiles(self):
+        def profile(wall, rows):
+            return {'stages': [{'analyzer': 'A', 'stage': 'load', 'wall_s': wall,
+                                'rows_per_s': rows / wall}]}
+
+        # Вдвое больше данных за вдвое большее время - не регрессия
+        self.assertEqual(compare_profiles(profile(2.0, 2000), profile(1.0, 1000)), [])
+        regressions = compare_profiles(profile(2.0, 1000), profile(1.0, 1000))
+        self.assertEqual([r['metric'] for r in regressions], ['rows_per_s'])
+
+
+class TestAnalyzerProfile(unittest.TestCase):
+
+    def test_logistics_analyzer_stages(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            analyzer = LogisticsAnalyzer(DATA_PATH)
+            analyzer.calculate_kpis()
+            analyzer.profiler.save(os.path.join(tmp, 'profile.json'))
+            with open(os.path.join(tmp, 'profile.json'), encoding='utf-8') as f:
+                report = json.load(f)
+        finally:
+            shutil.rmtree(tmp)
+
+        stages = {r['stage']: r for r in report['stages']}
+        self.assertEqual(set(stages), {'load', 'load/read_csv', 'load/convert', 'calculate_kpis'})
+        self.assertEqual(stages['load']['rows'], len(analyzer.shipments))
+        self.assertGreater(stages['load/read_csv']['rows_per_s'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
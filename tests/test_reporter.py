@@ -0,0 +1,76 @@
+"""Тесты генерации отчетов"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.aggregates import ShipmentPartial
+from app.services.reporter import FORMATS, build_report, render_reports
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestReporter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.df = pd.read_csv(DATA_PATH)
+        cls.partial = ShipmentPartial.from_frame(cls.df)
+        cls.model = build_report(cls.partial, DATA_PATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_model(self):
+        tables = {t.name: t for t in self.model.tables}
+        self.assertEqual(list(tables), ['carriers', 'routes', 'months', 'quarters'])
+        self.assertEqual(tables['routes'].frame['Перевозок'].sum(), len(self.df))
+        self.assertEqual(len(tables['months'].frame), self.df['date'].str[:7].nunique())
+        self.assertEqual(dict(self.model.summary)['Всего перевозок'], len(self.df))
+
+    def test_all_formats_from_one_model(self):
+        outputs = {fmt: os.path.join(self.tmp, f'report.{fmt}') for fmt in FORMATS}
+        # Рендеры не обращаются к агрегатам: все вычислено в модели
+        with mock.patch.object(ShipmentPartial, 'median_cost', side_effect=AssertionError):
+            render_reports(self.model, outputs)
+
+        with open(outputs['txt'], encoding='utf-8') as f:
+            text = f.read()
+        self.assertIn('Москва           Санкт-Петербург', text)
+
+        with open(outputs['csv'], encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertIn(['Маршруты'], rows)
+
+        with open(outputs['html'], encoding='utf-8') as f:
+            self.assertIn('<h2>По кварталам</h2>', f.read())
+
+        with open(outputs['pdf'], 'rb') as f:
+            self.assertEqual(f.read(4), b'%PDF')
+
+        from openpyxl import load_workbook
+        workbook = load_workbook(outputs['xlsx'], read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Сводка', 'Перевозчики', 'Маршруты', 'По месяцам', 'По кварталам'])
+        carriers = list(workbook['Перевозчики'].values)
+        self.assertEqual(len(carriers) - 1, self.df['carrier'].nunique())
+        workbook.close()
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            render_reports(self.model, {'docx': os.path.join(self.tmp, 'report.docx')})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Тесты куба предагрегатов"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import warnings
+
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.aggregation_plan import Aggregation, AggregationPlan
+from app.services.rollup_cube import MEASURES, RollupCube
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestRollupCube(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = pd.read_csv(DATA_PATH)
+        cls.cube = RollupCube.from_frame(cls.df)
+
+    def expected(self, df, keys):
+        return df.groupby(keys).agg(count=('cost_rub', 'size'), cost_sum=('cost_rub', 'sum'))
+
+    def test_slices_match_raw_groupby(self):
+        df = self.df.assign(month=self.df['date'].str[:7])
+        actual = self.cube.query(by='carrier', grain='month')
+        expected = self.expected(df, ['month', 'carrier'])
+        pd.testing.assert_frame_equal(actual[['count', 'cost_sum']], expected,
+                                      check_exact=False, check_names=False)
+
+        subset = df[(df['cargo_type'] == 'Медицина') & (df['date'] >= '2023-03-10')
+                    & (df['date'] <= '2023-06-20')]
+        actual = self.cube.query(by=('from_city', 'to_city'), cargo_type='Медицина',
+                                 start='2023-03-10', end='2023-06-20')
+        expected = self.expected(subset, ['from_city', 'to_city'])
+        pd.testing.assert_frame_equal(actual[['count', 'cost_sum']], expected, check_exact=False)
+
+    def test_rollups(self):
+        quarters = self.cube.query(grain='quarter')
+        self.assertEqual(quarters.index[0], '2023-Q1')
+        self.assertEqual(quarters['count'].sum(), len(self.df))
+        weeks = self.cube.query(grain='week', start='2023-03-01', end='2023-03-31')
+        self.assertEqual(weeks.index[0], '2023-02-27')   # понедельник
+        self.assertEqual(weeks['count'].sum(), self.df['date'].between('2023-03-01', '2023-03-31').sum())
+        # Окно по границам месяцев читается из месячного куба, внутри месяца - из дневного
+        aligned = self.cube.query(grain='month', start='2023-02-01', end='2023-03-31')
+        partial = self.cube.query(grain='month', start='2023-02-01', end='2023-03-30')
+        self.assertEqual(aligned['count'].tolist()[0], partial['count'].tolist()[0])
+        self.assertEqual(aligned['count'].sum() - partial['count'].sum(),
+                         (self.df['date'] == '2023-03-31').sum())
+
+    def test_merge_and_save(self):
+        merged = RollupCube.from_frame(self.df.iloc[:600]).update(self.df.iloc[600:])
+        for name in MEASURES:
+            self.assertAlmostEqual(merged.totals()[name], self.cube.totals()[name], places=4)
+        pd.testing.assert_frame_equal(merged.query(by='priority', grain='day'),
+                                      self.cube.query(by='priority', grain='day'))
+
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'cube.npz')
+            self.cube.save(path)
+            loaded = RollupCube.load(path)
+            pd.testing.assert_frame_equal(loaded.query(by='customer_segment', grain='year'),
+                                          self.cube.query(by='customer_segment', grain='year'))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_undated_rows_and_zero_distance(self):
+        df = pd.DataFrame({'carrier': ['A', 'A', 'B'], 'from_city': ['Омск', 'Омск', 'Уфа'],
+                           'to_city': ['Уфа', 'Уфа', 'Омск'], 'date': ['2024-01-10', '2024-02-05', None],
+                           'cost_rub': [100.0, 200.0, 300.0], 'distance_km': [10, 0, 30],
+                           'weight_kg': [1, 2, 3]})
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            cube = RollupCube.from_frame(df)
+        # Строка без даты - не в периодах и не в окнах дат, но в итогах без окна
+        self.assertEqual(list(cube.query(grain='month').index), ['2024-01', '2024-02'])
+        self.assertEqual(list(cube.query(grain='quarter').index), ['2024-Q1'])
+        self.assertEqual(list(cube.query(by='carrier', end='2024-01-31').index), ['A'])
+        self.assertEqual(cube.query(by='carrier')['count'].tolist(), [2, 1])
+        self.assertEqual(cube.totals(start='2024-01-01')['count'], 2)
+        self.assertEqual(cube.totals()['count'], 3)
+
+        # Нулевое расстояние не дает inf: строка не входит в среднее за км
+        carriers = cube.query(by='carrier')
+        self.assertEqual(carriers['cost_per_km_sum'].tolist(), [10.0, 10.0])
+        self.assertEqual(carriers['cost_per_km_count'].tolist(), [1, 1])
+
+        plan = AggregationPlan([
+            Aggregation('quarters', ('count', 'cost_sum', 'cost_per_km_mean'), keys='carrier', grain='quarter'),
+            Aggregation('until', ('count', 'cost_per_km_mean'), keys='carrier', end='2024-01-31'),
+            Aggregation('all', ('count', 'cost_per_km_mean'), keys='carrier'),
+        ])
+        by_rows, by_cube = plan.execute(df), plan.execute_cube(cube)
+        for name in by_rows:
+            pd.testing.assert_frame_equal(by_cube[name], by_rows[name], check_dtype=False)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.cube.query()
+        with self.assertRaises(ValueError):
+            self.cube.query(grain='hour')
+        with self.assertRaises(ValueError):
+            self.cube.query(by='carrier', status='Доставлен')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Тесты индекса маршрутов"""
+
+import os
+import sys
+import unittest
+
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.rollup_cube import RollupCube
+from app.services.route_index import RouteIndex
+from app.utils.data_loader import load_shipments
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestRouteIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.index = RouteIndex.from_frame(load_shipments(DATA_PATH))
+        cls.df = pd.read_csv(DATA_PATH)
+        cls.df['cost_per_km'] = cls.df['cost_rub'] / cls.df['distance_km']
+
+    def expected(self, df, column, func, n, largest):
+        values = df.groupby(['from_city', 'to_city'])[column].agg(func)
+        values = values.nlargest(n) if largest else values.nsmallest(n)
+        return [(a, b, v) for (a, b), v in values.items()]
+
+    def actual(self, rows):
+        return [(r['from_city'], r['to_city'], r['value']) for r in rows]
+
+    def assert_routes(self, actual, expected):
+        self.assertEqual([r[:2] for r in actual], [r[:2] for r in expected])
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a[2], e[2])
+
+    def test_unfiltered(self):
+        self.assert_routes(self.actual(self.index.cheapest(5)),
+                           self.expected(self.df, 'cost_per_km', 'mean', 5, False))
+        self.assert_routes(self.actual(self.index.most_expensive(5)),
+                           self.expected(self.df, 'cost_per_km', 'mean', 5, True))
+
+    def test_filtered_by_carrier_cargo_and_months(self):
+        df = self.df[(self.df['carrier'] == 'ПЭК')
+                     & self.df['cargo_type'].isin(['Мебель', 'Химия'])
+                     & (self.df['date'] >= '2023-04-01') & (self.df['date'] <= '2023-09-30')]
+        actual = self.index.top(3, 'avg_cost', largest=True, carrier='ПЭК',
+                                cargo_type=['Мебель', 'Химия'], start='2023-04-01', end='2023-09-30')
+        self.assert_routes(self.actual(actual), self.expected(df, 'cost_rub', 'mean', 3, True))
+
+    def test_popular_and_best_shipment(self):
+        top = self.index.most_popular(1)[0]
+        counts = self.df.groupby(['from_city', 'to_city']).size()
+        self.assertEqual(top['count'], counts.max())
+        best = self.index.top(1, 'min_cost_per_km')[0]
+        self.assertAlmostEqual(best['value'], self.df['cost_per_km'].min())
+
+    def test_months_match_cube(self):
+        # Номера месяцев - те же datetime64[M], что и в кубе предагрегатов
+        cube = RollupCube.from_frame(self.df)
+        self.assertEqual(set(self.index.cells['month'].tolist()), set(cube.months['month'].tolist()))
+
+    def test_empty_slice(self):
+        self.assertEqual(self.index.cheapest(5, carrier='Нет такого'), [])
+        self.assertEqual(self.index.cheapest(5, start='2030-01-01'), [])
+
+    def test_missing_city_and_date(self):
+        df = self.df.head(200).copy()
+        df.loc[:9, 'to_city'] = None
+        df.loc[10:19, 'date'] = None
+        for frame in (df, df.astype({'to_city': 'category', 'date': 'category'})):
+            index = RouteIndex.from_frame(frame)
+            total = sum(r['count'] for r in index.most_popular(100))
+            self.assertEqual(total, len(df) - 20)
+            self.assertEqual(len(index.cities), len(set(df['from_city']) | set(df['to_city'].dropna())))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Тесты графа стоимости маршрутов"""
+
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.route_optimizer import RouteGraph
+
+
+def shipments(rows):
+    return pd.DataFrame(rows, columns=[
+        'from_city', 'to_city', 'carrier', 'distance_km', 'weight_kg', 'cost_rub', 'delivery_days'
+    ])
+
+
+class TestRouteGraph(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Прямое плечо A→C дорогое, через хаб B - дешевле; у Y нет плеча B→C
+        cls.graph = RouteGraph.from_frame(shipments([
+            ('A', 'C', 'X', 1000, 100, 50000, 5),
+            ('A', 'B', 'X', 500, 100, 10000, 2),
+            ('B', 'C', 'X', 500, 100, 12000, 2),
+            ('A', 'B', 'Y', 500, 100, 8000, 4),
+            ('A', 'C', 'Y', 1000, 100, 40000, 3),
+        ]))
+
+    def test_multi_leg_path_through_hub(self):
+        result = self.graph.cheapest('A', 'C', carrier='X')
+        self.assertEqual(result['path'], ['A', 'B', 'C'])
+        self.assertAlmostEqual(result['value'], 22000)
+
+    def test_any_carrier_mixes_carriers(self):
+        result = self.graph.cheapest('A', 'C')
+        self.assertEqual(result['path'], ['A', 'B', 'C'])
+        self.assertAlmostEqual(result['value'], 20000)
+        self.assertEqual([leg['carrier'] for leg in result['legs']], ['Y', 'X'])
+
+    def test_metric_and_carrier_layers(self):
+        self.assertEqual(self.graph.path('A', 'C', carrier='Y'), ['A', 'C'])
+        self.assertAlmostEqual(self.graph.cost('A', 'C', metric='delivery_days'), 3)
+        self.assertTrue(math.isinf(self.graph.cost('C', 'A')))
+        self.assertEqual(self.graph.path('C', 'A'), [])
+
+    def test_savings_and_roundtrip(self):
+        savings = self.graph.savings(carrier='X')
+        self.assertEqual(list(savings['path']), ['A → B → C'])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'graph.npz')
+            self.graph.save(path)
+            loaded = RouteGraph.load(path)
+        self.assertEqual(loaded.cheapest('A', 'C'), self.graph.cheapest('A', 'C'))
+
+    def test_empty_frame(self):
+        # Пустой срез (фильтр или окно дат без перевозок) - пустой граф
+        for rows in ([], [('A', 'B', 'X', 0, 100, 1000, 1)]):
+            graph = RouteGraph.from_frame(shipments(rows))
+            self.assertEqual((graph.cities, graph.carriers), ([], []))
+            self.assertEqual(len(graph.savings()), 0)
+            with self.assertRaises(KeyError):
+                graph.cost('A', 'B')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Тесты скетчей квантилей и уникальных значений"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.utils.sketches import HyperLogLog, QuantileSketch
+from app.services.aggregates import ShipmentPartial
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_relative_error_after_merge(self):
+        values = np.random.default_rng(0).lognormal(10, 1, 200_000)
+        sketch = QuantileSketch(0.01)
+        for part in np.array_split(values, 5):
+            sketch.merge(QuantileSketch(0.01).update(part))
+        self.assertEqual(sketch.count, len(values))
+        for q in (0.01, 0.5, 0.95, 0.99):
+            exact = np.quantile(values, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) / exact - 1), 0.01)
+
+    def test_guarantee_above_collapsed_bins(self):
+        # 256 корзин при точности 1% покрывают диапазон ~170 раз: младшие сворачиваются
+        values = np.random.default_rng(1).lognormal(10, 1, 100_000)
+        sketch = QuantileSketch(0.01, max_bins=256)
+        for part in np.array_split(values, 4):
+            sketch.merge(QuantileSketch(0.01, max_bins=256).update(part))
+        self.assertLessEqual(len(sketch.bins), 256)
+        self.assertGreater(sketch.accurate_above, values.min())
+        accurate = 0
+        for q in np.linspace(0, 1, 101):
+            exact = np.quantile(values, q, method='lower')
+            if exact > sketch.accurate_above:
+                accurate += 1
+                self.assertLessEqual(abs(sketch.quantile(q) / exact - 1), 0.01)
+            else:
+                self.assertLessEqual(sketch.quantile(q), sketch.accurate_above * (1 + 1e-9))
+        self.assertGreater(accurate, 10)
+        self.assertEqual(QuantileSketch().update(values).accurate_above, 0.0)
+
+    def test_zeros_and_nan(self):
+        sketch = QuantileSketch(0.02).update([0, 0, 0, np.nan, 5])
+        self.assertEqual(sketch.count, 4)
+        self.assertEqual(sketch.median(), 0.0)
+        self.assertTrue(np.isnan(QuantileSketch().median()))
+
+    def test_merge_rejects_different_accuracy(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_cardinality_within_error(self):
+        ids = np.arange(300_000)
+        left, right = HyperLogLog(0.01), HyperLogLog(0.01)
+        left.update(ids[:200_000])
+        right.update(ids[100_000:])
+        estimate = left.merge(right).count()
+        self.assertLess(abs(estimate / len(ids) - 1), 3 * left.error)
+
+    def test_small_sets_and_strings(self):
+        hll = HyperLogLog(0.02).update(['Москва', 'Омск', 'Москва', None])
+        self.assertEqual(hll.count(), 2)
+
+
+class TestApproxPartial(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        df = pd.read_csv(DATA_PATH)
+        cls.exact = ShipmentPartial.from_frame(df)
+        parts = [ShipmentPartial.from_frame(df.iloc[i::2], approx=True, quantile_accuracy=0.02)
+                 for i in range(2)]
+        cls.approx = parts[0].merge(parts[1])
+        cls.df = df
+
+    def test_medians_within_accuracy(self):
+        exact = self.exact.carrier_median_cost()
+        approx = self.approx.carrier_median_cost().reindex(exact.index)
+        # Для четного числа значений точная медиана - середина между соседними
+        self.assertTrue(((approx / exact - 1).abs() < 0.05).all())
+        self.assertAlmostEqual(self.approx.median_cost() / self.exact.median_cost(), 1, delta=0.05)
+        self.assertEqual(self.approx.carrier_costs, {})
+
+    def test_distinct_counts(self):
+        self.assertEqual(self.approx.distinct_count('cities'),
+                         len(set(self.df['from_city']) | set(self.df['to_city'])))
+        customers = self.df['customer_id'].nunique()
+        self.assertAlmostEqual(self.approx.distinct_count('customers') / customers, 1, delta=0.05)
+
+    def test_quantile_table(self):
+        table = self.approx.carrier_quantiles('delivery_days')
+        self.assertEqual(list(table.columns), ['p50', 'p95'])
+        self.assertTrue((table['p50'] <= table['p95']).all())
+        with self.assertRaises(ValueError):
+            self.exact.carrier_quantiles()
+        with self.assertRaises(ValueError):
+            self.exact.merge(self.approx)
+
+
+if __name__ == '__main__':
+    unittest.main()
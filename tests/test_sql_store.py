@@ -0,0 +1,90 @@
+"""Тесты хранилища SQLite и движка sql"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+# Добавляем путь к проекту
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from app.services.advanced_analyzer import AdvancedLogisticsAnalyzer
+from app.services.aggregates import ShipmentPartial
+from app.services.rollup_cube import RollupCube
+from app.services.sql_store import ShipmentStore
+
+DATA_PATH = os.path.join(ROOT, 'data', 'shipments_extended.csv')
+
+
+class TestShipmentStore(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.df = pd.read_csv(DATA_PATH)
+        cls.parts = []
+        for i in range(2):
+            path = os.path.join(cls.tmp, f'part{i}.csv')
+            cls.df.iloc[i::2].to_csv(path, index=False)
+            cls.parts.append(path)
+        cls.store = ShipmentStore.for_files(cls.parts, os.path.join(cls.tmp, 'store.sqlite'))
+        cls.cube = RollupCube.from_frame(cls.df)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.close()
+        shutil.rmtree(cls.tmp)
+
+    def test_queries_match_cube(self):
+        for query in (dict(by='carrier'), dict(grain='month'),
+                      dict(grain='week', by='priority', start='2023-03-01', end='2023-04-30'),
+                      dict(by=('from_city', 'to_city'), carrier=['ПЭК', 'ЖДД'], cargo_type='Химия')):
+            pd.testing.assert_frame_equal(self.store.query(**query), self.cube.query(**query),
+                                          check_exact=False)
+        self.assertEqual(self.store.totals()['count'], len(self.df))
+        with self.assertRaises(ValueError):
+            self.store.query(grain='hour')
+
+    def test_partial_from_store(self):
+        sql = ShipmentPartial.from_store(self.store)
+        full = ShipmentPartial.from_frame(self.df)
+        self.assertEqual((sql.count, sql.date_min, sql.date_max), (full.count, full.date_min, full.date_max))
+        self.assertEqual(sql.carriers, full.carriers)
+        pd.testing.assert_frame_equal(sql.by_route, full.by_route, check_exact=False)
+        pd.testing.assert_series_equal(sql.carrier_median_cost(), full.carrier_median_cost())
+        self.assertEqual(sql.median_cost(), full.median_cost())
+        with self.assertRaises(ValueError):
+            sql.merge(full)
+
+    def test_sync_reloads_only_changes(self):
+        db = os.path.join(self.tmp, 'sync.sqlite')
+        with ShipmentStore.for_files(self.parts, db) as store:
+            self.assertEqual(store.sync(self.parts), [])
+            self.df.iloc[:10].to_csv(self.parts[0], index=False)
+            self.assertEqual(store.sync(self.parts), [os.path.realpath(self.parts[0])])
+            self.assertEqual(store.totals()['count'], 10 + len(self.df.iloc[1::2]))
+            store.sync(self.parts[1:])
+            self.assertEqual(store.totals()['count'], len(self.df.iloc[1::2]))
+            # После загрузки - обычный журнал на диске и индекс для удаления файлов
+            self.assertEqual(store.conn.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+            self.assertEqual(store.conn.execute("PRAGMA synchronous").fetchone()[0], 2)
+            plan = store.conn.execute("EXPLAIN QUERY PLAN DELETE FROM shipments WHERE source_id = 1").fetchall()
+            self.assertIn('idx_shipments_source', str(plan))
+        self.df.iloc[0::2].to_csv(self.parts[0], index=False)
+
+    def test_advanced_kpis(self):
+        db = os.path.join(self.tmp, 'kpis.sqlite')
+        pandas_kpis = AdvancedLogisticsAnalyzer(DATA_PATH).calculate_kpis()
+        sql_kpis = AdvancedLogisticsAnalyzer(DATA_PATH, engine='sql', db_path=db).calculate_kpis()
+        self.assertEqual(sql_kpis['total_shipments'], pandas_kpis['total_shipments'])
+        self.assertAlmostEqual(sql_kpis['total_revenue'], pandas_kpis['total_revenue'], places=2)
+        self.assertAlmostEqual(sql_kpis['avg_cost_per_km'], pandas_kpis['avg_cost_per_km'], places=6)
+        self.assertEqual(sql_kpis['most_common_route'], tuple(pandas_kpis['most_common_route']))
+
+
+if __name__ == '__main__':
+    unittest.main()